@@ -0,0 +1,274 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from network_core import NetworkCore
+from output_parser import OutputParser
+from timeseries import TimeSeriesStore
+import metrics
+from jump_pool import JumpHostPool
+from session_cache import SessionCache
+from device_health import DeviceHealth
+from async_transport import AsyncTransport, AsyncSession
+
+
+class AnalysisEngine:
+    """Ejecuta el análisis de dispositivos en paralelo con límites de concurrencia"""
+
+    def __init__(self, config, logger=None, log_callback=None, log=None):
+        self.config = config
+        self.logger = logger
+        self.log_callback = log_callback
+        self.log = log  # log(mensaje, nivel) para avisos del propio motor
+
+        settings = config.get('analysis', {})
+        self.max_workers_per_client = max(1, settings.get('max_workers_per_client', 4))
+        self.max_workers_global = max(1, settings.get('max_workers_global', 16))
+
+        # Límite global compartido por todos los análisis en curso
+        self.global_slots = threading.BoundedSemaphore(self.max_workers_global)
+
+        # Límite de sesiones simultáneas a través de cada jump host (jump_hosts.<id>.max_sessions)
+        self.max_workers_per_jump_host = max(1, settings.get('max_workers_per_jump_host', 8))
+        self.jump_slots = {
+            name: threading.BoundedSemaphore(max(1, jump.get('max_sessions', self.max_workers_per_jump_host)))
+            for name, jump in config.get('jump_hosts', {}).items()
+        }
+
+        # Cupos comunes a varios procesos (los fija el worker de WorkerPool): reemplazan a los de arriba
+        self.shared_slots = None
+
+        # Transportes persistentes a los jump hosts, compartidos por todas las sesiones
+        self.jump_pool = JumpHostPool.from_config(config)
+
+        # Sesiones ya autenticadas reutilizables entre análisis (opcional)
+        self.session_cache = SessionCache.from_config(config)
+        if self.jump_pool and self.session_cache:
+            # Las sesiones cacheadas retienen canales: se liberan si el pool se queda sin ellos
+            self.jump_pool.reclaim = self.session_cache.evict_for_jump
+
+        # Historial por dispositivo: plazos adaptativos, reintentos y circuito (opcional)
+        self.device_health = DeviceHealth.from_config(config)
+
+        # Sesiones como corrutinas en un bucle asyncio en lugar de un hilo por dispositivo (opcional)
+        self.async_transport = AsyncTransport.from_config(config, log=log)
+
+        # Parseo estructurado de las salidas, en su propio pool
+        self.parser = OutputParser.from_config(config)
+
+        # Histórico de CPU, memoria y errores de interfaz a partir de lo parseado
+        self.timeseries = TimeSeriesStore.from_config(config, log=log) if self.parser else None
+
+    def update_config(self, config):
+        """Configuración recargada: inventario, credenciales, checks y plazos para las nuevas sesiones.
+        
+        Los pools y los límites de concurrencia se mantienen hasta reiniciar; sólo se
+        agregan los cupos de jump hosts nuevos. Las sesiones cacheadas se cierran: pueden
+        apuntar a una IP o credencial que ya cambió (las prestadas vuelven con el análisis).
+        """
+        self.config = config
+        if self.session_cache:
+            self.session_cache.close_all()
+        for name, jump in config.get('jump_hosts', {}).items():
+            if name not in self.jump_slots:
+                self.jump_slots[name] = threading.BoundedSemaphore(
+                    max(1, jump.get('max_sessions', self.max_workers_per_jump_host))
+                )
+
+    def close(self):
+        """Cierra las conexiones persistentes (al terminar el proceso)"""
+        # Primero las sesiones cacheadas: retienen canales de los transportes del pool
+        if self.session_cache:
+            self.session_cache.close_all()
+        if self.jump_pool:
+            self.jump_pool.close_all()
+
+    def create_session(self, log_callback=None):
+        """Crea una sesión aislada (un NetworkCore por dispositivo)"""
+        session = NetworkCore(
+            config=self.config, logger=self.logger,
+            jump_pool=self.jump_pool, session_cache=self.session_cache,
+            device_health=self.device_health
+        )
+        log_callback = log_callback or self.log_callback
+        if log_callback:
+            session.set_log_callback(log_callback)
+        return session
+
+    def analyze_client(self, client_info, devices, checks, on_progress=None, on_result=None, cancel_event=None,
+                       incremental=None, log_callback=None):
+        """Analiza los dispositivos de un cliente y devuelve los resultados en orden estable.
+        
+        Con `incremental` (IncrementalAnalysis) se compara contra el reporte anterior.
+        `log_callback` reemplaza al callback de logs del motor para este análisis.
+        """
+        if not devices:
+            return []
+
+        if self.async_transport:
+            # Sin límite por cliente: las sesiones esperan al dispositivo sin ocupar hilos
+            futures = [
+                self.async_transport.submit(self._run_device_async(
+                    index, device, client_info, checks, on_progress, on_result, cancel_event, incremental,
+                    log_callback
+                ))
+                for index, device in enumerate(devices)
+            ]
+            results = [future.result() for future in futures]
+        else:
+            workers = min(self.max_workers_per_client, len(devices))
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis') as executor:
+                futures = [
+                    executor.submit(
+                        self._run_device, index, device, client_info, checks,
+                        on_progress, on_result, cancel_event, incremental, log_callback
+                    )
+                    for index, device in enumerate(devices)
+                ]
+                # Mismo orden que la lista de dispositivos, sin importar cuál termina antes
+                results = [future.result() for future in futures]
+
+        # Los que siguen en el parser se esperan aquí, ya sin ocupar hilos de análisis
+        return [r.result() if isinstance(r, Future) else r for r in results]
+
+    def _run_device(self, index, device, client_info, checks, on_progress, on_result, cancel_event, incremental,
+                    log_callback):
+        """Analiza un dispositivo respetando el límite global y el de su jump host"""
+        # Comandos que se toman del reporte anterior sin ejecutarlos
+        skipped = {}
+        if incremental:
+            checks, skipped = incremental.plan(device, checks)
+
+        with self._session_slot(client_info.get('jump_host'), cancel_event):
+            if cancel_event and cancel_event.is_set():
+                result = self._empty_result(device, 'cancelled')
+            elif not checks:
+                result = self._empty_result(device, 'completed')
+            else:
+                result = self._analyze(device, client_info, checks, on_progress, cancel_event, log_callback)
+
+        return self._after_device(index, device, client_info, result, on_progress, on_result, incremental, skipped)
+
+    async def _run_device_async(self, index, device, client_info, checks, on_progress, on_result, cancel_event,
+                                incremental, log_callback):
+        """Como _run_device, como corrutina en el bucle del transporte asyncio"""
+        skipped = {}
+        if incremental:
+            checks, skipped = incremental.plan(device, checks)
+
+        jump_host = client_info.get('jump_host')
+        jump_limit = self.config.get('jump_hosts', {}).get(jump_host, {}).get(
+            'max_sessions', self.max_workers_per_jump_host
+        )
+        shared = self.shared_slots.hold_async(jump_host, cancel_event) if self.shared_slots else nullcontext()
+        async with self.async_transport.session_slot(jump_host, jump_limit), shared:
+            if cancel_event and cancel_event.is_set():
+                result = self._empty_result(device, 'cancelled')
+            elif not checks:
+                result = self._empty_result(device, 'completed')
+            elif not jump_host and NetworkCore._direct_driver(device) == 'netmiko':
+                # netmiko es bloqueante: esos dispositivos se analizan en un hilo
+                result = await asyncio.to_thread(
+                    self._analyze, device, client_info, checks, on_progress, cancel_event, log_callback
+                )
+            else:
+                result = await self._analyze_async(device, client_info, checks, on_progress, cancel_event,
+                                                   log_callback)
+
+        # Parseo, callbacks e incremental fuera del bucle, como en el modo con hilos
+        return await asyncio.to_thread(
+            self._after_device, index, device, client_info, result, on_progress, on_result, incremental, skipped
+        )
+
+    @contextmanager
+    def _session_slot(self, jump_host, cancel_event=None):
+        """Cupo del jump host y luego el global, para no retener un cupo global mientras se espera"""
+        if self.shared_slots:
+            with self.shared_slots.hold(jump_host, cancel_event):
+                yield
+            return
+        with self.jump_slots.get(jump_host, nullcontext()), self.global_slots:
+            yield
+
+    def _after_device(self, index, device, client_info, result, on_progress, on_result, incremental, skipped):
+        client = client_info.get('nombre')
+        metrics.registry.inc('devices', client=client, status=result['status'])
+        finish = (index, device, result, on_progress, on_result, incremental, skipped)
+
+        # El parseo se hace fuera del límite global, con la sesión SSH ya liberada
+        if self.parser and result['checks']:
+            return self.parser.executor.submit(self._parse, client, *finish)
+
+        return self._finish_device(*finish)
+
+    def _parse(self, client, index, device, result, *finish):
+        start = time.monotonic()
+        try:
+            self.parser.parse_result(device.get('type'), result)
+        except Exception as e:
+            result['parse_error'] = str(e)
+        elapsed = time.monotonic() - start
+        result.setdefault('timings', {})['parse'] = round(elapsed, 4)
+        if self.timeseries:
+            self.timeseries.record(client, device['hostname'], result)
+        metrics.registry.observe('phase', elapsed, phase='parse', client=client)
+        return self._finish_device(index, device, result, *finish)
+
+    @staticmethod
+    def _finish_device(index, device, result, on_progress, on_result, incremental, skipped):
+        if incremental:
+            incremental.apply(device, result, skipped)
+        if on_progress:
+            on_progress(device, result['status'])
+        if on_result:
+            on_result(index, result)
+        return result
+
+    def _analyze(self, device, client_info, checks, on_progress, cancel_event, log_callback):
+        if on_progress:
+            on_progress(device, 'connecting')
+
+        session = self.create_session(log_callback)
+        session.cancel_event = cancel_event
+        try:
+            return session.analyze_device(device, client_info, checks)
+        except Exception as e:
+            session.log(f"ERROR inesperado en {device['hostname']}: {str(e)}", "ERROR")
+            session.disconnect()
+            result = self._empty_result(device, 'error')
+            result['error'] = str(e)
+            result['log_file'] = str(session.log_file)
+            result['full_log'] = list(session.full_log)
+            return result
+
+    async def _analyze_async(self, device, client_info, checks, on_progress, cancel_event, log_callback):
+        if on_progress:
+            # El callback emite por SocketIO: fuera del bucle
+            await self.async_transport.run_io(on_progress, device, 'connecting')
+
+        session = AsyncSession(
+            self.async_transport, config=self.config, logger=self.logger, device_health=self.device_health
+        )
+        session.set_log_callback(log_callback or self.log_callback)
+        session.cancel_event = cancel_event
+        try:
+            return await session.analyze_device_async(device, client_info, checks)
+        except Exception as e:
+            session.log(f"ERROR inesperado en {device['hostname']}: {str(e)}", "ERROR")
+            await session.disconnect_async()
+            result = self._empty_result(device, 'error')
+            result['error'] = str(e)
+            result['log_file'] = str(session.log_file)
+            result['full_log'] = list(session.full_log)
+            return result
+
+    @staticmethod
+    def _empty_result(device, status):
+        return {
+            'device': device['hostname'],
+            'ip': device['ip'],
+            'status': status,
+            'checks': {}
+        }
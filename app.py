@@ -1,28 +1,97 @@
 from flask import Flask, render_template, request, jsonify, send_file, Response
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, join_room
 from pathlib import Path
-import json
+import atexit
 import time
 from datetime import datetime
 from network_core import NetworkCore
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+from analysis_engine import AnalysisEngine
+from job_manager import JobManager
+from report_generator import ReportGenerator
+from incremental import IncrementalAnalysis
+from log_broadcaster import LogBroadcaster
+from scheduler import Scheduler
+from config_manager import ConfigManager
+from bulk_analysis import BulkAnalysis
+from worker_pool import WorkerPool
+from timeseries import TimeSeriesStore
+import metrics
+import queue
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-secret-key'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Modo threading: los eventos se emiten desde hilos del sistema (trabajos, logs), que eventlet
+# sin monkey_patch no despacha
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
-network = NetworkCore()
+# Configuración indexada, recargada al editar config/config.json
+config_manager = ConfigManager('config/config.json')
+network = NetworkCore(config=config_manager.config)
+config_manager.log = network.log
+if config_manager.last_error:
+    network.log(f"Configuración con errores: {config_manager.last_error}", "ERROR")
+
+# Logs al frontend en tramas periódicas, por sala (trabajo o socket que pidió el análisis)
+log_broadcaster = LogBroadcaster.from_config(
+    lambda event, data, room: socketio.emit(event, data, to=room),
+    network.config
+)
+
+def job_room(job_id):
+    return f"job:{job_id}"
 
 # Callback para enviar logs al frontend
 def emit_log(message):
-    socketio.emit('console_log', {'message': message})
+    log_broadcaster.publish(message)
 
 network.set_log_callback(emit_log)
 
+# Análisis en procesos de trabajo (sección workers): este proceso sólo encola, informa y guarda reportes
+worker_pool = WorkerPool.from_config(network.config, 'config/config.json', log_callback=emit_log, log=network.log)
+
+# Motor de análisis concurrente (una sesión aislada por dispositivo), sólo si no analizan los workers
+engine = None
+if not worker_pool:
+    engine = AnalysisEngine(network.config, logger=network.logger, log_callback=emit_log, log=network.log)
+    atexit.register(engine.close)
+runner = worker_pool or engine
+
+# Historial de salud y series temporales: con workers, el historial lo sirve el broker y las
+# series las escriben ellos en la misma base
+if worker_pool:
+    health = worker_pool.device_health
+    timeseries = None
+    if network.config.get('parsers', {}).get('enabled', True):
+        timeseries = TimeSeriesStore.from_config(network.config, log=network.log)
+else:
+    health = engine.device_health
+    timeseries = engine.timeseries
+
+def emit_device_progress(device, status):
+    socketio.emit('device_progress', {
+        'device': device['hostname'],
+        'device_id': device['id'],
+        'status': status
+    })
+
+# Reportes en data/reports con índice para el listado
+report_store = ReportGenerator.from_config(network.config, log=network.log)
+if worker_pool and worker_pool.pdf:
+    report_store.pdf_builder = worker_pool.build_pdf
+
+def save_report(client_id, results):
+    """Guarda el reporte en data/reports y devuelve su id"""
+    return report_store.save_report(results)
+
+# Trabajos de análisis en segundo plano
+jobs = JobManager.from_config(
+    runner, network.config,
+    max_concurrent_jobs=worker_pool.max_jobs if worker_pool else None,
+    on_event=lambda event, payload: socketio.emit(event, payload),
+    on_complete=lambda job, results: save_report(job.client_id, results),
+    on_log=lambda job, message: log_broadcaster.publish(message, job_room(job.id))
+)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -31,57 +100,257 @@ def index():
 def analysis():
     return render_template('analysis.html')
 
+def report_filters(args):
+    """Filtros, orden y página del listado de reportes a partir de la query string"""
+    return {
+        'page': args.get('page', 1, type=int),
+        'per_page': args.get('per_page', 50, type=int),
+        'client': args.get('client') or None,
+        'status': args.get('status') or None,
+        'date_from': args.get('date_from') or None,
+        'date_to': args.get('date_to') or None,
+        'sort': args.get('sort', 'timestamp'),
+        'order': args.get('order', 'desc')
+    }
+
 @app.route('/reports')
 def reports():
     """Vista de reportes"""
-    reports_list = []
-    reports_dir = Path('data/reports')
-    
-    if reports_dir.exists():
-        for report_file in reports_dir.glob('*.json'):
-            try:
-                with open(report_file) as f:
-                    data = json.load(f)
-                    reports_list.append({
-                        'id': report_file.stem,
-                        'client': data.get('client_name', 'Unknown'),
-                        'timestamp': data.get('timestamp', ''),
-                        'devices': len(data.get('devices', []))
-                    })
-            except:
-                continue
-    
-    return render_template('reports.html', reports=reports_list)
+    filters = report_filters(request.args)
+    reports_list, total = report_store.get_reports_list(**filters)
+    pages = max(1, -(-total // max(1, min(filters['per_page'], 500))))
+    
+    return render_template(
+        'reports.html',
+        reports=reports_list,
+        total=total,
+        pages=pages,
+        filters=filters,
+        clients=report_store.list_clients()
+    )
+
+@app.route('/api/reports')
+def list_reports():
+    """Listado paginado de reportes (mismos filtros que /reports)"""
+    filters = report_filters(request.args)
+    reports_list, total = report_store.get_reports_list(**filters)
+    return jsonify({
+        'reports': reports_list,
+        'total': total,
+        'page': filters['page'],
+        'per_page': filters['per_page']
+    })
+
+@app.route('/api/report/<report_id>')
+def get_report(report_id):
+    """Cabecera del reporte (las salidas largas como referencias); ?full=1 para resolverlas"""
+    if request.args.get('full'):
+        report = report_store.get_report(report_id)
+    else:
+        report = report_store.load_header(report_id)
+    if not report:
+        return jsonify({'error': 'Reporte no encontrado'}), 404
+    return jsonify(report)
+
+@app.route('/api/report/<report_id>/output')
+def get_report_output(report_id):
+    """Salida de un comando del reporte (?device=&check=&command=)"""
+    output = report_store.get_output(
+        report_id,
+        request.args.get('device'),
+        request.args.get('check'),
+        request.args.get('command')
+    )
+    if output is None:
+        return jsonify({'error': 'Salida no encontrada'}), 404
+    return Response(output, mimetype='text/plain')
 
 @app.route('/api/config')
 def get_config():
     return jsonify(network.config)
 
-@app.route('/api/analyze/<client_id>', methods=['POST'])
-def analyze_client(client_id):
-    data = request.json
+@app.route('/api/config/status')
+def config_status():
+    return jsonify(config_manager.status())
+
+@app.route('/api/config/reload', methods=['POST'])
+def reload_config():
+    """Fuerza la relectura de config.json (409 si no es válido)"""
+    reloaded = config_manager.reload(force=True)
+    status = config_manager.status()
+    if not reloaded and status['last_error']:
+        return jsonify({'success': False, **status}), 409
+    return jsonify({'success': True, **status})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus"""
+    text = metrics.registry.render()
     
+    job_states = {}
+    for job in jobs.list():
+        job_states[job['status']] = job_states.get(job['status'], 0) + 1
+    text += metrics.gauge_lines('jobs', [({'status': k}, v) for k, v in sorted(job_states.items())],
+                                'Trabajos conocidos por estado')
+    text += metrics.gauge_lines('log_dropped', [({}, network.logger.dropped)],
+                                'Líneas de log descartadas por el escritor')
+    if engine and engine.jump_pool:
+        pool = engine.jump_pool.stats()
+        text += metrics.gauge_lines('jump_handshakes', [({}, pool['handshakes'])],
+                                    'Handshakes con jump hosts desde el arranque')
+    if health:
+        states = health.stats()
+        text += metrics.gauge_lines('device_circuit', [({'state': k}, v) for k, v in sorted(states.items())],
+                                    'Dispositivos por estado del circuito de conexión')
+    if engine and engine.session_cache:
+        cache = engine.session_cache.stats()
+        text += metrics.gauge_lines('session_cache', [({'value': k}, v) for k, v in sorted(cache.items())],
+                                    'Estado de la cache de sesiones')
+    if engine and engine.async_transport:
+        transport = engine.async_transport.stats()
+        text += metrics.gauge_lines('async_transport', [({'value': k}, v) for k, v in sorted(transport.items())],
+                                    'Sesiones y conexiones del transporte asyncio')
+    if worker_pool:
+        pool_status = worker_pool.status()
+        alive = sum(1 for worker in pool_status['workers'] if worker['alive'])
+        text += metrics.gauge_lines('workers', [({}, alive)], 'Procesos de trabajo conectados')
+        text += metrics.gauge_lines('worker_tasks', [({'state': 'queued'}, pool_status['queued']),
+                                                     ({'state': 'running'}, pool_status['running'])],
+                                    'Análisis enviados a los procesos de trabajo')
+    
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+def epoch_arg(value):
+    """Instante de la query string: epoch o fecha ISO"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/timeseries/series')
+def timeseries_series():
+    """Series disponibles (?client=&device=&metric=)"""
+    if not timeseries:
+        return jsonify({'error': 'Histórico de métricas deshabilitado'}), 404
+    return jsonify({'series': timeseries.list_series(
+        request.args.get('client'), request.args.get('device'), request.args.get('metric')
+    )})
+
+@app.route('/api/timeseries')
+def timeseries_query():
+    """Puntos de una métrica de un dispositivo (?device=&metric=&from=&to=&label=&step=&agg=)"""
+    if not timeseries:
+        return jsonify({'error': 'Histórico de métricas deshabilitado'}), 404
+    if not request.args.get('device') or not request.args.get('metric'):
+        return jsonify({'error': 'Se requieren device y metric'}), 400
+    try:
+        data = timeseries.query(
+            request.args['device'], request.args['metric'],
+            start=epoch_arg(request.args.get('from')),
+            end=epoch_arg(request.args.get('to')),
+            label=request.args.get('label'),
+            client=request.args.get('client'),
+            step=request.args.get('step', type=int),
+            agg=request.args.get('agg', 'avg')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(data)
+
+@app.route('/api/device-health')
+def device_health():
+    """Estado de conexión por dispositivo: circuito, fallas y latencias aprendidas"""
+    if not health:
+        return jsonify({'enabled': False, 'devices': {}})
+    return jsonify({'enabled': True, 'devices': health.status()})
+
+@app.route('/api/workers')
+def workers_status():
+    """Procesos de trabajo conectados al broker y tareas en curso"""
+    if not worker_pool:
+        return jsonify({'enabled': False})
+    return jsonify(dict(worker_pool.status(), enabled=True))
+
+@app.route('/api/logs')
+def recent_logs():
+    """Últimas líneas del log de sesión (buffer en memoria)"""
+    limit = request.args.get('limit', 200, type=int)
+    return jsonify({
+        'log_file': str(network.log_file),
+        'lines': network.logger.recent(limit),
+        'dropped': network.logger.dropped
+    })
+
+def analysis_request_data():
+    """Cuerpo JSON de una petición de análisis ({} si no hay) y el motivo si no es válido"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return None, "El cuerpo debe ser un objeto JSON"
+    for key in ('devices', 'checks', 'commands'):
+        if key in data and not isinstance(data[key], list):
+            return None, f"'{key}' debe ser una lista"
+    if data.get('sid') is not None and not isinstance(data['sid'], str):
+        return None, "'sid' debe ser un texto"
+    return data, None
+
+def parse_analysis_request(client_id, data):
+    """Obtiene cliente, dispositivos y checks de la petición de análisis"""
     # IMPORTANTE: Usar el modo correcto
     analysis_mode = data.get('mode', 'checklist')
     
+    snapshot = config_manager.snapshot
     if analysis_mode == 'custom':
         # Usar comandos personalizados
         commands = data.get('commands', [])
         checks = {'custom': commands}
     else:
         # Usar checklist
-        selected_checks = data.get('checks', ['health'])
-        checks = {}
-        for check_name in selected_checks:
-            if check_name in network.config['checks']:
-                checks[check_name] = network.config['checks'][check_name]
+        checks = snapshot.select_checks(data.get('checks', ['health']))
     
-    # Solo dispositivos seleccionados
-    selected_devices = data.get('devices', [])
+    client_info = snapshot.clients.get(client_id)
+    if not client_info:
+        return None, [], checks
     
-    client_info = network.config['clientes'].get(client_id)
+    # Solo dispositivos seleccionados (búsqueda por id en el índice)
+    devices = snapshot.select_devices(client_id, data.get('devices', []))
+    return client_info, devices, checks
+
+def incremental_for(client_id, data):
+    """Análisis incremental contra el último reporte del cliente, si se pidió y hay uno"""
+    default = network.config.get('incremental', {}).get('default', False)
+    if not data.get('incremental', default):
+        return None
+    return IncrementalAnalysis.from_config(report_store, client_id, network.config)
+
+# Barridos programados de toda la flota (sección scheduler)
+scheduler = Scheduler.from_config(jobs, network.config, incremental_for=incremental_for, log=network.log)
+if network.config.get('scheduler', {}).get('enabled', False):
+    scheduler.start()
+
+def apply_config(snapshot):
+    """Nueva configuración para los próximos análisis (los que están en curso no se tocan)"""
+    network.config = snapshot.data
+    if engine:
+        engine.update_config(snapshot.data)
+    else:
+        worker_pool.update_config(snapshot.data)
+    scheduler.config = snapshot.data
+    network.log(f"Configuración recargada (versión {snapshot.version})")
+
+config_manager.subscribe(apply_config)
+config_manager.start()
+
+@app.route('/api/analyze/<client_id>', methods=['POST'])
+def analyze_client(client_id):
+    data, error = analysis_request_data()
+    if error:
+        return jsonify({'error': error}), 400
+    client_info, devices, checks = parse_analysis_request(client_id, data)
     if not client_info:
         return jsonify({'error': 'Cliente no encontrado'}), 404
+    incremental = incremental_for(client_id, data)
     
     results = {
         'client_id': client_id,
@@ -90,30 +359,22 @@ def analyze_client(client_id):
         'devices': []
     }
     
-    # Solo analizar dispositivos seleccionados
-    for device in client_info['devices']:
-        if device['id'] in selected_devices:
-            socketio.emit('device_progress', {
-                'device': device['hostname'],
-                'status': 'connecting'
-            })
-            
-            result = network.analyze_device(device, client_info, checks)
-            results['devices'].append(result)
-            
-            socketio.emit('device_progress', {
-                'device': device['hostname'],
-                'status': result['status']
-            })
+    # Solo analizar dispositivos seleccionados (en paralelo, orden estable)
+    # Los logs van sólo al socket que pidió el análisis (si lo indicó)
+    sid = data.get('sid')
+    started = time.monotonic()
+    results['devices'] = runner.analyze_client(
+        client_info, devices, checks,
+        on_progress=emit_device_progress,
+        incremental=incremental,
+        log_callback=(lambda message: log_broadcaster.publish(message, sid)) if sid else None
+    )
+    results['timings'] = {'analysis': round(time.monotonic() - started, 4)}
+    if incremental:
+        results['incremental'] = incremental.summary(results['devices'])
     
     # Guardar reporte
-    timestamp = int(time.time())
-    report_id = f"{client_id}_{timestamp}"
-    report_path = Path('data/reports') / f"{report_id}.json"
-    report_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(report_path, 'w') as f:
-        json.dump(results, f, indent=2)
+    report_id = save_report(client_id, results)
     
     return jsonify({
         'success': True,
@@ -121,87 +382,114 @@ def analyze_client(client_id):
         'report_id': report_id
     })
 
+@app.route('/api/bulk/analyze', methods=['POST'])
+def analyze_bulk():
+    """Varios clientes en una petición; resultados por dispositivo en NDJSON a medida que terminan"""
+    bulk, errors = BulkAnalysis.from_request(
+        runner, config_manager.snapshot, request.get_json(silent=True), network.config,
+        incremental_for=incremental_for,
+        save_report=save_report
+    )
+    if not bulk:
+        return jsonify({'error': 'Petición inválida', 'details': errors}), 400
+    
+    # Sin buffer intermedio: cada línea sale apenas la produce el análisis
+    response = Response(bulk.stream(), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/jobs/<client_id>', methods=['POST'])
+def submit_job(client_id):
+    """Encola un análisis y devuelve el id del trabajo sin esperar a que termine"""
+    data, error = analysis_request_data()
+    if error:
+        return jsonify({'error': error}), 400
+    client_info, devices, checks = parse_analysis_request(client_id, data)
+    if not client_info:
+        return jsonify({'error': 'Cliente no encontrado'}), 404
+    
+    try:
+        job = jobs.submit(client_id, client_info, devices, checks, incremental_for(client_id, data))
+    except queue.Full:
+        return jsonify({'error': 'Cola de análisis llena, intente más tarde'}), 503
+    
+    # Suscribir al socket que lo pidió antes de que lleguen los primeros logs
+    sid = data.get('sid')
+    if sid:
+        socketio.server.enter_room(sid, job_room(job.id), namespace='/')
+    
+    return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+
+@app.route('/api/jobs')
+def list_jobs():
+    return jsonify({'jobs': jobs.list()})
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/results')
+def job_results(job_id):
+    """Resultados por dispositivo a medida que terminan (?since=N para paginar)"""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    partial = jobs.partial_results(job, since)
+    return jsonify({
+        'job': job.to_dict(),
+        'results': partial,
+        'next': since + len(partial)
+    })
+
+@socketio.on('join_job')
+def join_job(data):
+    """Suscribe el socket a los logs de un trabajo (p. ej. tras reconectar)"""
+    if jobs.get(data.get('job_id')):
+        join_room(job_room(data['job_id']))
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/schedules')
+def list_schedules():
+    """Programaciones, próxima ejecución y barridos recientes"""
+    return jsonify(scheduler.status())
+
+@app.route('/api/schedules/<name>/run', methods=['POST'])
+def run_schedule(name):
+    """Lanza un barrido programado en este momento"""
+    if name not in scheduler.schedules:
+        return jsonify({'error': 'Programación no encontrada'}), 404
+    if not scheduler.run_now(name):
+        return jsonify({'error': 'El barrido ya está en curso'}), 409
+    return jsonify({'success': True}), 202
+
 @app.route('/api/report/pdf/<report_id>')
 def export_pdf(report_id):
-    """Generar PDF real"""
-    report_path = Path('data/reports') / f"{report_id}.json"
+    """Descargar el PDF del reporte (desde la cache si ya está generado); ?full=1 sin recortar salidas"""
+    full = bool(request.args.get('full'))
+    pdf_path = report_store.generate_pdf(report_id, full=full)
     
-    if not report_path.exists():
+    if not pdf_path:
         return jsonify({'error': 'Reporte no encontrado'}), 404
     
-    with open(report_path) as f:
-        data = json.load(f)
-    
-    # Crear PDF en memoria
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Título
-    title = Paragraph(f"Reporte de Análisis - {data['client_name']}", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
-    
-    # Fecha
-    info = Paragraph(f"Fecha: {data['timestamp']}", styles['Normal'])
-    story.append(info)
-    story.append(Spacer(1, 12))
-    
-    # Tabla de dispositivos
-    table_data = [['Dispositivo', 'IP', 'Estado']]
-    
-    for device in data.get('devices', []):
-        table_data.append([
-            device.get('device', 'N/A'),
-            device.get('ip', 'N/A'),
-            device.get('status', 'N/A')
-        ])
-    
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 24))
-    
-    # Agregar outputs de comandos
-    for device in data.get('devices', []):
-        story.append(Paragraph(f"<b>{device.get('device', 'N/A')}</b>", styles['Heading2']))
-        
-        for check_name, check_data in device.get('checks', {}).items():
-            story.append(Paragraph(f"Check: {check_name}", styles['Heading3']))
-            
-            for cmd, output in check_data.get('outputs', {}).items():
-                story.append(Paragraph(f"<b>Comando:</b> {cmd}", styles['Normal']))
-                
-                # Limitar output para PDF
-                output_text = output[:500] if output else "Sin salida"
-                if len(output) > 500:
-                    output_text += "... (output truncado)"
-                
-                output_para = Paragraph(f"<pre>{output_text}</pre>", styles['Code'])
-                story.append(output_para)
-                story.append(Spacer(1, 6))
-    
-    # Generar PDF
-    doc.build(story)
-    
-    buffer.seek(0)
-    
+    # send_file entrega el archivo por bloques, sin cargarlo entero en memoria
     return send_file(
-        buffer,
+        pdf_path,
         as_attachment=True,
-        download_name=f'report_{report_id}.pdf',
-        mimetype='application/pdf'
+        download_name=f"report_{report_id}{'_completo' if full else ''}.pdf",
+        mimetype='application/pdf',
+        conditional=True
     )
 
 if __name__ == '__main__':
@@ -213,4 +501,5 @@ if __name__ == '__main__':
     print("Servidor en: http://localhost:5000")
     print("="*50)
     
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Servidor de werkzeug (modo threading) también fuera de una terminal, p. ej. como servicio
+    socketio.run(app, debug=True, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
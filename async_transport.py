@@ -0,0 +1,488 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from network_core import (
+    NetworkCore, AuthenticationFailed, PASSWORD_PATTERN, HOSTKEY_PATTERN, MORE_PATTERN, SSH_ERROR_PATTERN,
+    DEVICE_PROMPT_PATTERN, SHELL_PROMPT_PATTERN, PROMPT_TAIL_SIZE, PAGING_COMMANDS
+)
+from output_spool import OutputCleaner, CommandDemuxer, output_text
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+
+class AsyncTransport:
+    """Bucle asyncio propio (un solo hilo) donde corren las sesiones SSH de todos los análisis.
+
+    Cada sesión es una corrutina: esperar al dispositivo no ocupa un hilo, así
+    que un proceso puede mantener cientos de sesiones abiertas a la vez. Las
+    conexiones a los jump hosts se comparten (varios canales por conexión,
+    como en JumpHostPool). `max_sessions` limita las sesiones simultáneas del
+    proceso y `jump_hosts.<id>.max_sessions` las de cada jump host. Lo que
+    bloquea (spool en disco, historial de salud, callbacks de progreso) corre
+    en un pool de `io_workers` hilos para no frenar al resto de las sesiones.
+    """
+
+    def __init__(self, max_sessions=500, keepalive=30, idle_timeout=300, max_channels=10, connect_timeout=30,
+                 io_workers=8):
+        if asyncssh is None:
+            raise RuntimeError("El transporte asyncio requiere asyncssh (pip install asyncssh)")
+        self.max_sessions = max(1, max_sessions)
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.max_channels = max(1, max_channels)
+        self.connect_timeout = connect_timeout
+
+        self.slots = asyncio.Semaphore(self.max_sessions)
+        self.jump_slots = {}  # jump host -> asyncio.Semaphore
+        self.jump_connections = {}  # (host, puerto, usuario) -> [{'conn', 'channels', 'last_used'}]
+        self.jump_locks = {}  # Una negociación a la vez por clave
+        self.handshakes = 0
+        self.active = 0
+        self.io = ThreadPoolExecutor(max_workers=max(1, io_workers), thread_name_prefix='async-io')
+
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run, daemon=True, name='async-transport').start()
+
+    @classmethod
+    def from_config(cls, config, log=None):
+        """Crea el transporte según la sección async_transport (None si está deshabilitado)"""
+        settings = config.get('async_transport', {})
+        if not settings.get('enabled', False):
+            return None
+        if asyncssh is None:
+            if log:
+                log("async_transport habilitado pero asyncssh no está instalado (pip install asyncssh); "
+                    "se usan hilos", "WARNING")
+            return None
+        pool = config.get('jump_pool', {})
+        return cls(
+            max_sessions=settings.get('max_sessions', 500),
+            keepalive=pool.get('keepalive', 30),
+            idle_timeout=pool.get('idle_timeout', 300),
+            max_channels=pool.get('max_channels', 10),
+            connect_timeout=config.get('ssh', {}).get('connect_timeout', 30),
+            io_workers=settings.get('io_workers', 8)
+        )
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._reap_loop())
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """Lanza la corrutina en el bucle del transporte (devuelve un concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def run_io(self, func, *args):
+        """Ejecuta trabajo bloqueante en el pool de E/S y espera el resultado sin frenar el bucle"""
+        return await self.loop.run_in_executor(self.io, func, *args)
+
+    @asynccontextmanager
+    async def session_slot(self, jump_host, jump_limit):
+        """Cupo del jump host y luego el global (como los semáforos del motor)"""
+        if jump_host and jump_host not in self.jump_slots:
+            self.jump_slots[jump_host] = asyncio.Semaphore(max(1, jump_limit))
+        jump_slot = self.jump_slots.get(jump_host)
+        if jump_slot:
+            await jump_slot.acquire()
+        try:
+            async with self.slots:
+                self.active += 1
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+        finally:
+            if jump_slot:
+                jump_slot.release()
+
+    async def acquire_jump(self, jump_info, jump_creds):
+        """Conexión al jump host con canales libres (se abre una nueva si todas están llenas)"""
+        key = (jump_info['host'], jump_info.get('port', 22), jump_creds['username'])
+        lock = self.jump_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entries = self.jump_connections.setdefault(key, [])
+            entries[:] = [entry for entry in entries if not entry['conn'].is_closed()]
+            entry = next((e for e in entries if e['channels'] < self.max_channels), None)
+            if entry is None:
+                conn = await asyncssh.connect(
+                    jump_info['host'],
+                    port=jump_info.get('port', 22),
+                    username=jump_creds['username'],
+                    password=jump_creds['password'],
+                    known_hosts=None,
+                    client_keys=None,
+                    agent_path=None,
+                    connect_timeout=self.connect_timeout,
+                    keepalive_interval=self.keepalive
+                )
+                self.handshakes += 1
+                entry = {'conn': conn, 'channels': 0, 'last_used': time.monotonic()}
+                entries.append(entry)
+            entry['channels'] += 1
+            entry['last_used'] = time.monotonic()
+            return entry
+
+    @staticmethod
+    def release_jump(entry):
+        entry['channels'] -= 1
+        entry['last_used'] = time.monotonic()
+
+    async def _reap_loop(self):
+        """Cierra las conexiones a jump hosts sin canales y ociosas más de `idle_timeout`"""
+        while True:
+            await asyncio.sleep(min(30, self.idle_timeout))
+            now = time.monotonic()
+            for entries in self.jump_connections.values():
+                for entry in list(entries):
+                    if entry['channels'] == 0 and now - entry['last_used'] > self.idle_timeout:
+                        entries.remove(entry)
+                        entry['conn'].close()
+
+    def stats(self):
+        return {
+            'active_sessions': self.active,
+            'max_sessions': self.max_sessions,
+            'jump_connections': sum(len(entries) for entries in self.jump_connections.values()),
+            'handshakes': self.handshakes
+        }
+
+
+class AsyncSession(NetworkCore):
+    """Sesión de un dispositivo sobre asyncssh: el mismo flujo que NetworkCore en corrutinas.
+
+    Conexión por jump host (shell con 'ssh usuario@ip' o túnel), login, enable
+    y envío de comandos en lote con el mismo demultiplexado por prompt. Los
+    logs, la captura de salidas y el historial de salud son los de NetworkCore:
+    la captura (que escribe el spool) y el historial corren en el pool de E/S
+    del transporte; los logs sólo se encolan (SessionLogger, LogBroadcaster).
+    Las sesiones no se guardan en la SessionCache (sólo admite conexiones paramiko)
+    y las conexiones directas que requieren netmiko siguen yendo por NetworkCore.
+    """
+
+    def __init__(self, transport, **kwargs):
+        super().__init__(**kwargs)
+        self.transport = transport
+        self.process = None  # Shell interactivo (en el dispositivo o en el jump host)
+        self.device_conn = None  # Conexión asyncssh propia del dispositivo (túnel o directa)
+        self.jump_entry = None  # Canal reservado en una conexión compartida al jump host
+
+    async def analyze_device_async(self, device_info, client_info, checks):
+        """Como analyze_device, sin bloquear el bucle mientras se espera al dispositivo"""
+        started = time.monotonic()
+        results, health_key = await self.transport.run_io(self._start_analysis, device_info, client_info, checks)
+        if results['status'] != 'analyzing':
+            return results
+
+        with self.timed('connect'):
+            connected = await self._connect_with_retries_async(device_info, client_info)
+        if not connected:
+            return await self.transport.run_io(self._connection_failed, results, health_key)
+
+        try:
+            for check_name, commands in checks.items():
+                self.log(f"\nEJECUTANDO: {check_name}")
+                check_result = {'outputs': {}}
+                if not self._cancelled():
+                    check_result['outputs'] = await self.send_commands_async(commands)
+                results['checks'][check_name] = check_result
+        finally:
+            await self.disconnect_async()
+        return await self.transport.run_io(self._finish_analysis, results, health_key, started)
+
+    @staticmethod
+    def _transient(error):
+        if isinstance(error, (asyncssh.PermissionDenied, AuthenticationFailed)):
+            return False
+        if isinstance(error, (asyncssh.Error, asyncio.TimeoutError)):
+            return True
+        return NetworkCore._transient(error)
+
+    async def _connect_with_retries_async(self, device_info, client_info):
+        retries = self.device_health.retries if self.device_health else 0
+        for attempt in range(retries + 1):
+            self.last_error = None
+            if await self.connect_device_async(device_info, client_info):
+                return True
+            if attempt == retries or not self._transient(self.last_error) or self._cancelled():
+                return False
+
+            delay = self.device_health.backoff(attempt)
+            self.log(f"Reintentando conexión ({attempt + 1}/{retries}) en {delay:.1f}s", "WARNING")
+            await asyncio.sleep(delay)
+        return False
+
+    async def connect_device_async(self, device_info, client_info):
+        self.log(f"INICIANDO CONEXIÓN A {device_info['hostname']} ({device_info['ip']})")
+        creds = self.get_credentials(client_info.get('credential', 'default'))
+        if not creds:
+            self.log(f"ERROR: No se encontraron credenciales", "ERROR")
+            return False
+
+        try:
+            if client_info.get('jump_host'):
+                jump_info = self.config['jump_hosts'][client_info['jump_host']]
+                jump_creds = self.get_credentials(jump_info['credential'])
+                self.log(f"Usando Jump Host: {jump_info['host']}")
+
+                with self.timed('jump'):
+                    self.jump_entry = await self.transport.acquire_jump(jump_info, jump_creds)
+                self.log("✓ Conectado a Bridgenet")
+
+                with self.timed('auth'):
+                    if jump_info.get('mode', 'shell') == 'tunnel':
+                        output = await self._open_device_shell_async(device_info, creds, self.jump_entry['conn'])
+                    else:
+                        output = await self._login_via_jump_shell_async(device_info, creds)
+            else:
+                self.log(f"Conectando directamente a {device_info['ip']}")
+                with self.timed('auth'):
+                    output = await self._open_device_shell_async(device_info, creds)
+
+            with self.timed('enable'):
+                await self._enter_enable_async(output, creds)
+            self.log(f"✓ Conexión establecida con {device_info['hostname']}")
+            return True
+
+        except Exception as e:
+            self.log(f"ERROR en conexión: {str(e)}", "ERROR")
+            self.last_error = e
+            await self.disconnect_async()
+            return False
+
+    async def _open_shell(self, conn):
+        return await conn.create_process(term_type='vt100', encoding='utf-8', errors='ignore')
+
+    async def _login_via_jump_shell_async(self, device_info, device_creds):
+        """Shell en el jump host y 'ssh usuario@ip' hacia el dispositivo"""
+        self.process = await self._open_shell(self.jump_entry['conn'])
+        output = await self._read_banner_async()
+        jump_prompt = self._learn_prompt(output)
+        self.log("BANNER BRIDGENET:", show_in_gui=False)
+        self.log(output)
+
+        ssh_cmd = f"ssh {device_creds['username']}@{device_info['ip']}"
+        self.log(f"Ejecutando: {ssh_cmd}")
+        self.process.stdin.write(ssh_cmd + '\n')
+
+        patterns = [PASSWORD_PATTERN, HOSTKEY_PATTERN, SSH_ERROR_PATTERN, DEVICE_PROMPT_PATTERN]
+        if jump_prompt:
+            patterns.insert(2, jump_prompt)
+        output, match = await self._read_until_async(patterns, self.login_timeout)
+        self.log(f"Respuesta SSH: {output}", show_in_gui=False)
+
+        if match is not None and patterns[match] is HOSTKEY_PATTERN:
+            self.process.stdin.write('yes\n')
+            output, match = await self._read_until_async(patterns, self.login_timeout)
+
+        if match is None or patterns[match] in (SSH_ERROR_PATTERN, jump_prompt):
+            error = AuthenticationFailed if 'permission denied' in output.lower() else ConnectionError
+            raise error(f"Bridgenet no pudo abrir SSH a {device_info['ip']}: {output.strip()[-200:]}")
+
+        if patterns[match] is PASSWORD_PATTERN:
+            self.log("Enviando contraseña...")
+            self.process.stdin.write(device_creds['password'] + '\n')
+            output, match = await self._read_until_async([DEVICE_PROMPT_PATTERN, PASSWORD_PATTERN], self.login_timeout)
+            if match != 0:
+                raise AuthenticationFailed("Autenticación rechazada por el dispositivo")
+            self.log("BANNER DEL DISPOSITIVO:")
+            self.log(output)
+        return output
+
+    async def _open_device_shell_async(self, device_info, device_creds, tunnel=None):
+        """Autentica por SSH con el dispositivo (directo o por el túnel del jump host) y espera su prompt"""
+        if tunnel is not None:
+            self.log(f"Abriendo túnel hacia {device_info['ip']}:{device_info.get('port', 22)}")
+
+        self.device_conn = await asyncssh.connect(
+            device_info['ip'],
+            port=device_info.get('port', 22),
+            tunnel=tunnel,
+            username=device_creds['username'],
+            password=device_creds['password'],
+            known_hosts=None,
+            client_keys=None,
+            agent_path=None,
+            connect_timeout=self.connect_timeout,
+            login_timeout=self.login_timeout
+        )
+        self.process = await self._open_shell(self.device_conn)
+        output, match = await self._read_until_async([DEVICE_PROMPT_PATTERN], self.login_timeout)
+        if match is None:
+            raise ConnectionError("No se detectó el prompt del dispositivo")
+        self.log("BANNER DEL DISPOSITIVO:")
+        self.log(output)
+        return output
+
+    async def _enter_enable_async(self, output, device_creds):
+        prompt = self._learn_prompt(output)
+        self.log(f"PROMPT DETECTADO: {output.strip().splitlines()[-1] if output.strip() else ''}")
+
+        if output.rstrip().endswith('>'):
+            self.log("Entrando a modo enable...")
+            self.process.stdin.write('enable\n')
+            output, match = await self._read_until_async([PASSWORD_PATTERN, prompt], self.login_timeout)
+            if match == 0:
+                self.log("Enviando enable password...")
+                self.process.stdin.write(device_creds.get('enable_password', device_creds['password']) + '\n')
+                output, _ = await self._read_until_async([prompt, PASSWORD_PATTERN], self.login_timeout)
+
+            if output.rstrip().endswith('#'):
+                self.log("✓ Modo enable activado")
+            else:
+                self.log("Continuando en modo usuario")
+
+        self.prompt_pattern = prompt
+
+    async def _read_banner_async(self):
+        """Como _read_banner: el prompt es lo último antes del silencio"""
+        deadline = time.monotonic() + self.login_timeout
+        output, match = await self._read_until_async([SHELL_PROMPT_PATTERN], self.login_timeout)
+        while match is not None:
+            more, match = await self._read_until_async([SHELL_PROMPT_PATTERN], self.banner_quiet)
+            if not more:
+                break
+            output += more
+            if match is None:
+                more, match = await self._read_until_async([SHELL_PROMPT_PATTERN], deadline - time.monotonic())
+                output += more
+        return output
+
+    async def _read_until_async(self, patterns, timeout, sink=None):
+        """Como _read_until, esperando los datos sin bloquear el bucle"""
+        deadline = time.monotonic() + timeout
+        chunks = []
+        tail = ""
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                text = await asyncio.wait_for(self.process.stdout.read(4096), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not text:
+                # Canal cerrado por el otro extremo
+                break
+
+            if sink:
+                await self.transport.run_io(sink, text)
+            else:
+                chunks.append(text)
+
+            tail = (tail + text)[-PROMPT_TAIL_SIZE:]
+            for index, pattern in enumerate(patterns):
+                if pattern.search(tail):
+                    return ''.join(chunks), index
+
+        return ''.join(chunks), None
+
+    async def send_command_async(self, command):
+        with self.timed('command', command):
+            self.log(f"EJECUTANDO COMANDO: {command}")
+            capture = await self.transport.run_io(self.spool.open, self.device_name, command)
+            cleaner = OutputCleaner(command, capture)
+            try:
+                self.process.stdin.write(command + '\n')
+                prompt = self.prompt_pattern or DEVICE_PROMPT_PATTERN
+                deadline = time.monotonic() + self.command_timeout
+                while True:
+                    _, match = await self._read_until_async(
+                        [prompt, MORE_PATTERN], max(deadline - time.monotonic(), 0), sink=cleaner.feed
+                    )
+                    if match == 1:
+                        self.process.stdin.write(' ')
+                        continue
+                    if match is None:
+                        self.log(f"Tiempo agotado esperando el prompt tras '{command}'", "WARNING")
+                    break
+            except Exception as e:
+                self.log(f"ERROR ejecutando comando: {str(e)}", "ERROR")
+
+            clean_output = await self.transport.run_io(cleaner.finish)
+            self.log(f"RESPUESTA: {capture.preview_text()[:500] or 'Sin salida'}")
+            return clean_output
+
+    async def send_commands_async(self, commands):
+        """Como send_commands: un solo envío y salidas separadas por el prompt + eco"""
+        if len(commands) < 2 or not self.pipeline or not await self._disable_paging_async():
+            outputs = {}
+            for cmd in commands:
+                if self._cancelled():
+                    break
+                outputs[cmd] = await self.send_command_async(cmd)
+            return outputs
+
+        self.log(f"EJECUTANDO COMANDOS ({len(commands)} en lote): {', '.join(commands)}")
+
+        prompt = self.prompt_pattern or DEVICE_PROMPT_PATTERN
+        demuxer = CommandDemuxer(
+            commands,
+            lambda cmd: OutputCleaner(cmd, self.spool.open(self.device_name, cmd)),
+            self._prompt_line(prompt)
+        )
+
+        try:
+            demuxer.starts[0] = time.monotonic()
+            self.process.stdin.write('\n'.join(commands) + '\n')
+
+            deadline = time.monotonic() + self.command_timeout * len(commands)
+            while True:
+                _, match = await self._read_until_async(
+                    [prompt, MORE_PATTERN], max(deadline - time.monotonic(), 0), sink=demuxer.feed
+                )
+                if match == 1:
+                    self.process.stdin.write(' ')
+                    continue
+                if match is None:
+                    self.log(f"Tiempo agotado esperando el lote ({demuxer.index + 1}/{len(commands)} comandos)", "WARNING")
+                    break
+                if demuxer.done:
+                    break
+        except Exception as e:
+            self.log(f"ERROR ejecutando comandos: {str(e)}", "ERROR")
+
+        outputs = await self.transport.run_io(demuxer.finish)
+
+        ends = demuxer.starts[1:] + [time.monotonic()]
+        for cmd, start, end in zip(commands, demuxer.starts, ends):
+            self.record_timing('command', end - start, cmd)
+
+        for cmd, output in outputs.items():
+            preview = output_text(output, full=False)[:500] or "Sin salida"
+            self.log(f"RESPUESTA ({cmd}): {preview}")
+        return outputs
+
+    async def _disable_paging_async(self):
+        if self.paging_disabled is None:
+            command = PAGING_COMMANDS.get(self.device_type)
+            if not command:
+                self.paging_disabled = False
+            else:
+                output = output_text(await self.send_command_async(command))
+                self.paging_disabled = '% ' not in output
+        return self.paging_disabled
+
+    async def disconnect_async(self):
+        """Sale del dispositivo, cierra la sesión y libera el canal del jump host"""
+        self.log("Cerrando conexiones...")
+        if self.process:
+            try:
+                self.process.stdin.write('exit\nexit\n')
+            except Exception:
+                pass
+            self.process.close()
+            self.process = None
+        if self.device_conn:
+            self.device_conn.close()
+            self.device_conn = None
+        if self.jump_entry:
+            self.transport.release_jump(self.jump_entry)
+            self.jump_entry = None
+        self.log("✓ Conexiones cerradas")
@@ -0,0 +1,432 @@
+import random
+import socket
+import threading
+import time
+import paramiko
+
+# Salidas de ejemplo por tipo de dispositivo
+SAMPLE_OUTPUTS = {
+    'cisco_ios': {
+        'show version': (
+            "Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(7)E4\n"
+            "{hostname} uptime is 12 weeks, 3 days, 4 hours, 10 minutes\n"
+            "System image file is \"flash:c2960x-universalk9-mz.152-7.E4.bin\"\n"
+            "cisco WS-C2960X-48FPD-L (APM86XXX) processor with 524288K bytes of memory.\n"
+            "Processor board ID FOC1234X0AB\n"
+            "Configuration register is 0xF"
+        ),
+        'show processes cpu': (
+            "CPU utilization for five seconds: 7%/0%; one minute: 8%; five minutes: 9%\n"
+            " PID Runtime(ms)     Invoked      uSecs   5Sec   1Min   5Min TTY Process\n"
+            "   1           0          12          0  0.00%  0.00%  0.00%   0 Chunk Manager\n"
+            "   2        1204       45231         26  0.00%  0.01%  0.00%   0 Load Meter"
+        ),
+        'show memory': (
+            "                Head    Total(b)     Used(b)     Free(b)   Lowest(b)  Largest(b)\n"
+            "Processor    2B3F1A0   366843456   128954112   237889344   235678912   168432180\n"
+            "      I/O    7800000    12582912     6432152     6150760     6120000     6149212"
+        ),
+        'show interface status': (
+            "Port      Name               Status       Vlan       Duplex  Speed Type\n"
+            "Gi1/0/1   UPLINK             connected    trunk      a-full a-1000 10/100/1000BaseTX\n"
+            "Gi1/0/2                      notconnect   10           auto   auto 10/100/1000BaseTX\n"
+            "Gi1/0/3   SERVIDOR-01        connected    20         a-full a-1000 10/100/1000BaseTX"
+        ),
+        'show interface counters errors': (
+            "Port        Align-Err     FCS-Err    Xmit-Err     Rcv-Err  UnderSize  OutDiscards\n"
+            "Gi1/0/1             0           0           0           0          0            0\n"
+            "Gi1/0/2             0           0           0           0          0            0\n"
+            "Gi1/0/3             2          14           0          16          0           35"
+        ),
+        'show spanning-tree summary': (
+            "Switch is in rapid-pvst mode\n"
+            "Root bridge for: VLAN0010, VLAN0020\n"
+            "Name                   Blocking Listening Learning Forwarding STP Active\n"
+            "---------------------- -------- --------- -------- ---------- ----------\n"
+            "VLAN0010                     0         0        0          2          2\n"
+            "VLAN0020                     0         0        0          2          2\n"
+            "---------------------- -------- --------- -------- ---------- ----------\n"
+            "2 vlans                      0         0        0          4          4"
+        ),
+        'show vlan brief': (
+            "VLAN Name                             Status    Ports\n"
+            "---- -------------------------------- --------- -------------------------------\n"
+            "1    default                          active    Gi1/0/4, Gi1/0/5\n"
+            "10   DATOS                            active    Gi1/0/2\n"
+            "20   SERVIDORES                       active    Gi1/0/3"
+        ),
+        'show interface trunk': (
+            "Port        Mode             Encapsulation  Status        Native vlan\n"
+            "Gi1/0/1     on               802.1q         trunking      1\n"
+            "\n"
+            "Port        Vlans allowed on trunk\n"
+            "Gi1/0/1     1-4094"
+        ),
+    },
+    'cisco_asa': {
+        'show version': (
+            "Cisco Adaptive Security Appliance Software Version 9.8(4)\n"
+            "{hostname} up 45 days 2 hours\n"
+            "Hardware:   ASA5516, 8192 MB RAM, CPU Atom C2000 series 2416 MHz, 1 CPU (8 cores)\n"
+            "Serial Number: JAD123456AB"
+        ),
+        'show processes cpu': (
+            "CPU utilization for 5 seconds = 3%; 1 minute: 4%; 5 minutes: 4%"
+        ),
+        'show memory': (
+            "Free memory:        5678901234 bytes (66%)\n"
+            "Used memory:        2912345678 bytes (34%)\n"
+            "-------------     ------------------\n"
+            "Total memory:       8591246912 bytes (100%)"
+        ),
+    },
+}
+
+INVALID_INPUT = "% Invalid input detected at '^' marker."
+
+
+class FakeDevice:
+    """Dispositivo Cisco simulado (IOS o ASA)"""
+
+    def __init__(self, hostname, ip, device_type='cisco_ios', username='admin', password='admin123',
+                 enable_password=None, latency=0.0, banner=None, output_lines=0, failure_rate=0.0,
+                 page_size=24, prompt=None):
+        self.hostname = hostname
+        self.ip = ip
+        self.type = device_type
+        self.username = username
+        self.password = password
+        self.enable_password = enable_password or password
+        self.latency = latency
+        self.banner = banner if banner is not None else f"\n*** Acceso restringido a {hostname} ***\n"
+        self.output_lines = output_lines
+        self.failure_rate = failure_rate
+        self.page_size = page_size  # 0: sin paginador
+        self.prompt = prompt or hostname  # Prompt sin el '>' o '#' final
+
+    @property
+    def pager_command(self):
+        return 'terminal pager 0' if self.type == 'cisco_asa' else 'terminal length 0'
+
+    @property
+    def more_prompt(self):
+        return '<--- More --->' if self.type == 'cisco_asa' else ' --More-- '
+
+    def command_output(self, command):
+        """Salida simulada de un comando"""
+        outputs = SAMPLE_OUTPUTS.get(self.type, SAMPLE_OUTPUTS['cisco_ios'])
+        if command in outputs:
+            return outputs[command].format(hostname=self.hostname)
+        if command.startswith('show running-config') or command.startswith('show tech'):
+            lines = [f"hostname {self.hostname}", "!"]
+            lines += [f"interface GigabitEthernet1/0/{i}\n description PUERTO-{i}\n switchport mode access\n!"
+                      for i in range(1, max(self.output_lines, 48) + 1)]
+            return '\n'.join(lines)
+        if command.startswith('show'):
+            lines = [f"{command} linea {i}" for i in range(self.output_lines or 5)]
+            return '\n'.join(lines)
+        return INVALID_INPUT
+
+
+class ChannelTerminal:
+    """Lectura de líneas con eco sobre un canal paramiko"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.buffer = b''
+
+    def write(self, text):
+        self.channel.sendall(text.replace('\n', '\r\n').encode('utf-8'))
+
+    def read_char(self):
+        while not self.buffer:
+            data = self.channel.recv(4096)
+            if not data:
+                raise EOFError()
+            self.buffer += data
+        char, self.buffer = self.buffer[:1], self.buffer[1:]
+        return char
+
+    def read_line(self, echo=True):
+        line = b''
+        while True:
+            char = self.read_char()
+            if char in (b'\r', b'\n'):
+                if char == b'\r' and self.buffer[:1] == b'\n':
+                    self.buffer = self.buffer[1:]
+                if echo:
+                    self.write('\n')
+                return line.decode('utf-8', errors='ignore')
+            line += char
+            if echo:
+                self.channel.sendall(char)
+
+
+def run_device_shell(term, device, authenticated=False):
+    """Emula la CLI de un dispositivo. Devuelve al salir con 'exit'"""
+    if device.failure_rate and random.random() < device.failure_rate:
+        time.sleep(device.latency)
+        term.write("Connection closed by remote host\n")
+        return
+
+    if not authenticated:
+        for _ in range(3):
+            time.sleep(device.latency)
+            term.write("Password: ")
+            if term.read_line(echo=False) == device.password:
+                break
+            term.write("\nPermission denied, please try again.\n")
+        else:
+            return
+        term.write('\n')
+
+    term.write(device.banner)
+    enabled = False
+    paging = True
+
+    while True:
+        term.write(f"{device.prompt}{'#' if enabled else '>'}")
+        command = term.read_line().strip()
+        time.sleep(device.latency)
+
+        if not command:
+            continue
+        if command in ('exit', 'quit', 'logout'):
+            return
+        if command in ('enable', 'en'):
+            if enabled:
+                continue
+            term.write("Password: ")
+            if term.read_line(echo=False) == device.enable_password:
+                enabled = True
+                term.write('\n')
+            else:
+                term.write("\n% Access denied\n")
+            continue
+        if command in ('terminal length 0', 'terminal pager 0'):
+            paging = command != device.pager_command
+            continue
+
+        lines = device.command_output(command).split('\n')
+        for index, line in enumerate(lines, start=1):
+            term.write(line + '\n')
+            if paging and device.page_size and index % device.page_size == 0 and index < len(lines):
+                term.write(device.more_prompt)
+                key = term.read_char()
+                term.write('\r' + ' ' * len(device.more_prompt) + '\r')
+                if key in (b'q', b'Q'):
+                    break
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, server, username, password):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.pending_tunnels = {}  # id de canal -> dispositivo destino (por transporte)
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        device = self.server.resolve_tunnel(destination)
+        if device:
+            self.pending_tunnels[chanid] = device
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_CONNECT_FAILED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.server.start_shell(channel)
+        return True
+
+
+class FakeSSHServer:
+    """Servidor SSH local base (jump host o dispositivo directo)"""
+
+    def __init__(self, username, password, host='127.0.0.1', port=0, latency=0.0):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.latency = latency
+        self.host_key = paramiko.RSAKey.generate(1024)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.handshakes = 0
+        self.running = False
+        self.transports = []
+
+    def start(self):
+        self.running = True
+        self.sock.listen(100)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        for transport in list(self.transports):
+            transport.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        time.sleep(self.latency)
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        self.transports.append(transport)
+        interface = _ServerInterface(self, self.username, self.password)
+        try:
+            transport.start_server(server=interface)
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+        self.handshakes += 1
+        sessions = []  # Referencias vivas: paramiko cierra los canales al recolectarlos
+        while transport.is_active():
+            channel = transport.accept(1)
+            if channel is None:
+                continue
+            device = interface.pending_tunnels.pop(channel.get_id(), None)
+            if device is not None:
+                threading.Thread(target=self._serve_tunnel, args=(channel, device), daemon=True).start()
+            else:
+                sessions = [c for c in sessions if not c.closed] + [channel]
+
+    def start_shell(self, channel):
+        threading.Thread(target=self._run_shell, args=(channel,), daemon=True).start()
+
+    def _run_shell(self, channel):
+        try:
+            self.handle_shell(ChannelTerminal(channel))
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            channel.close()
+
+    def handle_shell(self, term):
+        raise NotImplementedError
+
+    def resolve_tunnel(self, destination):
+        return None
+
+    def _serve_tunnel(self, channel, device):
+        pass
+
+
+class FakeDeviceServer(FakeSSHServer):
+    """Dispositivo accesible directamente por SSH"""
+
+    def __init__(self, device, **kwargs):
+        super().__init__(device.username, device.password, latency=device.latency, **kwargs)
+        self.device = device
+
+    def handle_shell(self, term):
+        run_device_shell(term, self.device, authenticated=True)
+
+
+class FakeJumpHost(FakeSSHServer):
+    """Jump host tipo Bridgenet que permite 'ssh usuario@ip' y túneles direct-tcpip"""
+
+    def __init__(self, username='jump', password='jump123', devices=None, banner=None, banner_pause=0.0, **kwargs):
+        super().__init__(username, password, **kwargs)
+        self.devices = {d.ip: d for d in (devices or [])}
+        self.device_servers = {}
+        self.lock = threading.Lock()
+        self.banner = banner if banner is not None else "Bienvenido a Bridgenet\nUso autorizado únicamente\n"
+        self.banner_pause = banner_pause  # Pausa entre líneas del banner (llega en varios fragmentos)
+        self.prompt = f"[{username}@bridgenet ~]$ "
+
+    def handle_shell(self, term):
+        if self.banner_pause:
+            for line in self.banner.splitlines(keepends=True):
+                term.write(line)
+                time.sleep(self.banner_pause)
+        else:
+            term.write(self.banner)
+        while True:
+            term.write(self.prompt)
+            line = term.read_line().strip()
+            if not line:
+                continue
+            if line in ('exit', 'logout'):
+                return
+            parts = line.split()
+            if parts[0] == 'ssh' and len(parts) == 2 and '@' in parts[1]:
+                username, ip = parts[1].split('@', 1)
+                device = self.devices.get(ip)
+                if not device:
+                    time.sleep(self.latency)
+                    term.write(f"ssh: connect to host {ip} port 22: Connection timed out\n")
+                    continue
+                if username != device.username:
+                    term.write("Permission denied (publickey,password).\n")
+                    continue
+                run_device_shell(term, device)
+                term.write(f"Connection to {ip} closed.\n")
+                continue
+            term.write(f"-bash: {parts[0]}: command not found\n")
+
+    def resolve_tunnel(self, destination):
+        return self.devices.get(destination[0])
+
+    def _serve_tunnel(self, channel, device):
+        """Reenvía un canal direct-tcpip a un servidor SSH local del dispositivo"""
+        server = self._device_server(device)
+        upstream = socket.create_connection(('127.0.0.1', server.port))
+        _bridge(channel, upstream)
+
+    def _device_server(self, device):
+        with self.lock:
+            if device.ip not in self.device_servers:
+                self.device_servers[device.ip] = FakeDeviceServer(device).start()
+            return self.device_servers[device.ip]
+
+    def stop(self):
+        super().stop()
+        for server in self.device_servers.values():
+            server.stop()
+
+
+def _bridge(channel, sock):
+    """Copia datos en ambos sentidos entre un canal y un socket"""
+    def pump(source_recv, target_send, on_close):
+        try:
+            while True:
+                data = source_recv(32768)
+                if not data:
+                    break
+                target_send(data)
+        except (OSError, EOFError):
+            pass
+        finally:
+            # El otro extremo puede haber cerrado ya (p. ej. el transporte paramiko)
+            try:
+                on_close()
+            except (OSError, EOFError):
+                pass
+
+    threading.Thread(target=pump, args=(channel.recv, sock.sendall, sock.close), daemon=True).start()
+    threading.Thread(target=pump, args=(sock.recv, channel.sendall, channel.close), daemon=True).start()
@@ -0,0 +1,270 @@
+"""Benchmark offline del análisis contra dispositivos simulados.
+
+Levanta un jump host y dispositivos IOS/ASA falsos (benchmarks/fake_ssh_server.py)
+y mide el análisis de punta a punta con distintas cantidades de dispositivos y
+niveles de concurrencia, por el motor (AnalysisEngine.analyze_client) y por la
+API (/api/analyze). Los resultados se guardan en benchmarks/results/ para
+compararlos con corridas anteriores:
+
+    python benchmarks/run_benchmarks.py --devices 1,4,16 --concurrency 1,4,8
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/20240101_120000.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_ssh_server import FakeDevice, FakeJumpHost  # noqa: E402
+
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+
+PHASES = ('connect', 'jump', 'auth', 'enable', 'command', 'parse')
+
+CHECKS = {
+    'health': ['show version', 'show processes cpu', 'show memory'],
+    'interfaces': ['show interface status', 'show interface counters errors'],
+    'spanning_tree': ['show spanning-tree summary'],
+    'vlans': ['show vlan brief', 'show interface trunk']
+}
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def build_devices(args):
+    """Dispositivos simulados, alternando IOS y ASA según --asa-ratio"""
+    devices = []
+    for i in range(max(args.devices)):
+        device_type = 'cisco_asa' if int((i + 1) * args.asa_ratio) > int(i * args.asa_ratio) else 'cisco_ios'
+        devices.append(FakeDevice(
+            f"BENCH-{i + 1:03d}", f"10.99.{i // 250}.{i % 250 + 1}",
+            device_type=device_type,
+            latency=args.latency,
+            banner=args.banner,
+            output_lines=args.output_lines,
+            failure_rate=args.failure_rate,
+            page_size=args.page_size,
+            prompt=args.prompt and f"{args.prompt}-{i + 1}"
+        ))
+    return devices
+
+
+def build_config(jump, devices, args):
+    """config.json mínimo que apunta al jump host simulado"""
+    return {
+        'app': {'name': 'Network Analyzer', 'version': 'bench', 'debug': False},
+        'analysis': {'max_workers_per_client': max(args.concurrency), 'max_workers_global': max(args.concurrency)},
+        'logging': {'console': False},
+        'ssh': {'connect_timeout': 10, 'login_timeout': 10, 'command_timeout': 30, 'pipeline': not args.no_pipeline},
+        'jump_pool': {'enabled': not args.no_pool, 'max_channels': 10, 'max_transports': 4},
+        'async_transport': {'enabled': args.async_transport, 'max_sessions': max(args.concurrency)},
+        'session_cache': {'enabled': False},
+        'reports': {'dir': 'data/reports', 'pdf_background': False},
+        'credentials': {
+            'bench': {'username': 'admin', 'password': 'admin123', 'enable_password': 'admin123'},
+            'jump': {'username': jump.username, 'password': jump.password}
+        },
+        'jump_hosts': {'bench': {'host': '127.0.0.1', 'port': jump.port, 'credential': 'jump', 'mode': args.jump_mode}},
+        'clientes': {
+            'bench': {
+                'nombre': 'BENCH',
+                'credential': 'bench',
+                'jump_host': 'bench',
+                'devices': [
+                    {'id': d.hostname.lower(), 'hostname': d.hostname, 'ip': d.ip, 'type': d.type, 'protocol': 'ssh'}
+                    for d in devices
+                ]
+            }
+        },
+        'checks': CHECKS
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(mode, devices, concurrency, wall, results):
+    """Throughput, latencias por dispositivo y tiempo medio de cada fase"""
+    totals = [r['timings']['total'] for r in results if r.get('timings', {}).get('total') is not None]
+    statuses = {}
+    phases = {phase: [] for phase in PHASES}
+    for result in results:
+        statuses[result.get('status')] = statuses.get(result.get('status'), 0) + 1
+        timings = result.get('timings', {})
+        for phase in PHASES:
+            value = timings.get('commands' if phase == 'command' else phase)
+            if isinstance(value, dict):
+                value = sum(value.values())
+            if value is not None:
+                phases[phase].append(value)
+
+    return {
+        'mode': mode,
+        'devices': devices,
+        'concurrency': concurrency,
+        'wall': round(wall, 4),
+        'throughput': round(len(results) / wall, 3) if wall else None,
+        'latency': {
+            'p50': percentile(totals, 0.5),
+            'p95': percentile(totals, 0.95),
+            'max': max(totals) if totals else None
+        },
+        'phases': {phase: round(sum(v) / len(v), 4) for phase, v in phases.items() if v},
+        'statuses': statuses
+    }
+
+
+def run_engine(config, device_count, concurrency, checks):
+    from analysis_engine import AnalysisEngine
+
+    settings = dict(config, analysis={'max_workers_per_client': concurrency, 'max_workers_global': concurrency})
+    settings['async_transport'] = dict(config['async_transport'], max_sessions=concurrency)
+    engine = AnalysisEngine(settings)
+    client_info = config['clientes']['bench']
+    devices = client_info['devices'][:device_count]
+    selected = {name: CHECKS[name] for name in checks}
+
+    started = time.monotonic()
+    results = engine.analyze_client(client_info, devices, selected)
+    return time.monotonic() - started, results
+
+
+def run_api(app_module, client, device_count, concurrency, checks):
+    app_module.engine.max_workers_per_client = concurrency
+    devices = app_module.network.config['clientes']['bench']['devices'][:device_count]
+
+    started = time.monotonic()
+    response = client.post('/api/analyze/bench', json={
+        'devices': [d['id'] for d in devices],
+        'checks': checks
+    })
+    wall = time.monotonic() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"/api/analyze respondió {response.status_code}")
+    return wall, response.get_json()['results']['devices']
+
+
+def load_app(config):
+    """Importa app.py con el config del benchmark (se lee de config/config.json del directorio actual)"""
+    Path('config').mkdir(exist_ok=True)
+    Path('config/config.json').write_text(json.dumps(config, indent=2))
+    import app as app_module
+    return app_module, app_module.app.test_client()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """Compara con una corrida anterior; devuelve la cantidad de regresiones"""
+    previous = {(s['mode'], s['devices'], s['concurrency']): s for s in baseline['scenarios']}
+    regressions = 0
+    print(f"\nComparación con {baseline.get('created')} ({baseline.get('revision') or 'sin revisión'})")
+    for scenario in current['scenarios']:
+        key = (scenario['mode'], scenario['devices'], scenario['concurrency'])
+        old = previous.get(key)
+        if not old or not old.get('throughput') or not old['latency'].get('p95'):
+            continue
+        throughput = scenario['throughput'] / old['throughput'] - 1
+        p95 = (scenario['latency']['p95'] or 0) / old['latency']['p95'] - 1
+        regression = throughput < -threshold or p95 > threshold
+        regressions += regression
+        print(f"  {key[0]:6} dev={key[1]:<4} conc={key[2]:<3} throughput {throughput:+7.1%}  p95 {p95:+7.1%}"
+              f"{'  REGRESIÓN' if regression else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del análisis contra dispositivos SSH simulados')
+    parser.add_argument('--devices', type=int_list, default=[1, 4, 16], help='Cantidades de dispositivos (ej. 1,4,16)')
+    parser.add_argument('--concurrency', type=int_list, default=[1, 4, 8], help='Valores de max_workers_per_client')
+    parser.add_argument('--mode', choices=['engine', 'api', 'both'], default='both')
+    parser.add_argument('--checks', default='health,interfaces', help='Checks a ejecutar')
+    parser.add_argument('--repeat', type=int, default=1, help='Repeticiones por escenario (se guarda cada una)')
+    parser.add_argument('--latency', type=float, default=0.02, help='Latencia simulada por respuesta (s)')
+    parser.add_argument('--output-lines', type=int, default=0, help='Líneas de salida de comandos genéricos')
+    parser.add_argument('--page-size', type=int, default=24, help='Líneas por página del paginador (0: sin paginar)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Probabilidad de cortar la sesión')
+    parser.add_argument('--asa-ratio', type=float, default=0.5, help='Proporción de dispositivos ASA')
+    parser.add_argument('--banner', default=None, help='Banner de los dispositivos')
+    parser.add_argument('--prompt', default=None, help='Prefijo del prompt (por defecto el hostname)')
+    parser.add_argument('--no-pipeline', action='store_true', help='Enviar los comandos de a uno')
+    parser.add_argument('--no-pool', action='store_true', help='Sin pool de transportes al jump host')
+    parser.add_argument('--jump-mode', choices=('shell', 'tunnel'), default='shell', help='Acceso por el jump host')
+    parser.add_argument('--async-transport', action='store_true', help='Sesiones asyncio (requiere asyncssh)')
+    parser.add_argument('--output', default=None, help='Archivo de resultados (por defecto benchmarks/results/<fecha>.json)')
+    parser.add_argument('--compare', default=None, help='Resultados anteriores con los que comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Variación tolerada antes de marcar regresión')
+    args = parser.parse_args()
+
+    checks = [c.strip() for c in args.checks.split(',') if c.strip()]
+    output = Path(args.output).resolve() if args.output else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    devices = build_devices(args)
+    jump = FakeJumpHost(devices=devices).start()
+    config = build_config(jump, devices, args)
+
+    # Logs, spool y reportes del benchmark fuera del repositorio
+    workdir = tempfile.mkdtemp(prefix='netanalyzer-bench-')
+    os.chdir(workdir)
+
+    modes = ['engine', 'api'] if args.mode == 'both' else [args.mode]
+    scenarios = []
+    app_module = client = None
+    try:
+        for mode in modes:
+            if mode == 'api' and app_module is None:
+                app_module, client = load_app(config)
+            for device_count in args.devices:
+                for concurrency in args.concurrency:
+                    for _ in range(args.repeat):
+                        if mode == 'engine':
+                            wall, results = run_engine(config, device_count, concurrency, checks)
+                        else:
+                            wall, results = run_api(app_module, client, device_count, concurrency, checks)
+                        scenario = summarize(mode, device_count, concurrency, wall, results)
+                        scenarios.append(scenario)
+                        print(f"{mode:6} dev={device_count:<4} conc={concurrency:<3} "
+                              f"{scenario['wall']:8.3f}s  {scenario['throughput']:7.2f} disp/s  "
+                              f"p50={scenario['latency']['p50']}  p95={scenario['latency']['p95']}  "
+                              f"{scenario['statuses']}")
+    finally:
+        jump.stop()
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'revision': git_revision(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'scenarios': scenarios
+    }
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResultados: {output}")
+
+    if baseline and compare(report, baseline, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
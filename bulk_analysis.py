@@ -0,0 +1,184 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class BulkAnalysis:
+    """Análisis de varios clientes en una sola petición, con resultados en NDJSON.
+
+    Cada entrada indica un cliente, sus dispositivos ('*' o lista de ids) y los
+    checks (o comandos en modo custom). Las entradas se analizan en paralelo
+    (hasta `max_concurrent_clients`) y cada dispositivo se escribe como una
+    línea JSON apenas termina, sin esperar al resto de la flota. Al terminar
+    un cliente se guarda su reporte y se escribe una línea con el id.
+    Si el cliente HTTP corta la conexión se cancelan los dispositivos pendientes.
+    """
+
+    def __init__(self, engine, snapshot, entries, incremental_for=None, save_report=None,
+                 max_concurrent_clients=4, include_outputs=True):
+        self.engine = engine
+        self.snapshot = snapshot
+        self.entries = entries  # [(cliente, dispositivos, checks, datos de la entrada)]
+        self.incremental_for = incremental_for
+        self.save_report = save_report
+        self.max_concurrent_clients = max(1, max_concurrent_clients)
+        self.include_outputs = include_outputs
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+
+    @classmethod
+    def from_request(cls, engine, snapshot, data, config, **kwargs):
+        """Valida el cuerpo de la petición. Devuelve (BulkAnalysis, []) o (None, errores)"""
+        settings = config.get('bulk', {})
+        requests = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(requests, list) or not requests:
+            return None, ["Se espera 'requests': lista de análisis"]
+        max_requests = settings.get('max_requests', 100)
+        if len(requests) > max_requests:
+            return None, [f"Demasiados análisis en una petición (máximo {max_requests})"]
+
+        # Valores por defecto de la petición, que cada entrada puede reemplazar
+        defaults = {key: data[key] for key in ('checks', 'mode', 'commands', 'incremental') if key in data}
+
+        entries, errors = [], []
+        for position, entry in enumerate(requests):
+            if not isinstance(entry, dict):
+                errors.append(f"Análisis {position}: debe ser un objeto")
+                continue
+            entry = {**defaults, **entry}
+            client_id = entry.get('client')
+            client_info = snapshot.clients.get(client_id)
+            if not client_info:
+                errors.append(f"Análisis {position}: cliente '{client_id}' no encontrado")
+                continue
+
+            selection = entry.get('devices', '*')
+            if selection == '*':
+                devices = list(client_info.get('devices', []))
+            else:
+                devices = snapshot.select_devices(client_id, selection)
+                unknown = set(selection) - {device['id'] for device in devices}
+                if unknown:
+                    errors.append(f"Análisis {position}: dispositivos inexistentes en '{client_id}': "
+                                  f"{', '.join(sorted(map(str, unknown)))}")
+                    continue
+
+            if entry.get('mode', 'checklist') == 'custom':
+                checks = {'custom': entry.get('commands', [])}
+            else:
+                names = entry.get('checks', ['health'])
+                checks = snapshot.select_checks(names)
+                unknown = [name for name in names if name not in checks]
+                if unknown:
+                    errors.append(f"Análisis {position}: checks inexistentes: {', '.join(unknown)}")
+                    continue
+
+            entries.append((client_id, devices, checks, entry))
+
+        if errors:
+            return None, errors
+        return cls(
+            engine, snapshot, entries,
+            max_concurrent_clients=settings.get('max_concurrent_clients', 4),
+            include_outputs=data.get('outputs', True),
+            **kwargs
+        ), []
+
+    def stream(self):
+        """Generador de líneas NDJSON: una por dispositivo, una por cliente y un resumen final"""
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_clients, thread_name_prefix='bulk')
+        for position, entry in enumerate(self.entries):
+            executor.submit(self._run_entry, position, *entry)
+        executor.shutdown(wait=False)
+
+        counts = {}
+        pending = len(self.entries)
+        try:
+            while pending:
+                kind, status, line = self.events.get()
+                if kind == 'device':
+                    counts[status] = counts.get(status, 0) + 1
+                else:
+                    pending -= 1
+                yield line
+
+            yield self._line({
+                'type': 'summary',
+                'requests': len(self.entries),
+                'devices': sum(counts.values()),
+                'status': counts,
+                'timings': {'analysis': round(time.monotonic() - started, 4)}
+            })
+        finally:
+            # Conexión cortada (o fin normal): lo pendiente no se analiza
+            self.cancel_event.set()
+
+    def _run_entry(self, position, client_id, devices, checks, entry):
+        client_info = self.snapshot.clients[client_id]
+        try:
+            incremental = self.incremental_for(client_id, entry) if self.incremental_for else None
+
+            def on_result(index, result):
+                # Se serializa en el hilo del análisis, con el resultado recién terminado
+                self._put({
+                    'type': 'device',
+                    'request': position,
+                    'client_id': client_id,
+                    'device_id': devices[index]['id'],
+                    'index': index,
+                    'result': result if self.include_outputs else self._without_outputs(result)
+                })
+
+            started = time.monotonic()
+            timestamp = datetime.now().isoformat()
+            results = self.engine.analyze_client(
+                client_info, devices, checks,
+                on_result=on_result,
+                cancel_event=self.cancel_event,
+                incremental=incremental
+            )
+
+            report_id = None
+            if self.save_report and entry.get('save', True) and not self.cancel_event.is_set():
+                report = {
+                    'client_id': client_id,
+                    'client_name': client_info['nombre'],
+                    'timestamp': timestamp,
+                    'devices': results,
+                    'timings': {'analysis': round(time.monotonic() - started, 4)}
+                }
+                if incremental:
+                    report['incremental'] = incremental.summary(results)
+                report_id = self.save_report(client_id, report)
+
+            self._put({
+                'type': 'client',
+                'request': position,
+                'client_id': client_id,
+                'devices': len(results),
+                'report_id': report_id,
+                'timings': {'analysis': round(time.monotonic() - started, 4)}
+            })
+        except Exception as e:
+            self._put({'type': 'error', 'request': position, 'client_id': client_id, 'error': str(e)})
+
+    def _put(self, event):
+        status = event['result']['status'] if event['type'] == 'device' else None
+        self.events.put((event['type'], status, self._line(event)))
+
+    @staticmethod
+    def _without_outputs(result):
+        """Resultado sin las salidas crudas (sólo estado, parseo y diferencias)"""
+        checks = {
+            name: {key: value for key, value in check.items() if key != 'outputs'}
+            for name, check in result.get('checks', {}).items()
+        }
+        return {key: value for key, value in result.items() if key not in ('checks', 'full_log')} | {'checks': checks}
+
+    @staticmethod
+    def _line(event):
+        return json.dumps(event, ensure_ascii=False, default=str) + '\n'
@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+def validate_config(data):
+    """Errores de la configuración (lista vacía si es válida)"""
+    if not isinstance(data, dict):
+        return ["La configuración debe ser un objeto JSON"]
+    errors = []
+    for section in ('credentials', 'clientes', 'checks'):
+        if not isinstance(data.get(section), dict):
+            errors.append(f"Falta la sección '{section}'")
+    if not isinstance(data.get('jump_hosts', {}), dict):
+        errors.append("La sección 'jump_hosts' debe ser un objeto")
+    if errors:
+        return errors
+
+    credentials = data['credentials']
+    jump_hosts = data.get('jump_hosts', {})
+
+    for name, jump in jump_hosts.items():
+        if not isinstance(jump, dict):
+            errors.append(f"Jump host '{name}': debe ser un objeto")
+            continue
+        if not jump.get('host'):
+            errors.append(f"Jump host '{name}' sin host")
+        if jump.get('credential') not in credentials:
+            errors.append(f"Jump host '{name}': credencial '{jump.get('credential')}' inexistente")
+
+    for client_id, client in data['clientes'].items():
+        if not isinstance(client, dict):
+            errors.append(f"Cliente '{client_id}': debe ser un objeto")
+            continue
+        if not client.get('nombre'):
+            errors.append(f"Cliente '{client_id}' sin nombre")
+        if client.get('credential', 'default') not in credentials:
+            errors.append(f"Cliente '{client_id}': credencial '{client.get('credential')}' inexistente")
+        if client.get('jump_host') and client['jump_host'] not in jump_hosts:
+            errors.append(f"Cliente '{client_id}': jump host '{client['jump_host']}' inexistente")
+
+        devices = client.get('devices', [])
+        if not isinstance(devices, list):
+            errors.append(f"Cliente '{client_id}': 'devices' debe ser una lista")
+            continue
+        seen = set()
+        for position, device in enumerate(devices):
+            if not isinstance(device, dict):
+                errors.append(f"Cliente '{client_id}', dispositivo {position}: debe ser un objeto")
+                continue
+            missing = [field for field in ('id', 'hostname', 'ip') if not device.get(field)]
+            if missing:
+                errors.append(f"Cliente '{client_id}', dispositivo {position}: faltan {', '.join(missing)}")
+                continue
+            if device['id'] in seen:
+                errors.append(f"Cliente '{client_id}': id de dispositivo repetido '{device['id']}'")
+            seen.add(device['id'])
+
+    for name, commands in data['checks'].items():
+        if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+            errors.append(f"Check '{name}': debe ser una lista de comandos")
+
+    return errors
+
+
+class ConfigSnapshot:
+    """Configuración cargada e inmutable en la práctica, con índices para búsquedas directas"""
+
+    def __init__(self, data, version=1, mtime=None):
+        self.data = data
+        self.version = version
+        self.mtime = mtime
+        self.loaded_at = datetime.now().isoformat()
+
+        self.clients = data.get('clientes', {})
+        self.checks = data.get('checks', {})
+
+        # Los índices sólo toman las entradas bien formadas: al arrancar se acepta un
+        # archivo con errores (ya informados por validate_config) y no debe fallar aquí
+        self.devices_by_id = {}  # cliente -> id de dispositivo -> (posición en el inventario, dispositivo)
+        self.devices_by_jump_host = {}  # jump host (None: conexión directa) -> [(cliente, dispositivo)]
+        for client_id, client in self.clients.items():
+            if not isinstance(client, dict) or not isinstance(client.get('devices', []), list):
+                continue
+            devices = [
+                (position, device) for position, device in enumerate(client.get('devices', []))
+                if isinstance(device, dict) and device.get('id')
+            ]
+            self.devices_by_id[client_id] = {device['id']: (position, device) for position, device in devices}
+            entries = self.devices_by_jump_host.setdefault(client.get('jump_host'), [])
+            entries.extend((client_id, device) for _, device in devices)
+
+    def device(self, client_id, device_id):
+        entry = self.devices_by_id.get(client_id, {}).get(device_id)
+        return entry[1] if entry else None
+
+    def select_devices(self, client_id, device_ids):
+        """Dispositivos pedidos del cliente, en el orden del inventario"""
+        index = self.devices_by_id.get(client_id, {})
+        found = sorted(index[device_id] for device_id in set(device_ids) if device_id in index)
+        return [device for _, device in found]
+
+    def select_checks(self, names):
+        return {name: self.checks[name] for name in names if name in self.checks}
+
+
+class ConfigManager:
+    """Carga config.json, lo vigila y publica una nueva instantánea validada al cambiar.
+
+    Si el archivo editado no es válido se conserva la instantánea anterior y el
+    error queda en `last_error`. Los análisis en curso siguen con la
+    configuración con la que empezaron; los nuevos usan la última.
+    """
+
+    def __init__(self, path='config/config.json', interval=2.0, log=None):
+        self.path = Path(path)
+        self.interval = interval
+        self.log = log  # log(mensaje, nivel): errores de recarga
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.last_error = None
+        self.snapshot = None
+        self._signature = None
+        self._thread = None
+        self._load_initial()
+
+    @property
+    def config(self):
+        return self.snapshot.data
+
+    def subscribe(self, callback):
+        """callback(snapshot) tras cada recarga válida"""
+        self.listeners.append(callback)
+
+    def start(self):
+        """Vigila el archivo según la sección config_reload (deshabilitada: sólo recarga manual)"""
+        settings = self.config.get('config_reload', {})
+        if not settings.get('enabled', True) or self._thread:
+            return self
+        self.interval = settings.get('interval', self.interval)
+        self._thread = threading.Thread(target=self._watch, daemon=True, name='config-watcher')
+        self._thread.start()
+        return self
+
+    def _file_signature(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        return json.loads(self.path.read_bytes())
+
+    def _load_initial(self):
+        self._signature = self._file_signature()
+        data = {}
+        if self._signature:
+            try:
+                data = self._read()
+            except ValueError as e:
+                self.last_error = f"JSON inválido: {e}"
+        # Al arrancar se usa aunque tenga errores (como antes); sólo se informan
+        errors = validate_config(data) if data else []
+        if errors:
+            self.last_error = '; '.join(errors)
+        self.snapshot = ConfigSnapshot(data, mtime=self._signature and self._signature[0])
+
+    def reload(self, force=False):
+        """Relee el archivo si cambió. Devuelve True si se publicó una nueva instantánea"""
+        with self.lock:
+            signature = self._file_signature()
+            if signature is None or (signature == self._signature and not force):
+                return False
+            self._signature = signature
+
+            try:
+                data = self._read()
+            except ValueError as e:
+                self.last_error = f"JSON inválido: {e}"
+                self._log(f"Configuración no recargada: {self.last_error}", "ERROR")
+                return False
+
+            errors = validate_config(data)
+            if errors:
+                self.last_error = '; '.join(errors)
+                self._log(f"Configuración no recargada: {self.last_error}", "ERROR")
+                return False
+
+            self.last_error = None
+            snapshot = ConfigSnapshot(data, version=self.snapshot.version + 1, mtime=signature[0])
+            self.snapshot = snapshot
+
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                self._log(f"ERROR aplicando la configuración recargada: {str(e)}", "ERROR")
+        return True
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.reload()
+            except Exception as e:
+                # La vigilancia sigue: el próximo cambio del archivo se vuelve a intentar
+                self._log(f"ERROR recargando la configuración: {str(e)}", "ERROR")
+
+    def _log(self, message, level="INFO"):
+        if self.log:
+            self.log(message, level)
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            'path': str(self.path),
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
+            'clients': len(snapshot.clients),
+            'devices': sum(len(devices) for devices in snapshot.devices_by_id.values()),
+            'last_error': self.last_error
+        }
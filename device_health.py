@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+class DeviceHealth:
+    """Historial de conexión de cada dispositivo: plazos adaptativos y corte rápido.
+
+    - Plazos: el de login y el de comandos se ajustan a `timeout_factor` veces la
+      latencia media observada (EWMA), sin bajar de los mínimos ni superar los
+      configurados en la sección ssh.
+    - Reintentos: las fallas transitorias de conexión se reintentan hasta
+      `retries` veces con espera exponencial acotada y aleatoria.
+    - Circuito: tras `failure_threshold` fallas seguidas el dispositivo se da por
+      caído durante `open_seconds` (se duplica en cada recaída hasta
+      `max_open_seconds`). Vencido el plazo se permite un solo intento a la vez
+      (los demás se rechazan hasta que termine o pasen `half_open_timeout`
+      segundos): si conecta se cierra el circuito, si no se vuelve a abrir.
+
+    El estado se guarda en `path` para que sobreviva a los reinicios: un hilo
+    junta los cambios de `save_interval` segundos en una sola escritura.
+    """
+
+    def __init__(self, path='data/device_health.json', failure_threshold=3, open_seconds=300,
+                 max_open_seconds=3600, retries=2, retry_backoff=1.0, max_backoff=10, timeout_factor=4,
+                 min_login_timeout=5, min_command_timeout=10, alpha=0.3, half_open_timeout=600, save_interval=5):
+        # Ruta absoluta: el hilo escritor guarda más tarde, aunque el proceso haya cambiado de directorio
+        self.path = Path(path).absolute() if path else None
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max(open_seconds, max_open_seconds)
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.timeout_factor = timeout_factor
+        self.min_login_timeout = min_login_timeout
+        self.min_command_timeout = min_command_timeout
+        self.alpha = alpha
+        self.half_open_timeout = half_open_timeout
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # Una escritura a la vez, en orden
+        self.entries = self._load()
+        self.probes = {}  # clave -> inicio del intento de prueba en curso (monotonic)
+
+        self.dirty = threading.Event()
+        if self.path:
+            threading.Thread(target=self._writer, daemon=True, name='health-writer').start()
+
+    @classmethod
+    def from_config(cls, config):
+        """Crea el registro a partir de la sección health (None si está deshabilitado)"""
+        settings = config.get('health', {})
+        if not settings.get('enabled', True):
+            return None
+        return cls(
+            path=settings.get('path', 'data/device_health.json'),
+            failure_threshold=settings.get('failure_threshold', 3),
+            open_seconds=settings.get('open_seconds', 300),
+            max_open_seconds=settings.get('max_open_seconds', 3600),
+            retries=settings.get('retries', 2),
+            retry_backoff=settings.get('retry_backoff', 1.0),
+            max_backoff=settings.get('max_backoff', 10),
+            timeout_factor=settings.get('timeout_factor', 4),
+            min_login_timeout=settings.get('min_login_timeout', 5),
+            min_command_timeout=settings.get('min_command_timeout', 10),
+            alpha=settings.get('alpha', 0.3),
+            half_open_timeout=settings.get('half_open_timeout', 600),
+            save_interval=settings.get('save_interval', 5)
+        )
+
+    @staticmethod
+    def make_key(client_info, device_info):
+        """El camino importa: el mismo IP puede alcanzarse por distintos jump hosts"""
+        return f"{client_info.get('jump_host') or 'direct'}/{device_info['ip']}"
+
+    def _entry(self, key):
+        return self.entries.setdefault(key, {
+            'state': 'closed',
+            'failures': 0,
+            'open_until': 0,
+            'open_seconds': 0,
+            'auth': None,
+            'commands': {},
+            'last_error': None,
+            'last_success': None
+        })
+
+    def allow(self, key):
+        """(True, 0) si se puede intentar la conexión; (False, segundos restantes) si el circuito está abierto"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or entry['state'] == 'closed':
+                return True, 0
+            remaining = entry['open_until'] - time.time()
+            if remaining > 0 and entry['state'] == 'open':
+                return False, remaining
+
+            # Plazo vencido: un solo intento de prueba en curso
+            now = time.monotonic()
+            probe = self.probes.get(key)
+            if probe is not None and now - probe < self.half_open_timeout:
+                return False, self.half_open_timeout - (now - probe)
+            entry['state'] = 'half_open'
+            self.probes[key] = now
+            return True, 0
+
+    def release_probe(self, key):
+        """El intento de prueba terminó sin veredicto (p. ej. credenciales rechazadas): otro puede probar"""
+        with self.lock:
+            self.probes.pop(key, None)
+
+    def timeouts(self, key, commands, login_timeout, command_timeout):
+        """Plazos de login y de comando para este dispositivo según su historial"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return login_timeout, command_timeout
+
+            login = login_timeout
+            if entry['auth'] is not None:
+                login = min(login_timeout, max(self.min_login_timeout, entry['auth'] * self.timeout_factor))
+
+            # Un comando sin historial mantiene el plazo configurado
+            known = [entry['commands'].get(cmd) for cmd in commands]
+            command = command_timeout
+            if known and all(value is not None for value in known):
+                command = min(command_timeout, max(self.min_command_timeout, max(known) * self.timeout_factor))
+            return login, command
+
+    def backoff(self, attempt):
+        """Espera antes del reintento `attempt` (0, 1, ...)"""
+        delay = min(self.max_backoff, self.retry_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _ewma(self, current, value):
+        return value if current is None else current + self.alpha * (value - current)
+
+    def record_success(self, key, timings):
+        """Conexión correcta: cierra el circuito y actualiza las latencias"""
+        with self.lock:
+            entry = self._entry(key)
+            entry.update(state='closed', failures=0, open_until=0, open_seconds=0,
+                         last_success=datetime.now().isoformat())
+            if timings.get('auth') is not None:
+                entry['auth'] = round(self._ewma(entry['auth'], timings['auth']), 4)
+            for command, seconds in timings.get('commands', {}).items():
+                entry['commands'][command] = round(self._ewma(entry['commands'].get(command), seconds), 4)
+            self.probes.pop(key, None)
+            self.dirty.set()
+
+    def record_failure(self, key, error):
+        """Falla de conexión: abre el circuito al llegar al umbral o si falló el intento de prueba"""
+        with self.lock:
+            entry = self._entry(key)
+            entry['failures'] += 1
+            entry['last_error'] = error
+            self.probes.pop(key, None)
+            self.dirty.set()
+
+            if entry['state'] == 'half_open':
+                entry['open_seconds'] = min(self.max_open_seconds, max(self.open_seconds, entry['open_seconds'] * 2))
+            elif entry['failures'] >= self.failure_threshold:
+                entry['open_seconds'] = self.open_seconds
+            else:
+                return
+
+            entry['state'] = 'open'
+            entry['open_until'] = time.time() + entry['open_seconds']
+
+    def status(self):
+        with self.lock:
+            return json.loads(json.dumps(self.entries))
+
+    def stats(self):
+        with self.lock:
+            states = [entry['state'] for entry in self.entries.values()]
+        return {state: states.count(state) for state in ('closed', 'open', 'half_open')}
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _writer(self):
+        while True:
+            self.dirty.wait()
+            time.sleep(self.save_interval)  # Los cambios del intervalo van en la misma escritura
+            self.flush()
+
+    def flush(self):
+        """Escribe ya los cambios pendientes (escritura atómica)"""
+        if not self.path:
+            return
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty.is_set():
+                    return
+                self.dirty.clear()
+                data = json.dumps(self.entries, indent=2)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix('.tmp')
+                tmp.write_text(data)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
@@ -0,0 +1,186 @@
+import difflib
+import hashlib
+from datetime import datetime
+from output_spool import output_text, is_unchanged
+
+
+def output_hash(output):
+    """Hash del texto de una salida, sea cadena, spool o referencia"""
+    if isinstance(output, dict) and 'sha256' in output:
+        return output['sha256']
+    if isinstance(output, dict) and 'chunk' in output:
+        return output['chunk']
+    return hashlib.sha256(output_text(output).encode('utf-8')).hexdigest()
+
+
+class IncrementalAnalysis:
+    """Análisis incremental contra el último reporte del mismo cliente.
+
+    - Los comandos de checks lentos (`slow_checks`, en segundos) no se vuelven a
+      ejecutar si la salida anterior es más reciente que ese plazo.
+    - Las salidas iguales a las anteriores se guardan como hash y referencia al
+      reporte que tiene el texto completo.
+    - Las que cambiaron se guardan completas y su diff va a la sección `changes`.
+    """
+
+    def __init__(self, report_store, base_id, base_report, slow_checks=None, max_diff_lines=200):
+        self.report_store = report_store
+        self.base_id = base_id
+        self.base_timestamp = base_report.get('timestamp', '')
+        self.slow_checks = slow_checks or {}
+        self.max_diff_lines = max_diff_lines
+        self.devices = {d.get('device'): d for d in base_report.get('devices', [])}
+        self.reports = {base_id: base_report}  # Reportes leídos para resolver referencias
+
+    @classmethod
+    def from_config(cls, report_store, client_id, config):
+        """Prepara el análisis a partir del último reporte del cliente (None si no hay)"""
+        reports, _ = report_store.get_reports_list(client=client_id, per_page=1)
+        if not reports:
+            return None
+
+        base_id = reports[0]['id']
+        base_report = report_store.load_header(base_id)
+        if not base_report:
+            return None
+
+        settings = config.get('incremental', {})
+        return cls(
+            report_store, base_id, base_report,
+            slow_checks=settings.get('slow_checks', {}),
+            max_diff_lines=settings.get('max_diff_lines', 200)
+        )
+
+    def _previous(self, device, check_name, command):
+        """(salida anterior, reporte que tiene el texto, fecha de recolección)"""
+        base_device = self.devices.get(device['hostname'])
+        if not base_device or base_device.get('status') != 'completed':
+            return None
+
+        output = base_device.get('checks', {}).get(check_name, {}).get('outputs', {}).get(command)
+        if output is None:
+            return None
+        if is_unchanged(output):
+            return output, output['base_report'], output['collected']
+        return output, self.base_id, self.base_timestamp
+
+    def _reference(self, output, base_report, collected, skipped=False):
+        return {
+            'unchanged': True,
+            'skipped': skipped,
+            'sha256': output_hash(output),
+            'base_report': base_report,
+            'collected': collected
+        }
+
+    def plan(self, device, checks):
+        """Separa los comandos a ejecutar de los que se toman del reporte anterior.
+
+        Devuelve (checks a ejecutar, {check: {comando: referencia}} omitidos)
+        """
+        now = datetime.now()
+        to_run = {}
+        skipped = {}
+
+        for check_name, commands in checks.items():
+            max_age = self.slow_checks.get(check_name)
+            pending = []
+            for command in commands:
+                previous = self._previous(device, check_name, command) if max_age else None
+                if previous:
+                    output, base_report, collected = previous
+                    try:
+                        age = (now - datetime.fromisoformat(collected)).total_seconds()
+                    except ValueError:
+                        age = None
+                    if age is not None and age < max_age:
+                        skipped.setdefault(check_name, {})[command] = self._reference(
+                            output, base_report, collected, skipped=True
+                        )
+                        continue
+                pending.append(command)
+            if pending:
+                to_run[check_name] = pending
+
+        return to_run, skipped
+
+    def apply(self, device, result, skipped):
+        """Reemplaza las salidas sin cambios por referencias y registra los cambios"""
+        changes = []
+
+        for check_name, commands in skipped.items():
+            check_result = result['checks'].setdefault(check_name, {'outputs': {}})
+            check_result['outputs'].update(commands)
+            base_device = self.devices.get(device['hostname'], {})
+            base_parsed = base_device.get('checks', {}).get(check_name, {}).get('parsed', {})
+            for command in commands:
+                if command in base_parsed:
+                    check_result.setdefault('parsed', {})[command] = base_parsed[command]
+
+        if result.get('status') == 'completed':
+            for check_name, check_result in result['checks'].items():
+                outputs = check_result.get('outputs', {})
+                for command, output in outputs.items():
+                    if is_unchanged(output):
+                        continue
+
+                    previous = self._previous(device, check_name, command)
+                    if not previous:
+                        changes.append({'check': check_name, 'command': command, 'change': 'new'})
+                        continue
+
+                    old_output, base_report, collected = previous
+                    if output_hash(output) == output_hash(old_output):
+                        outputs[command] = self._reference(old_output, base_report, collected)
+                    else:
+                        changes.append({
+                            'check': check_name,
+                            'command': command,
+                            'change': 'modified',
+                            'diff': self.diff(device['hostname'], check_name, command, old_output, base_report, output)
+                        })
+
+        result['changes'] = changes
+        return result
+
+    def diff(self, device_name, check_name, command, old_output, base_report, new_output):
+        """Diff unificado (acotado) entre la salida anterior y la nueva"""
+        old_text = resolve_output(self.report_store, old_output, device_name, check_name, command, self.reports)
+        lines = list(difflib.unified_diff(
+            old_text.splitlines(), output_text(new_output).splitlines(),
+            fromfile=base_report, tofile='actual', lineterm='', n=1
+        ))
+        if len(lines) > self.max_diff_lines:
+            lines = lines[:self.max_diff_lines] + [f"... ({len(lines) - self.max_diff_lines} líneas más)"]
+        return '\n'.join(lines)
+
+    def summary(self, devices):
+        """Sección "qué cambió" del reporte"""
+        return {
+            'base_report': self.base_id,
+            'base_timestamp': self.base_timestamp,
+            'changes': [
+                dict(change, device=device['device'])
+                for device in devices
+                for change in device.get('changes', [])
+            ]
+        }
+
+
+def resolve_output(report_store, output, device_name, check_name, command, cache=None):
+    """Texto completo de una salida, buscándolo en el reporte referenciado si no cambió"""
+    if not is_unchanged(output):
+        return report_store.read_output(output)
+
+    cache = cache if cache is not None else {}
+    report_id = output['base_report']
+    if report_id not in cache:
+        cache[report_id] = report_store.load_header(report_id)
+    report = cache[report_id] or {}
+
+    for device in report.get('devices', []):
+        if device.get('device') == device_name:
+            original = device.get('checks', {}).get(check_name, {}).get('outputs', {}).get(command)
+            if original is not None and not is_unchanged(original):
+                return report_store.read_output(original)
+    return ''
@@ -0,0 +1,220 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class Job:
+    """Análisis en segundo plano de los dispositivos de un cliente"""
+
+    def __init__(self, client_id, client_info, devices, checks, incremental=None, priority=0, schedule=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.client_id = client_id
+        self.client_info = client_info
+        self.devices = devices
+        self.checks = checks
+        self.incremental = incremental  # Comparación con el reporte anterior (opcional)
+        self.priority = priority  # Menor valor, antes sale de la cola
+        self.schedule = schedule  # Programación que lo lanzó (None: pedido desde la interfaz)
+        self.status = 'queued'
+        self.created = datetime.now().isoformat()
+        self.started = None
+        self.started_at = None  # Reloj monotónico, para la duración del análisis
+        self.finished = None
+        self.finished_at = None  # Reloj monotónico, para la retención
+        self.results = [None] * len(devices)  # Resultados en el orden de los dispositivos
+        self.completed = []  # Índices en el orden en que terminaron
+        self.report_id = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in ('completed', 'cancelled', 'failed')
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'client_id': self.client_id,
+            'client_name': self.client_info.get('nombre'),
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'total': len(self.devices),
+            'done': len(self.completed),
+            'report_id': self.report_id,
+            'error': self.error,
+            'priority': self.priority,
+            'schedule': self.schedule
+        }
+
+
+class JobManager:
+    """Cola de análisis por prioridad con un número limitado de trabajos simultáneos"""
+
+    def __init__(self, engine, max_concurrent_jobs=2, max_queued_jobs=50, retention=3600,
+                 on_event=None, on_complete=None, on_log=None):
+        self.engine = engine
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.retention = retention
+        self.on_event = on_event  # Notificación de progreso (SocketIO)
+        self.on_complete = on_complete  # Guarda el reporte y devuelve su id
+        self.on_log = on_log  # on_log(job, mensaje): logs del análisis de un trabajo
+
+        self.queue = queue.PriorityQueue(maxsize=max_queued_jobs)
+        self.sequence = itertools.count()  # Orden de llegada entre trabajos de igual prioridad
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+        for index in range(self.max_concurrent_jobs):
+            threading.Thread(target=self._worker, daemon=True, name=f'job-worker-{index}').start()
+
+    @classmethod
+    def from_config(cls, engine, config, max_concurrent_jobs=None, **kwargs):
+        settings = config.get('jobs', {})
+        return cls(
+            engine,
+            max_concurrent_jobs=max_concurrent_jobs or settings.get('max_concurrent_jobs', 2),
+            max_queued_jobs=settings.get('max_queued_jobs', 50),
+            retention=settings.get('retention', 3600),
+            **kwargs
+        )
+
+    def submit(self, client_id, client_info, devices, checks, incremental=None, priority=0, schedule=None):
+        """Encola un análisis. Lanza queue.Full si la cola está llena"""
+        job = Job(client_id, client_info, devices, checks, incremental, priority, schedule)
+        self._purge_finished()
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait((job.priority, next(self.sequence), job))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job.id]
+            raise
+        self._emit(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job_id):
+        """Cancela un trabajo: los dispositivos pendientes no se analizan"""
+        job = self.get(job_id)
+        if not job or job.done:
+            return job
+
+        job.cancel_event.set()
+        if job.status == 'queued':
+            self._finish(job, 'cancelled')
+        return job
+
+    def partial_results(self, job, since=0):
+        """Resultados terminados desde la posición `since` (en orden de finalización)"""
+        indexes = job.completed[since:]
+        return [{'index': i, 'result': job.results[i]} for i in indexes]
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            try:
+                if job.cancel_event.is_set():
+                    continue
+                self._run(job)
+            finally:
+                self.queue.task_done()
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started = datetime.now().isoformat()
+        job.started_at = time.monotonic()
+        self._emit(job)
+
+        def on_result(index, result):
+            job.results[index] = result
+            job.completed.append(index)
+            self._emit(job, device=job.devices[index], result=result)
+
+        try:
+            self.engine.analyze_client(
+                job.client_info, job.devices, job.checks,
+                on_progress=self._device_progress(job),
+                on_result=on_result,
+                cancel_event=job.cancel_event,
+                incremental=job.incremental,
+                log_callback=(lambda message: self.on_log(job, message)) if self.on_log else None
+            )
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, 'failed')
+            return
+
+        if self.on_complete:
+            try:
+                job.report_id = self.on_complete(job, self.build_report(job))
+            except Exception as e:
+                job.error = f"Error guardando reporte: {str(e)}"
+
+        self._finish(job, 'cancelled' if job.cancel_event.is_set() else 'completed')
+
+    def build_report(self, job):
+        """Estructura del reporte, igual que la del análisis síncrono"""
+        report = {
+            'client_id': job.client_id,
+            'client_name': job.client_info['nombre'],
+            'timestamp': job.started or datetime.now().isoformat(),
+            'job_id': job.id,
+            'devices': [r for r in job.results if r is not None],
+            'timings': {'analysis': round(time.monotonic() - (job.started_at or time.monotonic()), 4)}
+        }
+        if job.schedule:
+            report['schedule'] = job.schedule
+        if job.incremental:
+            report['incremental'] = job.incremental.summary(report['devices'])
+        return report
+
+    def _device_progress(self, job):
+        def on_progress(device, status):
+            if self.on_event:
+                self.on_event('device_progress', {
+                    'job_id': job.id,
+                    'device': device['hostname'],
+                    'device_id': device['id'],
+                    'status': status
+                })
+        return on_progress
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = datetime.now().isoformat()
+        job.finished_at = time.monotonic()
+        self._emit(job)
+
+    def _emit(self, job, device=None, result=None):
+        if not self.on_event:
+            return
+        payload = job.to_dict()
+        if device is not None:
+            payload['device'] = device['hostname']
+            payload['device_id'] = device['id']
+            payload['device_status'] = result['status']
+        self.on_event('job_progress', payload)
+
+    def _purge_finished(self):
+        """Olvida los trabajos terminados hace más de `retention` segundos"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job.done and job.finished_at and now - job.finished_at > self.retention
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
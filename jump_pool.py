@@ -0,0 +1,196 @@
+import threading
+import time
+import paramiko
+
+
+class _PooledTransport:
+    """Transporte SSH autenticado contra un jump host"""
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = client.get_transport()
+        self.channels = 0
+        self.last_used = time.monotonic()
+
+    def is_active(self):
+        return self.transport is not None and self.transport.is_active()
+
+    def close(self):
+        self.client.close()
+
+
+class JumpLease:
+    """Reserva de un canal sobre un transporte del pool"""
+
+    def __init__(self, pool, key, entry):
+        self.pool = pool
+        self.key = key
+        self.entry = entry
+        self.released = False
+
+    @property
+    def transport(self):
+        return self.entry.transport
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.pool.release(self)
+
+
+class JumpHostPool:
+    """Pool de conexiones persistentes a los jump hosts (Bridgenet).
+
+    Mantiene transportes autenticados vivos con keepalive y reparte canales
+    entre ellos, de forma que un lote de dispositivos paga un único handshake.
+    """
+
+    def __init__(self, keepalive=30, idle_timeout=300, max_channels=10, max_transports=4, connect_timeout=30):
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.max_channels = max(1, max_channels)
+        self.max_transports = max(1, max_transports)
+        self.connect_timeout = connect_timeout
+
+        self.entries = {}  # (host, puerto, usuario) -> [_PooledTransport]
+        self.connecting = {}  # Transportes en negociación por clave
+        self.waiting = {}  # Peticiones esperando un canal por clave
+        self.condition = threading.Condition()
+        self.handshakes = 0
+        self.reclaim = None  # reclaim(clave) -> canales liberados por la cache de sesiones (opcional)
+
+        # Hilo que cierra los transportes ociosos
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True, name='jump-pool-reaper')
+        self._reaper.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """Crea el pool a partir de la sección jump_pool de config.json (None si está deshabilitado)"""
+        settings = config.get('jump_pool', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(
+            keepalive=settings.get('keepalive', 30),
+            idle_timeout=settings.get('idle_timeout', 300),
+            max_channels=settings.get('max_channels', 10),
+            max_transports=settings.get('max_transports', 4),
+            connect_timeout=config.get('ssh', {}).get('connect_timeout', 30)
+        )
+
+    def acquire(self, jump_info, jump_creds):
+        """Reserva un canal en un transporte con capacidad, creando uno si hace falta"""
+        key = (jump_info['host'], jump_info.get('port', 22), jump_creds['username'])
+
+        deadline = time.monotonic() + self.connect_timeout
+
+        with self.condition:
+            while True:
+                entries = self.entries.setdefault(key, [])
+                entries[:] = [e for e in entries if e.is_active()]
+
+                # Reutilizar el transporte con menos canales abiertos
+                available = [e for e in entries if e.channels < self.max_channels]
+                if available:
+                    entry = min(available, key=lambda e: e.channels)
+                    entry.channels += 1
+                    entry.last_used = time.monotonic()
+                    return JumpLease(self, key, entry)
+
+                # Si hay un handshake en curso con capacidad libre, esperarlo en vez de abrir otro
+                connecting = self.connecting.get(key, 0)
+                pending = connecting * (self.max_channels - 1) - self.waiting.get(key, 0)
+                if pending <= 0 and len(entries) + connecting < self.max_transports:
+                    self.connecting[key] = connecting + 1
+                    break
+
+                # Sin capacidad ni handshake en curso: primero se cierran sesiones ociosas de la cache
+                if self.reclaim and pending <= 0:
+                    self.condition.release()
+                    try:
+                        freed = self.reclaim(key)
+                    finally:
+                        self.condition.acquire()
+                    if freed:
+                        continue
+
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"Sin canales libres hacia el jump host {key[0]}")
+
+                self.waiting[key] = self.waiting.get(key, 0) + 1
+                self.condition.wait(timeout=1)
+                self.waiting[key] -= 1
+
+        # El handshake se hace fuera del lock para no bloquear otras claves
+        try:
+            entry = self._open_transport(jump_info, jump_creds)
+        finally:
+            with self.condition:
+                self.connecting[key] -= 1
+                self.condition.notify_all()
+
+        with self.condition:
+            entry.channels += 1
+            self.entries.setdefault(key, []).append(entry)
+            self.handshakes += 1
+            return JumpLease(self, key, entry)
+
+    def _open_transport(self, jump_info, jump_creds):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=jump_info['host'],
+            username=jump_creds['username'],
+            password=jump_creds['password'],
+            port=jump_info.get('port', 22),
+            timeout=self.connect_timeout
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        return _PooledTransport(client)
+
+    def release(self, lease):
+        """Devuelve el canal al pool; el transporte sigue abierto"""
+        with self.condition:
+            lease.entry.channels = max(0, lease.entry.channels - 1)
+            lease.entry.last_used = time.monotonic()
+            self.condition.notify_all()
+
+    def evict_idle(self):
+        """Cierra transportes sin canales que superan el tiempo de inactividad"""
+        now = time.monotonic()
+        to_close = []
+        with self.condition:
+            for key, entries in self.entries.items():
+                keep = []
+                for entry in entries:
+                    idle = entry.channels == 0 and now - entry.last_used > self.idle_timeout
+                    if idle or not entry.is_active():
+                        to_close.append(entry)
+                    else:
+                        keep.append(entry)
+                entries[:] = keep
+        for entry in to_close:
+            entry.close()
+        return len(to_close)
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(min(self.idle_timeout, 30))
+            self.evict_idle()
+
+    def close_all(self):
+        with self.condition:
+            entries = [e for items in self.entries.values() for e in items]
+            self.entries.clear()
+        for entry in entries:
+            entry.close()
+
+    def stats(self):
+        """Resumen del estado del pool"""
+        with self.condition:
+            return {
+                'handshakes': self.handshakes,
+                'transports': {
+                    f"{host}:{port}": [e.channels for e in entries]
+                    for (host, port, _), entries in self.entries.items()
+                }
+            }
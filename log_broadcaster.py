@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class LogBroadcaster:
+    """Envío de logs al navegador agrupados en tramas periódicas.
+
+    `publish` nunca bloquea al hilo que recolecta: las líneas se encolan y un
+    hilo las agrupa por sala (trabajo o socket que pidió el análisis) y emite
+    una trama `console_log_batch` por sala cada `interval` segundos. Si la cola
+    se llena o una sala supera `max_batch` líneas por trama, las líneas
+    sobrantes se descartan y se informa cuántas en la trama.
+    """
+
+    def __init__(self, emit, interval=0.25, max_batch=200, max_pending=10000):
+        self.emit = emit  # emit(evento, datos, room) -> socketio.emit
+        self.interval = interval
+        self.max_batch = max(1, max_batch)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._loop, daemon=True, name='log-broadcaster')
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, emit, config):
+        settings = config.get('socketio', {})
+        return cls(
+            emit,
+            interval=settings.get('log_interval', 0.25),
+            max_batch=settings.get('log_max_batch', 200),
+            max_pending=settings.get('log_max_pending', 10000)
+        )
+
+    def publish(self, message, room=None):
+        """Encola una línea para la sala indicada (None: todos los clientes)"""
+        try:
+            self.queue.put_nowait((room, message))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def _loop(self):
+        while True:
+            first = self.queue.get()
+            time.sleep(self.interval)  # Dejar que se acumulen las líneas de este intervalo
+            self._flush([first])
+
+    def _flush(self, entries):
+        while True:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        frames = OrderedDict()  # sala -> [líneas, descartadas]
+        for room, message in entries:
+            frames.setdefault(room, [[], 0])[0].append(message)
+
+        with self.lock:
+            overflow, self.dropped = self.dropped, 0
+
+        for room, (lines, dropped) in frames.items():
+            # Se conservan las más recientes
+            if len(lines) > self.max_batch:
+                dropped += len(lines) - self.max_batch
+                lines = lines[-self.max_batch:]
+            if room is None:
+                dropped += overflow
+                overflow = 0
+            try:
+                self.emit('console_log_batch', {'lines': lines, 'dropped': dropped}, room)
+            except Exception:
+                pass
+
+        # Descartes por cola llena sin trama general en este intervalo
+        if overflow:
+            try:
+                self.emit('console_log_batch', {'lines': [], 'dropped': overflow}, None)
+            except Exception:
+                pass
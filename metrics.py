@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (segundos) de los histogramas de duración
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PREFIX = 'network_analyzer'
+
+
+def _labels(labels):
+    """Etiquetas en formato Prometheus, ordenadas y escapadas"""
+    if not labels:
+        return ''
+    items = []
+    for key, value in sorted(labels):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        items.append(f'{key}="{value}"')
+    return '{' + ','.join(items) + '}'
+
+
+class Metrics:
+    """Registro de métricas en memoria con salida en formato de texto de Prometheus"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.histograms = {}  # (nombre, etiquetas) -> [conteos por bucket, suma, total]
+        self.counters = {}  # (nombre, etiquetas) -> valor
+        self.help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple((k, v) for k, v in labels.items() if v is not None)
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def take_histograms(self):
+        """Devuelve y pone a cero los histogramas (lo que un worker envía al proceso web)"""
+        with self.lock:
+            histograms, self.histograms = self.histograms, {}
+        return [(key, counts, total, count) for key, (counts, total, count) in histograms.items()]
+
+    def merge_histograms(self, histograms):
+        """Suma histogramas tomados con take_histograms en otro proceso (mismos límites)"""
+        with self.lock:
+            for key, counts, total, count in histograms:
+                entry = self.histograms.get(key)
+                if entry is None:
+                    entry = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def render(self):
+        """Exposición en texto para /metrics"""
+        with self.lock:
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            metric = f"{PREFIX}_{name}_seconds"
+            if name in self.help:
+                lines.append(f"# HELP {metric} {self.help[name]}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (key_name, labels), (counts, total, count) in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', bound),))} {bucket_count}")
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+        for name in sorted({name for name, _ in counters}):
+            metric = f"{PREFIX}_{name}_total"
+            if name in self.help:
+                lines.append(f"# HELP {metric} {self.help[name]}")
+            lines.append(f"# TYPE {metric} counter")
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(f"{metric}{_labels(labels)} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def gauge_lines(name, samples, help_text=None):
+    """Líneas de un gauge calculado al momento (samples: [(etiquetas, valor)])"""
+    metric = f"{PREFIX}_{name}"
+    lines = [f"# HELP {metric} {help_text}"] if help_text else []
+    lines.append(f"# TYPE {metric} gauge")
+    for labels, value in samples:
+        lines.append(f"{metric}{_labels(tuple(labels.items()))} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+# Registro por defecto, compartido por todo el proceso
+registry = Metrics()
+registry.describe('phase', 'Duración de cada fase del análisis (connect, jump, auth, enable, command, parse, report_write, pdf)')
+registry.describe('devices', 'Dispositivos analizados por estado')
+registry.describe('reports', 'Reportes guardados')
@@ -1,29 +1,124 @@
 import paramiko
 import socket
+import codecs
 import time
 import json
 import re
 from pathlib import Path
 from typing import Optional, Dict, Any
-from netmiko import ConnectHandler
+from netmiko import ConnectHandler, BaseConnection
 from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+import metrics
+from session_logger import SessionLogger
+from output_spool import OutputSpool, OutputCleaner, CommandDemuxer, output_text
+
+# Patrones de la CLI (se evalúan contra el final de la salida recibida)
+PASSWORD_PATTERN = re.compile(r'[Pp]assword:\s*$')
+HOSTKEY_PATTERN = re.compile(r'\(yes/no(/\[fingerprint\])?\)\?\s*$')
+MORE_PATTERN = re.compile(r'(--More--|<--- More --->)\s*$')
+SSH_ERROR_PATTERN = re.compile(
+    r'(Connection timed out|Connection refused|No route to host|Could not resolve|'
+    r'Permission denied \(|Connection closed by)', re.IGNORECASE
+)
+DEVICE_PROMPT_PATTERN = re.compile(r'(?:^|[\r\n])([\w.\-/:@]{1,63})(?:\([\w.\-/]*\))?[>#]\s*$')
+SHELL_PROMPT_PATTERN = re.compile(r'[$#>%]\s*$')
+PROMPT_TAIL_SIZE = 256
+
+# Conexión directa: tipos que se abren con el shell propio (paramiko); el resto va por netmiko
+NATIVE_DIRECT_TYPES = ('cisco_ios', 'cisco_xe', 'cisco_nxos', 'cisco_asa')
+
+# Comando para desactivar el paginador según el tipo de dispositivo
+PAGING_COMMANDS = {
+    'cisco_ios': 'terminal length 0',
+    'cisco_xe': 'terminal length 0',
+    'cisco_nxos': 'terminal length 0',
+    'cisco_asa': 'terminal pager 0'
+}
+
+class AuthenticationFailed(ConnectionError):
+    """Credenciales rechazadas: no tiene sentido reintentar"""
+
+class DeviceConnection:
+    """Conexión autenticada con un dispositivo, separable de la sesión que la abrió"""
+    FIELDS = ('connection', 'jump_channel', 'jump_client', 'jump_lease', 'device_client', 'netmiko_conn',
+              'prompt_pattern', 'paging_disabled')
+    
+    def __init__(self, **handles):
+        for field in self.FIELDS:
+            setattr(self, field, handles.get(field))
+    
+    def close(self):
+        """Sale del dispositivo y libera canal, túnel y transporte"""
+        if self.jump_channel:
+            try:
+                # Salir del dispositivo y de Bridgenet
+                self.jump_channel.send('exit\nexit\n')
+            except:
+                pass
+            self.jump_channel.close()
+        
+        if self.device_client:
+            self.device_client.close()
+        
+        if self.netmiko_conn:
+            try:
+                self.netmiko_conn.disconnect()
+            except Exception:
+                pass
+        
+        if self.jump_lease:
+            self.jump_lease.release()
+        
+        if self.jump_client:
+            self.jump_client.close()
 
 class NetworkCore:
-    def __init__(self):
-        self.config = self.load_config()
+    def __init__(self, config=None, logger=None, jump_pool=None, session_cache=None, device_health=None):
+        # Cada sesión puede recibir la configuración ya cargada para no releerla
+        self.config = config if config is not None else self.load_config()
         self.connection = None
         self.jump_client = None
         self.jump_channel = None
+        self.jump_pool = jump_pool  # Pool compartido de transportes a Bridgenet (opcional)
+        self.jump_lease = None
+        self.device_client = None  # Cliente SSH del dispositivo (modo túnel o conexión directa)
+        self.netmiko_conn = None  # Conexión netmiko (tipos sin shell propio o telnet)
+        self.session_cache = session_cache  # Cache de sesiones autenticadas (opcional)
+        self.session_key = None
+        self.device_health = device_health  # Plazos adaptativos, reintentos y circuito (opcional)
+        self.last_error = None  # Excepción del último intento de conexión fallido
+        self.cancel_event = None  # Se activa para detener el análisis en curso
+        self.prompt_pattern = None  # Prompt aprendido del dispositivo conectado
+        self.paging_disabled = None  # Ya se envió "terminal length 0" en esta conexión
+        self.device_type = None
+        self.client_name = None
+        self.timings = {}  # Duración de cada fase del dispositivo en análisis
         self.log_callback = None  # Para enviar logs al frontend
+        self.device_name = None  # Dispositivo en análisis (prefijo de logs)
+        
+        # Escritor de logs en segundo plano (compartido entre sesiones paralelas)
+        self.logger = logger if logger is not None else SessionLogger.from_config(self.config)
+        
+        # Log del dispositivo en análisis (acotado)
+        max_lines = self.config.get('logging', {}).get('max_device_lines', 5000)
+        self.full_log = deque(maxlen=max_lines)
+        
+        # Plazos de espera SSH (segundos)
+        ssh_settings = self.config.get('ssh', {})
+        self.connect_timeout = ssh_settings.get('connect_timeout', 30)
+        self.login_timeout = ssh_settings.get('login_timeout', 20)
+        self.command_timeout = ssh_settings.get('command_timeout', 60)
+        self.probe_timeout = ssh_settings.get('probe_timeout', 3)
+        # Silencio que confirma el prompt del jump host tras el banner
+        self.banner_quiet = ssh_settings.get('banner_quiet', 0.3)
         
-        # Crear directorio de logs
-        self.log_dir = Path('data/logs')
-        self.log_dir.mkdir(parents=True, exist_ok=True)
+        # Enviar los comandos de cada check en un solo envío
+        self.pipeline = ssh_settings.get('pipeline', True)
         
-        # Archivo de log para la sesión actual
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        self.log_file = self.log_dir / f"session_{timestamp}.txt"
-        self.full_log = []
+        # Salidas largas a disco en lugar de en memoria
+        self.spool = OutputSpool.from_config(self.config)
     
     def set_log_callback(self, callback):
         """Establece callback para enviar logs al frontend"""
@@ -33,22 +128,44 @@ class NetworkCore:
         """Registra todo en archivo y memoria"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         log_entry = f"[{timestamp}] [{level}] {message}"
-        
-        # Imprimir en consola
-        print(log_entry)
+        if self.device_name:
+            log_entry = f"[{timestamp}] [{level}] [{self.device_name}] {message}"
         
         # Enviar al frontend si hay callback y está habilitado
         if self.log_callback and show_in_gui:
             # Filtrar solo salidas importantes para el GUI
             if any(x in message for x in ['>', '#', 'Password:', 'BANNER', 'EJECUTANDO', '✓', 'ERROR']):
+                if self.device_name:
+                    message = f"[{self.device_name}] {message}"
                 self.log_callback(message)
         
         # Guardar en memoria
         self.full_log.append(log_entry)
         
-        # Escribir en archivo
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry + '\n')
+        # Consola y archivo: el escritor en segundo plano lo vuelca por lotes
+        self.logger.write(log_entry)
+    
+    @contextmanager
+    def timed(self, phase, command=None):
+        """Mide una fase del análisis (desglose del reporte y métricas)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_timing(phase, time.monotonic() - start, command)
+    
+    def record_timing(self, phase, seconds, command=None):
+        if command is not None:
+            self.timings.setdefault('commands', {})[command] = round(seconds, 4)
+        else:
+            self.timings[phase] = round(self.timings.get(phase, 0) + seconds, 4)
+        # Sin el comando como etiqueta: en modo custom es texto libre y cada uno sería una serie nueva
+        metrics.registry.observe('phase', seconds, phase=phase, client=self.client_name)
+    
+    @property
+    def log_file(self):
+        """Archivo de log de sesión actual (cambia al rotar)"""
+        return self.logger.current_file
     
     def load_config(self):
         config_path = Path('config/config.json')
@@ -65,6 +182,15 @@ class NetworkCore:
         """Conecta a un dispositivo con o sin jump host"""
         self.log(f"INICIANDO CONEXIÓN A {device_info['hostname']} ({device_info['ip']})")
         
+        # Reutilizar una sesión ya autenticada si la cache está activa
+        if self.session_cache:
+            self.session_key = self.session_cache.make_key(client_info, device_info)
+            cached = self.session_cache.checkout(self.session_key, probe=self._probe_connection)
+            if cached:
+                self._attach_connection(cached)
+                self.log(f"✓ Reutilizando sesión abierta con {device_info['hostname']}")
+                return self.connection
+        
         creds = self.get_credentials(client_info.get('credential', 'default'))
         
         if not creds:
@@ -87,6 +213,30 @@ class NetworkCore:
         self.log(f"Conectando directamente a {device_info['ip']}")
         return self._connect_direct(device_info, creds)
     
+    def _connect_with_retries(self, device_info, client_info):
+        """connect_device con reintentos acotados ante fallas transitorias"""
+        retries = self.device_health.retries if self.device_health else 0
+        for attempt in range(retries + 1):
+            self.last_error = None
+            conn = self.connect_device(device_info, client_info)
+            if conn or attempt == retries or not self._transient(self.last_error) or self._cancelled():
+                return conn
+            
+            delay = self.device_health.backoff(attempt)
+            self.log(f"Reintentando conexión ({attempt + 1}/{retries}) en {delay:.1f}s", "WARNING")
+            if self.cancel_event is not None and self.cancel_event.wait(delay):
+                return None
+            if self.cancel_event is None:
+                time.sleep(delay)
+        return None
+    
+    @staticmethod
+    def _transient(error):
+        """Falla que puede resolverse sola (no credenciales rechazadas ni configuración)"""
+        if error is None or isinstance(error, (AuthenticationFailed, paramiko.AuthenticationException)):
+            return False
+        return isinstance(error, (OSError, EOFError, paramiko.SSHException))
+    
     def _connect_via_jump_manual(self, device_info, device_creds, jump_info, jump_creds):
         """Conexión manual a través de Bridgenet sin Netmiko"""
         try:
@@ -94,149 +244,353 @@ class NetworkCore:
             self.log("CONEXIÓN VÍA BRIDGENET")
             self.log("="*60)
             
-            # 1. Conectar a Bridgenet
+            # 1. Conectar a Bridgenet (o reutilizar un transporte del pool)
             self.log(f"Paso 1: Conectando a Bridgenet {jump_info['host']}")
-            self.jump_client = paramiko.SSHClient()
-            self.jump_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            self.jump_client.connect(
-                hostname=jump_info['host'],
-                username=jump_creds['username'],
-                password=jump_creds['password'],
-                port=jump_info.get('port', 22),
-                timeout=30
-            )
-            
+            with self.timed('jump'):
+                transport = self._open_jump_transport(jump_info, jump_creds)
             self.log("✓ Conectado a Bridgenet")
             
-            # 2. Abrir shell interactivo
-            self.jump_channel = self.jump_client.invoke_shell()
-            time.sleep(2)
-            
-            # Leer banner de Bridgenet
-            output = self._read_channel(self.jump_channel)
-            self.log("BANNER BRIDGENET:", show_in_gui=False)
-            self.log("-"*40, show_in_gui=False)
-            self.log(output)
-            self.log("-"*40, show_in_gui=False)
-            
-            # 3. Conectar al dispositivo final
-            ssh_cmd = f"ssh {device_creds['username']}@{device_info['ip']}"
-            self.log(f"Ejecutando: {ssh_cmd}")
-            self.jump_channel.send(ssh_cmd + '\n')
-            time.sleep(3)
+            # 2-4. Abrir sesión con el dispositivo final
+            with self.timed('auth'):
+                if jump_info.get('mode', 'shell') == 'tunnel':
+                    output = self._login_via_tunnel(transport, device_info, device_creds)
+                else:
+                    output = self._login_via_jump_shell(transport, device_info, device_creds)
             
-            # Leer respuesta
-            output = self._read_channel(self.jump_channel)
-            self.log(f"Respuesta SSH: {output}", show_in_gui=False)
+            # 5-6. Prompt y modo enable
+            with self.timed('enable'):
+                self._enter_enable(output, device_creds)
             
-            # 4. Enviar contraseña si la pide
-            if 'password' in output.lower():
-                self.log("Enviando contraseña...")
-                self.jump_channel.send(device_creds['password'] + '\n')
-                time.sleep(3)
-                output = self._read_channel(self.jump_channel)
-                self.log("BANNER DEL DISPOSITIVO:")
-                self.log(output)
+            # Usar el canal manual como conexión
+            self.connection = self.jump_channel
+            self.log(f"✓ Conexión establecida con {device_info['hostname']}")
+            return self.connection
             
-            # 5. Verificar que estamos en el dispositivo
-            self.jump_channel.send('\n')
-            time.sleep(1)
-            prompt = self._read_channel(self.jump_channel)
-            self.log(f"PROMPT DETECTADO: {prompt}")
+        except Exception as e:
+            self.log(f"ERROR en conexión: {str(e)}", "ERROR")
+            self.last_error = e
+            self._close_jump()
+            return None
+    
+    def _open_jump_transport(self, jump_info, jump_creds):
+        """Devuelve un transporte autenticado contra el jump host"""
+        if self.jump_pool:
+            self.jump_lease = self.jump_pool.acquire(jump_info, jump_creds)
+            return self.jump_lease.transport
+        
+        self.jump_client = paramiko.SSHClient()
+        self.jump_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        
+        self.jump_client.connect(
+            hostname=jump_info['host'],
+            username=jump_creds['username'],
+            password=jump_creds['password'],
+            port=jump_info.get('port', 22),
+            timeout=self.connect_timeout
+        )
+        return self.jump_client.get_transport()
+    
+    def _login_via_jump_shell(self, transport, device_info, device_creds):
+        """Abre shell en Bridgenet y ejecuta 'ssh usuario@ip' hacia el dispositivo"""
+        # 2. Abrir shell interactivo y leer banner hasta el prompt de Bridgenet
+        self.jump_channel = transport.open_session()
+        self.jump_channel.get_pty()
+        self.jump_channel.invoke_shell()
+        output = self._read_banner(self.jump_channel)
+        jump_prompt = self._learn_prompt(output)
+        self.log("BANNER BRIDGENET:", show_in_gui=False)
+        self.log("-"*40, show_in_gui=False)
+        self.log(output)
+        self.log("-"*40, show_in_gui=False)
+        
+        # 3. Conectar al dispositivo final
+        ssh_cmd = f"ssh {device_creds['username']}@{device_info['ip']}"
+        self.log(f"Ejecutando: {ssh_cmd}")
+        self.jump_channel.send(ssh_cmd + '\n')
+        
+        # Esperar contraseña, prompt del dispositivo o vuelta a Bridgenet (fallo)
+        patterns = [PASSWORD_PATTERN, HOSTKEY_PATTERN, SSH_ERROR_PATTERN, DEVICE_PROMPT_PATTERN]
+        if jump_prompt:
+            patterns.insert(2, jump_prompt)
+        output, match = self._read_until(self.jump_channel, patterns, self.login_timeout)
+        self.log(f"Respuesta SSH: {output}", show_in_gui=False)
+        
+        if match is not None and patterns[match] is HOSTKEY_PATTERN:
+            self.jump_channel.send('yes\n')
+            output, match = self._read_until(self.jump_channel, patterns, self.login_timeout)
+        
+        if match is None or patterns[match] in (SSH_ERROR_PATTERN, jump_prompt):
+            error = AuthenticationFailed if 'permission denied' in output.lower() else ConnectionError
+            raise error(f"Bridgenet no pudo abrir SSH a {device_info['ip']}: {output.strip()[-200:]}")
+        
+        # 4. Enviar contraseña si la pide
+        if patterns[match] is PASSWORD_PATTERN:
+            self.log("Enviando contraseña...")
+            self.jump_channel.send(device_creds['password'] + '\n')
+            output, match = self._read_until(
+                self.jump_channel, [DEVICE_PROMPT_PATTERN, PASSWORD_PATTERN], self.login_timeout
+            )
+            if match != 0:
+                raise AuthenticationFailed("Autenticación rechazada por el dispositivo")
+            self.log("BANNER DEL DISPOSITIVO:")
+            self.log(output)
+        
+        return output
+    
+    def _login_via_tunnel(self, transport, device_info, device_creds):
+        """Abre un túnel direct-tcpip por Bridgenet y autentica con el dispositivo"""
+        self.log(f"Abriendo túnel hacia {device_info['ip']}:{device_info.get('port', 22)}")
+        sock = transport.open_channel(
+            'direct-tcpip', (device_info['ip'], device_info.get('port', 22)), ('127.0.0.1', 0),
+            timeout=self.connect_timeout
+        )
+        
+        return self._open_device_shell(device_info, device_creds, sock=sock)
+    
+    def _open_device_shell(self, device_info, device_creds, sock=None):
+        """Autentica por SSH con el dispositivo (directo o sobre `sock`) y espera su prompt"""
+        self.device_client = paramiko.SSHClient()
+        self.device_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.device_client.connect(
+            hostname=device_info['ip'],
+            port=device_info.get('port', 22),
+            username=device_creds['username'],
+            password=device_creds['password'],
+            sock=sock,
+            timeout=self.connect_timeout,
+            auth_timeout=self.login_timeout,
+            look_for_keys=False,
+            allow_agent=False
+        )
+        
+        self.jump_channel = self.device_client.invoke_shell()
+        output, match = self._read_until(self.jump_channel, [DEVICE_PROMPT_PATTERN], self.login_timeout)
+        if match is None:
+            raise ConnectionError("No se detectó el prompt del dispositivo")
+        self.log("BANNER DEL DISPOSITIVO:")
+        self.log(output)
+        return output
+    
+    def _connect_direct(self, device_info, device_creds):
+        """Conexión directa al dispositivo, sin jump host"""
+        try:
+            if self._direct_driver(device_info) == 'netmiko':
+                with self.timed('auth'):
+                    return self._connect_netmiko(device_info, device_creds)
             
-            # 6. Intentar entrar a modo enable si es necesario
-            if '>' in prompt:
-                self.log("Entrando a modo enable...")
-                self.jump_channel.send('enable\n')
-                time.sleep(2)
-                output = self._read_channel(self.jump_channel)
-                
-                if 'password' in output.lower():
-                    self.log("Enviando enable password...")
-                    self.jump_channel.send(device_creds.get('enable_password', device_creds['password']) + '\n')
-                    time.sleep(2)
-                    output = self._read_channel(self.jump_channel)
-                    
-                    # Verificar si entró a enable
-                    self.jump_channel.send('\n')
-                    time.sleep(1)
-                    new_prompt = self._read_channel(self.jump_channel)
-                    if '#' in new_prompt:
-                        self.log("✓ Modo enable activado")
-                    else:
-                        self.log("Continuando en modo usuario")
+            with self.timed('auth'):
+                output = self._open_device_shell(device_info, device_creds)
+            with self.timed('enable'):
+                self._enter_enable(output, device_creds)
             
-            # Usar el canal manual como conexión
             self.connection = self.jump_channel
             self.log(f"✓ Conexión establecida con {device_info['hostname']}")
             return self.connection
-            
+        
         except Exception as e:
             self.log(f"ERROR en conexión: {str(e)}", "ERROR")
-            if self.jump_client:
-                self.jump_client.close()
+            self.last_error = e
+            self._close_jump()
             return None
     
-    def _read_channel(self, channel, timeout=1):
-        """Lee datos del canal SSH"""
-        channel.settimeout(timeout)
-        output = ""
+    @staticmethod
+    def _direct_driver(device_info):
+        """'native' (shell propio) o 'netmiko'; se puede forzar con 'driver' en el dispositivo"""
+        if device_info.get('driver'):
+            return device_info['driver']
+        if device_info.get('protocol', 'ssh') != 'ssh':
+            return 'netmiko'
+        return 'native' if device_info.get('type', 'cisco_ios') in NATIVE_DIRECT_TYPES else 'netmiko'
+    
+    def _connect_netmiko(self, device_info, device_creds):
+        """Login con netmiko para tipos sin soporte propio (o telnet).
+        
+        Por SSH se usa después el canal paramiko de netmiko con el mismo envío en
+        lote y lectura por prompt que el resto de conexiones.
+        """
+        device_type = device_info.get('type', 'cisco_ios')
+        if device_info.get('protocol') == 'telnet' and not device_type.endswith('_telnet'):
+            device_type += '_telnet'
+        
+        self.log(f"Conectando con netmiko ({device_type})")
+        self.netmiko_conn = ConnectHandler(
+            device_type=device_type,
+            host=device_info['ip'],
+            port=device_info.get('port'),
+            username=device_creds['username'],
+            password=device_creds['password'],
+            secret=device_creds.get('enable_password', device_creds['password']),
+            conn_timeout=self.connect_timeout,
+            auth_timeout=self.login_timeout,
+            read_timeout_override=self.command_timeout
+        )
+        
         try:
-            while True:
-                if channel.recv_ready():
-                    data = channel.recv(4096).decode('utf-8', errors='ignore')
-                    output += data
-                else:
-                    time.sleep(0.1)
-                    if not channel.recv_ready():
-                        break
-        except socket.timeout:
-            pass
+            if not self.netmiko_conn.check_enable_mode():
+                self.netmiko_conn.enable()
+                self.log("✓ Modo enable activado")
+        except Exception:
+            self.log("Continuando en modo usuario")
+        
+        prompt = self.netmiko_conn.find_prompt()
+        self.log(f"PROMPT DETECTADO: {prompt}")
+        self.prompt_pattern = self._learn_prompt(prompt)
+        # netmiko ya desactivó el paginador al preparar la sesión
+        self.paging_disabled = True
+        
+        channel = self.netmiko_conn.remote_conn
+        if isinstance(channel, paramiko.Channel):
+            # Consumir los prompts que netmiko dejó en camino antes de leer el canal directamente
+            channel.send('\n')
+            while self._read_until(channel, [self.prompt_pattern], 0.25)[1] is not None:
+                pass
+            self.connection = channel
+        else:
+            self.connection = self.netmiko_conn
+        self.log(f"✓ Conexión establecida con {device_info['hostname']}")
+        return self.connection
+    
+    def _enter_enable(self, output, device_creds):
+        """Aprende el prompt del dispositivo y entra a modo enable si hace falta"""
+        # 5. Aprender el prompt del dispositivo
+        prompt = self._learn_prompt(output)
+        self.log(f"PROMPT DETECTADO: {output.strip().splitlines()[-1] if output.strip() else ''}")
+        
+        # 6. Intentar entrar a modo enable si es necesario
+        if output.rstrip().endswith('>'):
+            self.log("Entrando a modo enable...")
+            self.jump_channel.send('enable\n')
+            output, match = self._read_until(self.jump_channel, [PASSWORD_PATTERN, prompt], self.login_timeout)
+            
+            if match == 0:
+                self.log("Enviando enable password...")
+                self.jump_channel.send(device_creds.get('enable_password', device_creds['password']) + '\n')
+                output, _ = self._read_until(self.jump_channel, [prompt, PASSWORD_PATTERN], self.login_timeout)
+                
+            # Verificar si entró a enable
+            if output.rstrip().endswith('#'):
+                self.log("✓ Modo enable activado")
+            else:
+                self.log("Continuando en modo usuario")
+        
+        self.prompt_pattern = prompt
+    
+    def _read_until(self, channel, patterns, timeout, sink=None):
+        """Lee del canal hasta que el final de la salida coincide con un patrón o vence el plazo.
+        
+        Devuelve (salida, índice del patrón encontrado o None si venció el plazo).
+        Con `sink` cada fragmento se entrega al consumidor en lugar de acumularse.
+        """
+        deadline = time.monotonic() + timeout
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        chunks = []
+        tail = ""
+        
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            channel.settimeout(remaining)
+            try:
+                data = channel.recv(4096)
+            except socket.timeout:
+                break
+            if not data:
+                # Canal cerrado por el otro extremo
+                break
+            
+            text = decoder.decode(data)
+            if sink:
+                sink(text)
+            else:
+                chunks.append(text)
+            
+            # Solo se evalúa la cola de la salida: el prompt siempre está al final
+            tail = (tail + text)[-PROMPT_TAIL_SIZE:]
+            for index, pattern in enumerate(patterns):
+                if pattern.search(tail):
+                    return ''.join(chunks), index
+        
+        return ''.join(chunks), None
+    
+    def _read_banner(self, channel):
+        """Lee el banner hasta el prompt del shell.
+
+        Una línea del banner como '#####' o 'Welcome>' también coincide con
+        SHELL_PROMPT_PATTERN al final de un fragmento: el prompt es lo último
+        recibido antes de que el canal quede en silencio `banner_quiet` segundos.
+        """
+        deadline = time.monotonic() + self.login_timeout
+        output, match = self._read_until(channel, [SHELL_PROMPT_PATTERN], self.login_timeout)
+        while match is not None:
+            more, match = self._read_until(channel, [SHELL_PROMPT_PATTERN], self.banner_quiet)
+            if not more:
+                break
+            output += more
+            if match is None:
+                more, match = self._read_until(channel, [SHELL_PROMPT_PATTERN], deadline - time.monotonic())
+                output += more
         return output
     
+    def _drain_channel(self, channel):
+        """Descarta lo que haya pendiente en el canal sin esperar"""
+        while channel.recv_ready():
+            channel.recv(4096)
+    
+    def _learn_prompt(self, output):
+        """Construye una regex del prompt a partir de la última línea recibida"""
+        lines = output.strip().splitlines()
+        if not lines:
+            return None
+        
+        match = DEVICE_PROMPT_PATTERN.search('\n' + lines[-1].strip())
+        if match:
+            # Prompt de dispositivo: hostname, modo config opcional y > o #
+            base = re.escape(match.group(1))
+            return re.compile(r'(?:^|[\r\n])' + base + r'(?:\([\w.\-/]*\))?[>#]\s*$')
+        
+        return re.compile(re.escape(lines[-1].strip()) + r'\s*$')
+    
     def send_command(self, command):
         """Envía comando al dispositivo"""
+        with self.timed('command', command):
+            return self._send_command(command)
+    
+    def _send_command(self, command):
         if self.connection and isinstance(self.connection, paramiko.Channel):
             self.log(f"EJECUTANDO COMANDO: {command}")
             
             try:
                 # Limpiar buffer
-                self._read_channel(self.connection, 0.5)
+                self._drain_channel(self.connection)
                 
                 # Enviar comando
                 self.connection.send(command + '\n')
-                time.sleep(2)
                 
-                # Leer respuesta completa
-                output = ""
-                max_attempts = 10
-                for _ in range(max_attempts):
-                    chunk = self._read_channel(self.connection, 1)
-                    if chunk:
-                        output += chunk
-                    else:
-                        break
+                # Leer hasta el prompt, avanzando las páginas --More--.
+                # La salida se limpia y se captura por fragmentos (a disco si es larga)
+                capture = self.spool.open(self.device_name, command)
+                cleaner = OutputCleaner(command, capture)
+                prompt = self.prompt_pattern or DEVICE_PROMPT_PATTERN
+                deadline = time.monotonic() + self.command_timeout
+                while True:
+                    _, match = self._read_until(
+                        self.connection, [prompt, MORE_PATTERN],
+                        max(deadline - time.monotonic(), 0), sink=cleaner.feed
+                    )
                     
-                    # Si encontramos el prompt o --More--, procesamos
-                    if '>' in chunk or '#' in chunk:
-                        break
-                    elif '--More--' in chunk:
+                    if match == 1:
                         self.connection.send(' ')  # Enviar espacio para continuar
-                        time.sleep(0.5)
+                        continue
+                    if match is None:
+                        self.log(f"Tiempo agotado esperando el prompt tras '{command}'", "WARNING")
+                    break
                 
-                # Limpiar output
-                lines = output.split('\n')
-                # Remover el comando echo y el prompt
-                if lines and command in lines[0]:
-                    lines = lines[1:]
-                if lines and ('>' in lines[-1] or '#' in lines[-1]):
-                    lines = lines[:-1]
-                
-                clean_output = '\n'.join(lines)
+                clean_output = cleaner.finish()
                 
                 # Mostrar en GUI solo primeras líneas importantes
-                preview = clean_output[:500] if clean_output else "Sin salida"
+                preview = capture.preview_text()[:500] or "Sin salida"
                 self.log(f"RESPUESTA: {preview}")
                 
                 return clean_output
@@ -245,29 +599,195 @@ class NetworkCore:
                 self.log(f"ERROR ejecutando comando: {str(e)}", "ERROR")
                 return ""
         
+        if isinstance(self.connection, BaseConnection):
+            return self._send_command_netmiko(command)
+        
         return ""
     
+    def _send_command_netmiko(self, command):
+        """Comando por netmiko (conexiones sin canal paramiko, p. ej. telnet)"""
+        self.log(f"EJECUTANDO COMANDO: {command}")
+        try:
+            output = self.connection.send_command(command, read_timeout=self.command_timeout)
+        except Exception as e:
+            self.log(f"ERROR ejecutando comando: {str(e)}", "ERROR")
+            return ""
+        
+        capture = self.spool.open(self.device_name, command)
+        capture.write(output)
+        self.log(f"RESPUESTA: {capture.preview_text()[:500] or 'Sin salida'}")
+        return capture.finish()
+    
+    def send_commands(self, commands):
+        """Envía una lista de comandos en un solo envío y separa sus salidas.
+        
+        Con el paginador desactivado, el dispositivo ejecuta los comandos en
+        orden y la salida de cada uno termina en la línea de prompt que trae el
+        eco del siguiente. Si el paginador no se puede desactivar se envían de
+        uno en uno.
+        """
+        if (len(commands) < 2 or not self.pipeline or not isinstance(self.connection, paramiko.Channel)
+                or not self._disable_paging()):
+            return {cmd: self.send_command(cmd) for cmd in commands if not self._cancelled()}
+        
+        self.log(f"EJECUTANDO COMANDOS ({len(commands)} en lote): {', '.join(commands)}")
+        
+        prompt = self.prompt_pattern or DEVICE_PROMPT_PATTERN
+        demuxer = CommandDemuxer(
+            commands,
+            lambda cmd: OutputCleaner(cmd, self.spool.open(self.device_name, cmd)),
+            self._prompt_line(prompt)
+        )
+        
+        try:
+            self._drain_channel(self.connection)
+            demuxer.starts[0] = time.monotonic()
+            self.connection.send('\n'.join(commands) + '\n')
+            
+            # Leer hasta ver el prompt después del eco del último comando
+            deadline = time.monotonic() + self.command_timeout * len(commands)
+            while True:
+                _, match = self._read_until(
+                    self.connection, [prompt, MORE_PATTERN],
+                    max(deadline - time.monotonic(), 0), sink=demuxer.feed
+                )
+                
+                if match == 1:
+                    self.connection.send(' ')
+                    continue
+                if match is None:
+                    self.log(f"Tiempo agotado esperando el lote ({demuxer.index + 1}/{len(commands)} comandos)", "WARNING")
+                    break
+                if demuxer.done:
+                    break
+        except Exception as e:
+            self.log(f"ERROR ejecutando comandos: {str(e)}", "ERROR")
+        
+        outputs = demuxer.finish()
+        
+        # Duración de cada comando: desde su eco hasta el eco del siguiente
+        ends = demuxer.starts[1:] + [time.monotonic()]
+        for cmd, start, end in zip(commands, demuxer.starts, ends):
+            self.record_timing('command', end - start, cmd)
+        
+        for cmd, output in outputs.items():
+            preview = output_text(output, full=False)[:500] or "Sin salida"
+            self.log(f"RESPUESTA ({cmd}): {preview}")
+        return outputs
+    
+    def _disable_paging(self):
+        """Desactiva el paginador una vez por conexión (necesario para enviar en lote)"""
+        if self.paging_disabled is None:
+            command = PAGING_COMMANDS.get(self.device_type)
+            if not command:
+                self.paging_disabled = False
+            else:
+                output = output_text(self.send_command(command))
+                self.paging_disabled = '% ' not in output
+        return self.paging_disabled
+    
+    @staticmethod
+    def _prompt_line(prompt):
+        """Versión del patrón de prompt que coincide al inicio de una línea (prompt + eco)"""
+        pattern = prompt.pattern
+        if pattern.endswith(r'\s*$'):
+            pattern = pattern[:-len(r'\s*$')]
+        return re.compile(pattern)
+    
     def disconnect(self):
         """Cierra conexiones"""
         self.log("Cerrando conexiones...")
-        
-        if self.jump_channel:
-            try:
-                self.jump_channel.send('exit\n')
-                time.sleep(1)
-                self.jump_channel.send('exit\n')  # Salir del dispositivo y de Bridgenet
-                time.sleep(1)
-            except:
-                pass
-            self.jump_channel.close()
-            
-        if self.jump_client:
-            self.jump_client.close()
-            
+        self._close_jump()
         self.log("✓ Conexiones cerradas")
     
+    def _close_jump(self):
+        """Cierra el canal y devuelve el transporte al pool (o lo cierra si no hay pool)"""
+        self._detach_connection().close()
+    
+    def _detach_connection(self):
+        """Separa la conexión actual de la sesión (para cerrarla o guardarla en cache)"""
+        connection = DeviceConnection(**{f: getattr(self, f) for f in DeviceConnection.FIELDS})
+        for field in DeviceConnection.FIELDS:
+            setattr(self, field, None)
+        return connection
+    
+    def _attach_connection(self, connection):
+        for field in DeviceConnection.FIELDS:
+            setattr(self, field, getattr(connection, field))
+    
+    def _probe_connection(self, connection):
+        """Comprueba que una sesión guardada sigue viva y en el prompt"""
+        channel = connection.connection
+        if isinstance(channel, BaseConnection):
+            return channel.is_alive()
+        if channel is None or channel.closed:
+            return False
+        
+        transport = channel.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        
+        try:
+            self._drain_channel(channel)
+            channel.send('\n')
+            _, match = self._read_until(
+                channel, [connection.prompt_pattern or DEVICE_PROMPT_PATTERN], self.probe_timeout
+            )
+            return match is not None
+        except Exception:
+            return False
+    
+    def release_connection(self):
+        """Guarda la sesión en cache si está activa; si no, la cierra"""
+        if self.session_cache and self.session_key and self.connection:
+            self.session_cache.checkin(self.session_key, self._detach_connection())
+            self.log("✓ Sesión conservada para próximos análisis")
+        else:
+            self.disconnect()
+    
+    def _cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+    
     def analyze_device(self, device_info, client_info, checks):
         """Analiza un dispositivo ejecutando los checks"""
+        started = time.monotonic()
+        results, health_key = self._start_analysis(device_info, client_info, checks)
+        if results['status'] != 'analyzing':
+            return results
+        
+        # Conectar
+        with self.timed('connect'):
+            conn = self._connect_with_retries(device_info, client_info)
+        if not conn:
+            return self._connection_failed(results, health_key)
+        
+        # Ejecutar checks o comandos
+        for check_name, commands in checks.items():
+            self.log(f"\nEJECUTANDO: {check_name}")
+            check_result = {'outputs': {}}
+            
+            # Checklist o custom: los comandos de un check se envían juntos
+            if not self._cancelled():
+                check_result['outputs'] = self.send_commands(commands)
+            
+            results['checks'][check_name] = check_result
+        
+        if self._cancelled():
+            self.disconnect()
+        else:
+            self.release_connection()
+        return self._finish_analysis(results, health_key, started)
+    
+    def _start_analysis(self, device_info, client_info, checks):
+        """Prepara la sesión y el resultado. Devuelve (resultado, clave de salud).
+        
+        Si el circuito del dispositivo está abierto el resultado ya sale como 'unreachable'.
+        """
+        self.device_name = device_info['hostname']
+        self.device_type = device_info.get('type')
+        self.client_name = client_info.get('nombre')
+        self.timings = {}
+        self.full_log.clear()
         self.log("="*60)
         self.log(f"ANÁLISIS DE {device_info['hostname']}")
         self.log("="*60)
@@ -280,38 +800,49 @@ class NetworkCore:
             'log_file': str(self.log_file)
         }
         
-        # Conectar
-        conn = self.connect_device(device_info, client_info)
-        if not conn:
-            results['status'] = 'unreachable'
-            self.log("Dispositivo inalcanzable", "ERROR")
-            return results
-        
-        # Ejecutar checks o comandos
-        for check_name, commands in checks.items():
-            self.log(f"\nEJECUTANDO: {check_name}")
-            check_result = {'outputs': {}}
-            
-            # Si es custom, los comandos vienen directamente
-            if check_name == 'custom':
-                for cmd in commands:
-                    output = self.send_command(cmd)
-                    check_result['outputs'][cmd] = output
-            else:
-                # Es un checklist normal
-                for cmd in commands:
-                    output = self.send_command(cmd)
-                    check_result['outputs'][cmd] = output
-                
-            results['checks'][check_name] = check_result
-        
-        results['status'] = 'completed'
-        self.log(f"✓ Análisis completado para {device_info['hostname']}")
+        # Dispositivos caídos hace poco se descartan sin intentar conectar
+        results['timings'] = self.timings
+        health_key = None
+        if self.device_health:
+            health_key = self.device_health.make_key(client_info, device_info)
+            allowed, remaining = self.device_health.allow(health_key)
+            if not allowed:
+                results['status'] = 'unreachable'
+                results['circuit_open'] = True
+                self.log(f"Dispositivo caído en intentos recientes; próximo intento en {remaining:.0f}s", "WARNING")
+                return results, None
+            commands = [cmd for check in checks.values() for cmd in check]
+            self.login_timeout, self.command_timeout = self.device_health.timeouts(
+                health_key, commands, self.login_timeout, self.command_timeout
+            )
+        return results, health_key
+    
+    def _connection_failed(self, results, health_key):
+        results['status'] = 'unreachable'
+        if self.last_error:
+            results['error'] = str(self.last_error)
+        if health_key and self._transient(self.last_error):
+            self.device_health.record_failure(health_key, str(self.last_error))
+        elif health_key:
+            self.device_health.release_probe(health_key)
+        self.log("Dispositivo inalcanzable", "ERROR")
+        return results
+    
+    def _finish_analysis(self, results, health_key, started):
+        """Estado final, tiempos e historial de salud (la conexión ya se cerró o se guardó)"""
+        if self._cancelled():
+            results['status'] = 'cancelled'
+            self.log(f"Análisis cancelado para {results['device']}", "WARNING")
+        else:
+            results['status'] = 'completed'
+            self.log(f"✓ Análisis completado para {results['device']}")
         
-        self.disconnect()
+        self.timings['total'] = round(time.monotonic() - started, 4)
+        if health_key:
+            self.device_health.record_success(health_key, self.timings)
         
-        # Guardar log completo en el resultado
-        results['full_log'] = self.full_log
+        # Guardar el log de este dispositivo en el resultado
+        results['full_log'] = list(self.full_log)
         
         return results
     
@@ -0,0 +1,160 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import textfsm
+from output_spool import output_text, is_spooled, is_unchanged
+
+try:
+    from ntc_templates.parse import _get_template_dir
+    NTC_TEMPLATES_DIR = Path(_get_template_dir())
+except ImportError:
+    NTC_TEMPLATES_DIR = None
+
+# Plantillas propias; se buscan antes que las de ntc-templates
+LOCAL_TEMPLATES_DIR = Path(__file__).parent / 'parsers'
+
+# Plantilla TextFSM de cada comando de los checks, por tipo de dispositivo
+COMMAND_TEMPLATES = {
+    'cisco_ios': {
+        'show version': 'cisco_ios_show_version.textfsm',
+        'show processes cpu': 'cisco_ios_show_processes_cpu.textfsm',
+        'show memory': 'cisco_ios_show_memory.textfsm',
+        'show interface status': 'cisco_ios_show_interfaces_status.textfsm',
+        'show interface counters errors': 'cisco_ios_show_interface_counters_errors.textfsm',
+        'show spanning-tree summary': 'cisco_ios_show_spanning-tree_summary.textfsm',
+        'show vlan brief': 'cisco_ios_show_vlan.textfsm',
+        'show interface trunk': 'cisco_ios_show_interface_trunk.textfsm'
+    },
+    'cisco_asa': {
+        'show version': 'cisco_asa_show_version.textfsm',
+        'show processes cpu': 'cisco_asa_show_processes_cpu.textfsm',
+        'show memory': 'cisco_asa_show_memory.textfsm'
+    }
+}
+
+# Plantillas con varias tablas por puerto: los registros se unen por esta columna
+MERGE_BY = {
+    'cisco_ios_show_interface_counters_errors.textfsm': 'port',
+    'cisco_ios_show_interface_trunk.textfsm': 'port'
+}
+
+
+class OutputParser:
+    """Convierte la salida de los comandos en registros estructurados.
+
+    Las plantillas TextFSM se compilan una vez por hilo y se reutilizan. El
+    parseo corre en un pool propio, fuera de los hilos que hablan con los
+    dispositivos, para no retrasar la recolección.
+    """
+
+    def __init__(self, templates=None, workers=2, max_bytes=5 * 1024 * 1024, template_dirs=None):
+        self.templates = {device_type: dict(commands) for device_type, commands in COMMAND_TEMPLATES.items()}
+        for device_type, commands in (templates or {}).items():
+            self.templates.setdefault(device_type, {}).update(commands)
+
+        self.max_bytes = max_bytes
+        self.template_dirs = [Path(d) for d in template_dirs] if template_dirs else [LOCAL_TEMPLATES_DIR]
+        if NTC_TEMPLATES_DIR:
+            self.template_dirs.append(NTC_TEMPLATES_DIR)
+
+        self.sources = {}  # Texto de cada plantilla leída
+        self.lock = threading.Lock()
+        self.local = threading.local()  # Plantillas compiladas del hilo actual
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='parser')
+
+    @classmethod
+    def from_config(cls, config):
+        """Crea el parser a partir de la sección parsers (None si está deshabilitado)"""
+        settings = config.get('parsers', {})
+        if not settings.get('enabled', True):
+            return None
+        return cls(
+            templates=settings.get('templates'),
+            workers=settings.get('workers', 2),
+            max_bytes=settings.get('max_bytes', 5 * 1024 * 1024),
+            template_dirs=settings.get('template_dirs')
+        )
+
+    def template_for(self, device_type, command):
+        return self.templates.get(device_type, {}).get(command.strip())
+
+    def _source(self, name):
+        with self.lock:
+            if name not in self.sources:
+                for directory in self.template_dirs:
+                    path = directory / name
+                    if path.exists():
+                        self.sources[name] = path.read_text()
+                        break
+                else:
+                    self.sources[name] = None
+            return self.sources[name]
+
+    def _compiled(self, name):
+        """TextFSM ya compilado para este hilo (los objetos TextFSM no son thread-safe)"""
+        cache = getattr(self.local, 'cache', None)
+        if cache is None:
+            cache = self.local.cache = {}
+
+        fsm = cache.get(name)
+        if fsm is None:
+            source = self._source(name)
+            if source is None:
+                return None
+            fsm = cache[name] = textfsm.TextFSM(io.StringIO(source))
+        else:
+            fsm.Reset()
+        return fsm
+
+    def parse(self, device_type, command, output):
+        """Registros de la salida de un comando, o None si no hay plantilla"""
+        name = self.template_for(device_type, command)
+        if not name:
+            return None
+
+        if is_unchanged(output):
+            return None
+        if is_spooled(output) and output.get('size', 0) > self.max_bytes:
+            return None
+        text = output_text(output)
+        if not text:
+            return []
+
+        fsm = self._compiled(name)
+        if fsm is None:
+            return None
+
+        header = [h.lower() for h in fsm.header]
+        records = [dict(zip(header, row)) for row in fsm.ParseText(text)]
+
+        key = MERGE_BY.get(name)
+        if key:
+            records = self._merge(records, key)
+        return records
+
+    @staticmethod
+    def _merge(records, key):
+        merged = {}
+        for record in records:
+            current = merged.setdefault(record[key], {})
+            for field, value in record.items():
+                if value or field not in current:
+                    current[field] = value
+        return list(merged.values())
+
+    def parse_result(self, device_type, result):
+        """Agrega `parsed` a cada check del resultado de un dispositivo"""
+        for check_result in result.get('checks', {}).values():
+            parsed = {}
+            for command, output in check_result.get('outputs', {}).items():
+                try:
+                    records = self.parse(device_type, command, output)
+                except Exception as e:
+                    check_result.setdefault('parse_errors', {})[command] = str(e)
+                    continue
+                if records is not None:
+                    parsed[command] = records
+            if parsed:
+                check_result['parsed'] = parsed
+        return result
@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import re
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Marcas del paginador que se eliminan de la salida
+MORE_PATTERN_CLEAN = re.compile(r'(?: ?--More-- ?|<--- More --->)(?:[\x08\r]+ *[\x08\r]+)?')
+
+
+class OutputCapture:
+    """Captura incremental de la salida de un comando.
+
+    Se mantiene en memoria mientras es pequeña; al superar el umbral se
+    vuelca a un archivo de spool (opcionalmente comprimido) y el reporte
+    sólo guarda una referencia y una vista previa.
+    """
+
+    def __init__(self, spool, device, command):
+        self.spool = spool
+        self.device = device
+        self.command = command
+        self.parts = []
+        self.size = 0
+        self.preview = []
+        self.preview_size = 0
+        self.digest = hashlib.sha256()
+        self.path = None
+        self.handle = None
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.size += len(data)
+        self.digest.update(data)
+
+        if self.preview_size < self.spool.preview_chars:
+            self.preview.append(text)
+            self.preview_size += len(text)
+
+        if self.handle:
+            self.handle.write(data)
+            return
+
+        self.parts.append(data)
+        if self.size > self.spool.threshold:
+            self._spill()
+
+    def _spill(self):
+        """Pasa lo acumulado en memoria al archivo de spool"""
+        self.path = self.spool.new_path(self.device, self.command)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.handle = gzip.open(self.path, 'wb') if self.spool.compress else open(self.path, 'wb')
+        for part in self.parts:
+            self.handle.write(part)
+        self.parts = []
+
+    def preview_text(self):
+        return ''.join(self.preview)[:self.spool.preview_chars]
+
+    def finish(self):
+        """Devuelve el texto (salida pequeña) o la referencia al spool"""
+        if not self.handle:
+            return b''.join(self.parts).decode('utf-8', errors='ignore')
+
+        self.handle.close()
+        return {
+            'spool': self.path.as_posix(),
+            'size': self.size,
+            'sha256': self.digest.hexdigest(),
+            'compressed': self.spool.compress,
+            'preview': self.preview_text()
+        }
+
+
+class OutputCleaner:
+    """Limpia la salida línea a línea: eco del comando, paginador y prompt final"""
+
+    def __init__(self, command, capture):
+        self.command = command
+        self.capture = capture
+        self.pending = ''
+        self.first_line = True
+        self.written = False
+
+    def feed(self, text):
+        self.pending += text
+        *lines, self.pending = self.pending.split('\n')
+        for line in lines:
+            self._emit(line)
+
+    def _emit(self, line):
+        line = MORE_PATTERN_CLEAN.sub('', line)
+
+        # Remover el comando echo
+        if self.first_line:
+            self.first_line = False
+            if self.command in line:
+                return
+
+        self.capture.write(('\n' if self.written else '') + line)
+        self.written = True
+
+    def finish(self):
+        # La última línea incompleta es el prompt
+        last = MORE_PATTERN_CLEAN.sub('', self.pending)
+        if last and not ('>' in last or '#' in last):
+            self._emit(last)
+        return self.capture.finish()
+
+
+class CommandDemuxer:
+    """Separa la salida de varios comandos enviados de una sola vez.
+
+    La frontera entre comandos es la línea de prompt con el eco del siguiente
+    comando; cada tramo pasa por su propio OutputCleaner.
+    """
+
+    def __init__(self, commands, open_cleaner, prompt_line):
+        self.commands = commands
+        self.open_cleaner = open_cleaner
+        self.prompt_line = prompt_line
+        self.index = 0
+        self.cleaners = [open_cleaner(commands[0])]
+        self.starts = [time.monotonic()]  # Inicio de cada comando (al ver su eco)
+        self.pending = ''
+
+    @property
+    def done(self):
+        """Ya se recibió el eco del último comando"""
+        return self.index == len(self.commands) - 1
+
+    def feed(self, text):
+        self.pending += text
+        *lines, self.pending = self.pending.split('\n')
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line):
+        if not self.done:
+            following = self.commands[self.index + 1]
+            if following in line and self.prompt_line.match(line):
+                self.index += 1
+                self.cleaners.append(self.open_cleaner(following))
+                self.starts.append(time.monotonic())
+        self.cleaners[-1].feed(line + '\n')
+
+    def finish(self):
+        """Salida de cada comando (vacía para los que no llegaron a ejecutarse)"""
+        self.cleaners[-1].feed(self.pending)
+        outputs = [cleaner.finish() for cleaner in self.cleaners]
+        outputs += [''] * (len(self.commands) - len(outputs))
+        return dict(zip(self.commands, outputs))
+
+
+class OutputSpool:
+    """Directorio de salidas largas de comandos"""
+
+    def __init__(self, root='data/spool', threshold=65536, compress=True, preview_chars=2000):
+        self.root = Path(root)
+        self.threshold = threshold
+        self.compress = compress
+        self.preview_chars = preview_chars
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('capture', {})
+        return cls(
+            root=settings.get('spool_dir', 'data/spool'),
+            threshold=settings.get('threshold', 65536),
+            compress=settings.get('compress', True),
+            preview_chars=settings.get('preview_chars', 2000)
+        )
+
+    def open(self, device, command):
+        return OutputCapture(self, device, command)
+
+    def new_path(self, device, command):
+        slug = re.sub(r'[^\w\-]+', '_', command).strip('_')[:40]
+        name = f"{device or 'device'}_{datetime.now().strftime('%H%M%S')}_{uuid.uuid4().hex[:8]}_{slug}.txt"
+        if self.compress:
+            name += '.gz'
+        return self.root / datetime.now().strftime('%Y%m%d') / name
+
+
+def is_spooled(output):
+    return isinstance(output, dict) and 'spool' in output
+
+
+def is_unchanged(output):
+    """Salida igual a la de un reporte anterior, guardada sólo como referencia"""
+    return isinstance(output, dict) and output.get('unchanged', False)
+
+
+def read_spooled(ref):
+    """Lee el texto completo de una salida guardada en spool"""
+    opener = gzip.open if ref.get('compressed') else open
+    with opener(ref['spool'], 'rb') as f:
+        return f.read().decode('utf-8', errors='ignore')
+
+
+def output_text(output, full=True):
+    """Texto de una salida del reporte, sea cadena o referencia a spool"""
+    if is_unchanged(output):
+        return f"(sin cambios desde el reporte {output['base_report']})"
+    if not is_spooled(output):
+        return output or ''
+    if not full:
+        return output.get('preview', '')
+    return read_spooled(output)
@@ -1,88 +1,588 @@
+import gzip
+import hashlib
 import json
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
+from xml.sax.saxutils import escape
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Preformatted
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from output_spool import output_text, is_spooled, is_unchanged
+import metrics
+
+# Extensiones de reporte: compacto (gzip, salidas en chunks) y JSON antiguo
+REPORT_SUFFIXES = ('.json.gz', '.json')
+
+# Columnas por las que se puede ordenar el listado
+SORT_COLUMNS = {
+    'timestamp': 'timestamp',
+    'client': 'client_name',
+    'devices': 'devices',
+    'status': 'status'
+}
+
+# PDF: caracteres por salida en el resumen y líneas por bloque de salida completa
+PDF_PREVIEW_CHARS = 500
+PDF_BLOCK_LINES = 80
+PDF_LINE_LENGTH = 100
+
+def report_id_of(path):
+    """Id del reporte a partir del nombre de archivo"""
+    for suffix in REPORT_SUFFIXES:
+        if path.name.endswith(suffix):
+            return path.name[:-len(suffix)]
+    return path.stem
+
+class FlowableStream(list):
+    """Lista de flowables que se llena sección a sección mientras ReportLab la consume.
+    
+    `doc.build` sólo mira el largo y el primer elemento, así que basta con
+    traer la siguiente sección cuando la actual se vació: en memoria queda una
+    sección a la vez en lugar de todo el documento.
+    """
+    
+    def __init__(self, sections):
+        super().__init__()
+        self.sections = iter(sections)
+    
+    def __len__(self):
+        while not super().__len__():
+            try:
+                self.extend(next(self.sections))
+            except StopIteration:
+                break
+        return super().__len__()
 
 class ReportGenerator:
-    def __init__(self):
-        self.reports_dir = Path('data/reports')
+    def __init__(self, reports_dir='data/reports', pdf_background=True, compact=True, chunk_min_size=256,
+                 prune_interval=86400, log=None):
+        self.reports_dir = Path(reports_dir)
+        self.log = log  # log(mensaje, nivel) del log de sesión (opcional)
         self.reports_dir.mkdir(parents=True, exist_ok=True)
         
+        # Formato compacto: cabecera gzip y salidas en chunks por contenido (compartidos entre reportes)
+        self.compact = compact
+        self.chunk_min_size = chunk_min_size
+        self.chunks_dir = self.reports_dir / 'chunks'
+        self.prune_interval = prune_interval  # Cada cuánto se borran los chunks sin reportes (0: nunca)
+        
+        # Índice SQLite con los datos de cabecera de cada reporte
+        self.index_path = self.reports_dir / 'index.db'
+        self.lock = threading.Lock()
+        self._init_index()
+        self.sync_index()
+        
+        # Cache de PDFs: data/reports/pdf/{id}_{hash}.pdf
+        self.pdf_dir = self.reports_dir / 'pdf'
+        self.pdf_dir.mkdir(parents=True, exist_ok=True)
+        self.pdf_lock = threading.Lock()
+        self.rendering = {}  # report_id -> Event del render en curso
+        self.pdf_builder = None  # pdf_builder(report_id, ruta, full): render fuera de este proceso (opcional)
+        self.pdf_queue = None
+        if pdf_background:
+            self.pdf_queue = queue.Queue()
+            threading.Thread(target=self._pdf_worker, daemon=True, name='pdf-renderer').start()
+        if compact and prune_interval:
+            threading.Thread(target=self._prune_loop, daemon=True, name='chunk-pruner').start()
+    
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        settings = config.get('reports', {})
+        return cls(
+            reports_dir=settings.get('dir', 'data/reports'),
+            pdf_background=settings.get('pdf_background', True),
+            compact=settings.get('compact', True),
+            chunk_min_size=settings.get('chunk_min_size', 256),
+            prune_interval=settings.get('chunk_prune_interval', 86400),
+            **kwargs
+        )
+    
+    @contextmanager
+    def _connect(self):
+        """Conexión al índice (confirma la transacción y se cierra al salir)"""
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def _init_index(self):
+        with self.lock, self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS reports (
+                    id TEXT PRIMARY KEY,
+                    client_id TEXT,
+                    client_name TEXT,
+                    timestamp TEXT,
+                    devices INTEGER,
+                    completed INTEGER,
+                    status TEXT,
+                    mtime REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports (timestamp)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_client ON reports (client_id, timestamp)')
+    
+    @staticmethod
+    def summarize(report_id, data, mtime):
+        """Datos del reporte que se guardan en el índice"""
+        devices = data.get('devices', [])
+        completed = sum(1 for d in devices if d.get('status') == 'completed')
+        
+        if not devices:
+            status = 'empty'
+        elif completed == len(devices):
+            status = 'completed'
+        elif completed:
+            status = 'partial'
+        else:
+            status = 'failed'
+        
+        return {
+            'id': report_id,
+            'client_id': data.get('client_id', report_id.rsplit('_', 1)[0]),
+            'client_name': data.get('client_name', 'Unknown'),
+            'timestamp': data.get('timestamp', ''),
+            'devices': len(devices),
+            'completed': completed,
+            'status': status,
+            'mtime': mtime
+        }
+    
+    def _index_report(self, summary):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO reports
+                   (id, client_id, client_name, timestamp, devices, completed, status, mtime)
+                   VALUES (:id, :client_id, :client_name, :timestamp, :devices, :completed, :status, :mtime)''',
+                summary
+            )
+    
+    def sync_index(self):
+        """Indexa los reportes que aún no están en el índice y quita los borrados.
+        
+        Sólo se abren los archivos nuevos o modificados; el resto se compara por mtime.
+        """
+        with self._connect() as conn:
+            indexed = {row['id']: row['mtime'] for row in conn.execute('SELECT id, mtime FROM reports')}
+        
+        on_disk = {report_id_of(path): path for path in self._report_files()}
+        
+        for report_id, report_file in on_disk.items():
+            mtime = report_file.stat().st_mtime
+            if indexed.get(report_id) == mtime:
+                continue
+            try:
+                data = self._load_file(report_file)
+            except:
+                continue
+            self._index_report(self.summarize(report_id, data, mtime))
+        
+        removed = [report_id for report_id in indexed if report_id not in on_disk]
+        if removed:
+            with self.lock, self._connect() as conn:
+                conn.executemany('DELETE FROM reports WHERE id = ?', [(r,) for r in removed])
+    
+    def _report_files(self):
+        for suffix in REPORT_SUFFIXES:
+            yield from self.reports_dir.glob(f'*{suffix}')
+    
+    def report_path(self, report_id):
+        """Archivo del reporte (compacto o JSON antiguo), None si no existe"""
+        for suffix in REPORT_SUFFIXES:
+            path = self.reports_dir / f"{report_id}{suffix}"
+            if path.exists():
+                return path
+        return None
+    
+    @staticmethod
+    def _load_file(path):
+        if path.name.endswith('.gz'):
+            with gzip.open(path, 'rb') as f:
+                return json.loads(f.read())
+        with open(path) as f:
+            return json.load(f)
+    
     def save_report(self, results):
-        """Guarda un reporte en JSON"""
+        """Guarda un reporte y lo registra en el índice"""
+        with metrics.registry.timer('phase', phase='report_write', client=results.get('client_name')):
+            report_id = self._write_report(results)
+        metrics.registry.inc('reports', client=results.get('client_name'))
+        
+        # Dejar el PDF listo para la primera descarga
+        if self.pdf_queue:
+            self.pdf_queue.put(report_id)
+        return report_id
+    
+    def _write_report(self, results):
+        if self.compact:
+            data = json.dumps(self.compact_report(results), separators=(',', ':')).encode('utf-8')
+            data = gzip.compress(data)
+            extension = '.json.gz'
+        else:
+            data = json.dumps(results, indent=2).encode('utf-8')
+            extension = '.json'
+        
         timestamp = int(time.time())
         report_id = f"{results['client_id']}_{timestamp}"
-        report_path = self.reports_dir / f"{report_id}.json"
+        report_path = self.reports_dir / f"{report_id}{extension}"
         
-        with open(report_path, 'w') as f:
-            json.dump(results, f, indent=2)
+        # Escritura completa en un temporal y enlace con el nombre final: un corte no deja un
+        # reporte truncado y el enlace falla si otro reporte del mismo segundo ya tomó el nombre
+        tmp_path = self.reports_dir / f"{report_id}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            suffix = 1
+            while True:
+                try:
+                    os.link(tmp_path, report_path)
+                    break
+                except FileExistsError:
+                    report_id = f"{results['client_id']}_{timestamp}_{suffix}"
+                    report_path = self.reports_dir / f"{report_id}{extension}"
+                    suffix += 1
+        finally:
+            tmp_path.unlink(missing_ok=True)
         
+        self._index_report(self.summarize(report_id, results, report_path.stat().st_mtime))
         return report_id
     
-    def get_reports_list(self):
-        """Obtiene lista de todos los reportes"""
-        reports = []
-        for report_file in self.reports_dir.glob('*.json'):
+    def compact_report(self, results):
+        """Cabecera del reporte: salidas y logs largos pasan a chunks por contenido"""
+        header = dict(results)
+        header['devices'] = []
+        
+        for device in results.get('devices', []):
+            device = dict(device)
+            checks = {}
+            for check_name, check_result in device.get('checks', {}).items():
+                check_result = dict(check_result)
+                check_result['outputs'] = {
+                    cmd: self._store_output(output) for cmd, output in check_result.get('outputs', {}).items()
+                }
+                checks[check_name] = check_result
+            device['checks'] = checks
+            
+            if isinstance(device.get('full_log'), list):
+                text = json.dumps(device['full_log'], ensure_ascii=False)
+                device['full_log'] = dict(self._store_output(text, force=True), lines=len(device['full_log']))
+            
+            header['devices'].append(device)
+        
+        return header
+    
+    def _store_output(self, output, force=False):
+        if is_spooled(output) and output.get('sha256'):
+            digest = self.adopt_spool(output)
+            return {'chunk': digest, 'size': output['size']} if digest else output
+        if not isinstance(output, str):
+            return output  # Referencia incremental o ya compactada
+        data = output.encode('utf-8')
+        if len(data) < self.chunk_min_size and not force:
+            return output
+        return {'chunk': self.write_chunk(data), 'size': len(data)}
+    
+    def _chunk_path(self, digest):
+        return self.chunks_dir / digest[:2] / f"{digest}.gz"
+    
+    def write_chunk(self, data):
+        """Guarda un bloque de texto por su hash; si ya existe se reutiliza"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(data))
+            os.replace(tmp_path, path)
+        return digest
+    
+    def adopt_spool(self, output):
+        """Pasa el archivo de spool de una salida al almacén de chunks (se mueve, no se copia).
+
+        La referencia se actualiza en el lugar para que quien aún tenga el
+        resultado en memoria (p. ej. los trabajos) lea el texto desde el chunk.
+        Devuelve el hash, o None si el spool ya no existe.
+        """
+        digest = output['sha256']
+        path = self._chunk_path(digest)
+        source = Path(output['spool'])
+        if source != path:
+            if path.exists():
+                source.unlink(missing_ok=True)
+            elif source.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+                if output.get('compressed'):
+                    shutil.move(source, tmp_path)  # Otro disco: copia; si no, sólo renombra
+                else:
+                    with open(source, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    source.unlink()
+                os.replace(tmp_path, path)
+        if not path.exists():
+            return None
+        os.utime(path)  # Reciente para prune_chunks aunque el spool sea viejo
+        output.update(spool=path.as_posix(), compressed=True)
+        return digest
+    
+    def read_chunk(self, digest):
+        try:
+            with gzip.open(self._chunk_path(digest), 'rb') as f:
+                return f.read().decode('utf-8', errors='ignore')
+        except FileNotFoundError:
+            return ''
+    
+    def read_output(self, output, full=True):
+        """Texto de una salida del reporte: cadena, chunk, spool o referencia incremental"""
+        if isinstance(output, dict) and 'chunk' in output:
+            return self.read_chunk(output['chunk'])
+        return output_text(output, full)
+    
+    def prune_chunks(self, min_age=3600):
+        """Borra los chunks que ya no usa ningún reporte (los recientes se respetan)"""
+        used = set()
+        for path in self._report_files():
             try:
-                with open(report_file) as f:
-                    data = json.load(f)
-                    reports.append({
-                        'id': report_file.stem,
-                        'client': data.get('client_name'),
-                        'timestamp': data.get('timestamp'),
-                        'devices': len(data.get('devices', []))
-                    })
+                report = self._load_file(path)
             except:
                 continue
+            for device in report.get('devices', []):
+                refs = [device.get('full_log')]
+                for check_result in device.get('checks', {}).values():
+                    refs.extend(check_result.get('outputs', {}).values())
+                used.update(ref['chunk'] for ref in refs if isinstance(ref, dict) and 'chunk' in ref)
         
-        return sorted(reports, key=lambda x: x['timestamp'], reverse=True)
+        removed = 0
+        now = time.time()
+        for path in self.chunks_dir.glob('*/*.gz'):
+            if path.name[:-len('.gz')] not in used and now - path.stat().st_mtime > min_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
     
-    def get_report(self, report_id):
-        """Obtiene un reporte específico"""
-        report_path = self.reports_dir / f"{report_id}.json"
-        if report_path.exists():
-            with open(report_path) as f:
-                return json.load(f)
+    def _prune_loop(self):
+        while True:
+            time.sleep(self.prune_interval)
+            try:
+                removed = self.prune_chunks()
+            except Exception as e:
+                if self.log:
+                    self.log(f"ERROR borrando chunks sin uso: {str(e)}", "ERROR")
+                continue
+            if removed and self.log:
+                self.log(f"Chunks sin uso borrados: {removed}")
+    
+    def get_reports_list(self, page=1, per_page=50, client=None, status=None,
+                         date_from=None, date_to=None, sort='timestamp', order='desc'):
+        """Lista paginada de reportes desde el índice, sin abrir los archivos.
+        
+        Devuelve (reportes, total)
+        """
+        where = []
+        params = []
+        if client:
+            where.append('client_id = ?')
+            params.append(client)
+        if status:
+            where.append('status = ?')
+            params.append(status)
+        if date_from:
+            where.append('substr(timestamp, 1, 10) >= ?')
+            params.append(date_from)
+        if date_to:
+            where.append('substr(timestamp, 1, 10) <= ?')
+            params.append(date_to)
+        
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ''
+        column = SORT_COLUMNS.get(sort, 'timestamp')
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        page = max(1, page)
+        per_page = max(1, min(per_page, 500))
+        
+        with self._connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM reports {where_sql}', params).fetchone()[0]
+            rows = conn.execute(
+                f'''SELECT id, client_id, client_name, timestamp, devices, completed, status
+                    FROM reports {where_sql}
+                    ORDER BY {column} {direction}, id {direction}
+                    LIMIT ? OFFSET ?''',
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+        
+        reports = [{
+            'id': row['id'],
+            'client_id': row['client_id'],
+            'client': row['client_name'],
+            'timestamp': row['timestamp'],
+            'devices': row['devices'],
+            'completed': row['completed'],
+            'status': row['status']
+        } for row in rows]
+        
+        return reports, total
+    
+    def list_clients(self):
+        """Clientes con reportes (para los filtros)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT client_id, MAX(client_name) AS client_name FROM reports GROUP BY client_id ORDER BY client_name'
+            ).fetchall()
+        return [{'id': row['client_id'], 'name': row['client_name']} for row in rows]
+    
+    def load_header(self, report_id):
+        """Reporte sin resolver: las salidas en chunks quedan como referencias"""
+        report_path = self.report_path(report_id)
+        if report_path is None:
+            return None
+        return self._load_file(report_path)
+    
+    def get_output(self, report_id, device_name, check_name, command):
+        """Salida completa de un comando, leída bajo demanda"""
+        report = self.load_header(report_id)
+        for device in (report or {}).get('devices', []):
+            if device.get('device') == device_name:
+                output = device.get('checks', {}).get(check_name, {}).get('outputs', {}).get(command)
+                if is_unchanged(output):
+                    # Sin cambios: el texto está en el reporte referenciado
+                    return self.get_output(output['base_report'], device_name, check_name, command)
+                if output is not None:
+                    return self.read_output(output)
         return None
     
-    def generate_pdf(self, report_id):
-        """Genera PDF de un reporte"""
-        report = self.get_report(report_id)
-        if not report:
+    def get_report(self, report_id):
+        """Obtiene un reporte específico con todas las salidas y logs resueltos"""
+        report = self.load_header(report_id)
+        if report is None:
             return None
         
-        pdf_path = self.reports_dir / f"{report_id}.pdf"
+        for device in report.get('devices', []):
+            for check_result in device.get('checks', {}).values():
+                outputs = check_result.get('outputs', {})
+                for cmd, output in outputs.items():
+                    if isinstance(output, dict) and 'chunk' in output:
+                        outputs[cmd] = self.read_chunk(output['chunk'])
+            if isinstance(device.get('full_log'), dict):
+                device['full_log'] = json.loads(self.read_chunk(device['full_log']['chunk']) or '[]')
+        return report
+    
+    def content_hash(self, report_id):
+        """Hash del archivo del reporte (None si no existe)"""
+        report_path = self.report_path(report_id)
+        try:
+            with open(report_path, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()[:16]
+        except (FileNotFoundError, TypeError):
+            return None
+    
+    def generate_pdf(self, report_id, full=False):
+        """Devuelve la ruta del PDF de un reporte, generándolo si no está en cache.
+        
+        El PDF se guarda por id y hash del contenido: si el reporte cambia, el
+        PDF anterior deja de servirse y se borra al generar el nuevo. Con `full`
+        se genera (y guarda aparte) la versión con las salidas completas.
+        """
+        variant = (report_id, full)
+        while True:
+            digest = self.content_hash(report_id)
+            if digest is None:
+                return None
+            
+            pdf_path = self.pdf_dir / f"{report_id}_{digest}{'.full' if full else ''}.pdf"
+            if pdf_path.exists():
+                return str(pdf_path)
+            
+            # Si otro hilo (p. ej. el de segundo plano) ya lo está generando, esperarlo
+            with self.pdf_lock:
+                pending = self.rendering.get(variant)
+                if pending is None:
+                    pending = self.rendering[variant] = threading.Event()
+                    break
+            pending.wait()
         
-        # Crear PDF
-        doc = SimpleDocTemplate(str(pdf_path), pagesize=letter)
-        styles = getSampleStyleSheet()
+        try:
+            report = self.load_header(report_id)
+            if report is None:
+                return None
+            
+            tmp_path = pdf_path.with_suffix('.tmp')
+            with metrics.registry.timer('phase', phase='pdf', client=report.get('client_name')):
+                if self.pdf_builder:
+                    self.pdf_builder(report_id, tmp_path, full)
+                else:
+                    self.build_pdf(report, str(tmp_path), full=full)
+            os.replace(tmp_path, pdf_path)
+            
+            # Invalidar versiones anteriores del mismo reporte (ambas variantes)
+            for old in self.pdf_dir.glob(f"{report_id}_*.pdf"):
+                old_id, _, old_digest = old.name[:-len('.pdf')].removesuffix('.full').rpartition('_')
+                if old_id == report_id and old_digest != digest:
+                    old.unlink(missing_ok=True)
+            
+            return str(pdf_path)
+        finally:
+            with self.pdf_lock:
+                self.rendering.pop(variant).set()
+    
+    def _pdf_worker(self):
+        while True:
+            report_id = self.pdf_queue.get()
+            try:
+                self.generate_pdf(report_id)
+            except Exception as e:
+                if self.log:
+                    self.log(f"ERROR generando PDF de {report_id}: {str(e)}", "ERROR")
+    
+    def build_pdf(self, report, output, full=False):
+        """Construye el PDF de un reporte en `output` (ruta o archivo).
+        
+        Las secciones se arman a medida que se maquetan (ver FlowableStream).
+        Con `full` las salidas van completas, leídas de a una y partidas en
+        bloques; si no, se recortan a PDF_PREVIEW_CHARS caracteres.
+        """
+        doc = SimpleDocTemplate(output, pagesize=letter, pageCompression=1)
+        doc.build(FlowableStream(self._pdf_sections(report, getSampleStyleSheet(), full)))
+    
+    def _pdf_sections(self, report, styles, full):
+        """Secciones del PDF (listas de flowables), en orden.
+
+        Los textos de la configuración y de los equipos se escapan: Paragraph los interpreta como marcado.
+        """
         story = []
         
         # Título
-        title = Paragraph(f"Reporte de Análisis - {report['client_name']}", styles['Title'])
+        title = Paragraph(f"Reporte de Análisis - {escape(report['client_name'])}", styles['Title'])
         story.append(title)
         story.append(Spacer(1, 12))
         
         # Información general
-        info = Paragraph(f"Fecha: {report['timestamp']}<br/>Dispositivos: {len(report['devices'])}", 
+        info = Paragraph(f"Fecha: {escape(report['timestamp'])}<br/>Dispositivos: {len(report.get('devices', []))}",
                         styles['Normal'])
         story.append(info)
         story.append(Spacer(1, 12))
         
         # Tabla de dispositivos
         data = [['Dispositivo', 'IP', 'Estado']]
-        for device in report['devices']:
+        for device in report.get('devices', []):
             data.append([
-                device.get('device'),
-                device.get('ip'),
-                device.get('status')
+                device.get('device', 'N/A'),
+                device.get('ip', 'N/A'),
+                device.get('status', 'N/A')
             ])
         
-        table = Table(data)
+        table = Table(data, repeatRows=1)
         table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
@@ -95,8 +595,75 @@ class ReportGenerator:
         ]))
         
         story.append(table)
+        story.append(Spacer(1, 24))
+        yield story
+        
+        # Desglose de tiempos por dispositivo
+        timed = [d for d in report.get('devices', []) if d.get('timings')]
+        if timed:
+            story = [Paragraph("Tiempos (s)", styles['Heading2'])]
+            data = [['Dispositivo', 'Conexión', 'Comandos', 'Parseo', 'Total']]
+            for device in timed:
+                timings = device['timings']
+                data.append([
+                    device.get('device', 'N/A'),
+                    f"{timings.get('connect', 0):.2f}",
+                    f"{sum(timings.get('commands', {}).values()):.2f}",
+                    f"{timings.get('parse', 0):.2f}",
+                    f"{timings.get('total', 0):.2f}"
+                ])
+            table = Table(data, repeatRows=1)
+            table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black)
+            ]))
+            story.append(table)
+            story.append(Spacer(1, 24))
+            yield story
         
-        # Generar PDF
-        doc.build(story)
+        # Cambios respecto al reporte anterior (modo incremental)
+        incremental = report.get('incremental')
+        if incremental:
+            story = [Paragraph("Cambios", styles['Heading2'])]
+            story.append(Paragraph(f"Comparado con el reporte {escape(incremental['base_report'])} "
+                                   f"({escape(incremental['base_timestamp'])})", styles['Normal']))
+            if not incremental['changes']:
+                story.append(Paragraph("Sin cambios", styles['Normal']))
+            for change in incremental['changes']:
+                story.append(Paragraph(f"<b>{escape(change['device'])}</b> - {escape(change['command'])} "
+                                       f"({escape(change['change'])})", styles['Normal']))
+                if change.get('diff'):
+                    story.append(Preformatted(change['diff'][:2000], styles['Code'], maxLineLength=PDF_LINE_LENGTH))
+            story.append(Spacer(1, 24))
+            yield story
+        
+        # Outputs de comandos: una sección por comando
+        for device in report.get('devices', []):
+            yield [Paragraph(f"<b>{escape(device.get('device', 'N/A'))}</b>", styles['Heading2'])]
+            
+            for check_name, check_data in device.get('checks', {}).items():
+                yield [Paragraph(f"Check: {escape(check_name)}", styles['Heading3'])]
+                
+                for cmd, output in check_data.get('outputs', {}).items():
+                    yield [Paragraph(f"<b>Comando:</b> {escape(cmd)}", styles['Normal'])]
+                    yield from self._pdf_output(output, styles['Code'], full)
+                    yield [Spacer(1, 6)]
+    
+    def _pdf_output(self, output, style, full):
+        """Bloques de la salida de un comando"""
+        if not full:
+            # Las salidas en chunk o spool traen su vista previa
+            text = self.read_output(output, full=False)
+            size = output.get('size', len(text)) if isinstance(output, dict) else len(text)
+            text = text[:PDF_PREVIEW_CHARS] if text else "Sin salida"
+            if size > PDF_PREVIEW_CHARS:
+                text += "... (output truncado)"
+            yield [Preformatted(text, style, maxLineLength=PDF_LINE_LENGTH)]
+            return
         
-        return str(pdf_path)
\ No newline at end of file
+        lines = self.read_output(output, full=True).splitlines() or ["Sin salida"]
+        for start in range(0, len(lines), PDF_BLOCK_LINES):
+            block = '\n'.join(lines[start:start + PDF_BLOCK_LINES])
+            yield [Preformatted(block, style, maxLineLength=PDF_LINE_LENGTH)]
@@ -0,0 +1,263 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+# Atajos de cron aceptados en las programaciones
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *'
+}
+
+# (mínimo, máximo) de cada campo: minuto, hora, día del mes, mes, día de la semana (0 y 7 = domingo)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(text, low, high):
+    """Valores de un campo de cron: *, */n, a-b, a-b/n y listas separadas por comas"""
+    values = set()
+    for part in text.split(','):
+        part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Campo de cron fuera de rango: {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Expresión cron de 5 campos (minuto hora día mes día_semana), en hora local"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expresión cron inválida: {expression}")
+
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        # Como en cron: si se restringen día del mes y día de la semana, basta con uno de los dos
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, moment):
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and moment.month in self.months and self._day_matches(moment))
+
+    def next_after(self, moment):
+        """Primer minuto posterior a `moment` que cumple la expresión"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"La expresión cron nunca se cumple: {self.expression}")
+
+
+class Schedule:
+    """Barrido programado: checks a ejecutar sobre un conjunto de clientes"""
+
+    def __init__(self, name, cron, clients='*', checks=None, priority=10, jitter=0, incremental=None,
+                 enabled=True):
+        self.name = name
+        self.cron = CronExpression(cron)
+        self.clients = clients  # '*' o lista de ids de cliente
+        self.checks = checks or ['health']
+        self.priority = priority
+        self.jitter = jitter  # Segundos máximos de demora aleatoria de cada cliente
+        self.incremental = incremental  # None: valor por defecto de la sección incremental
+        self.enabled = enabled
+        self.next_run = None
+        self.running = False
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['name'],
+            data['cron'],
+            clients=data.get('clients', '*'),
+            checks=data.get('checks'),
+            priority=data.get('priority', 10),
+            jitter=data.get('jitter', 0),
+            incremental=data.get('incremental'),
+            enabled=data.get('enabled', True)
+        )
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'cron': self.cron.expression,
+            'clients': self.clients,
+            'checks': self.checks,
+            'priority': self.priority,
+            'jitter': self.jitter,
+            'enabled': self.enabled,
+            'running': self.running,
+            'next_run': self.next_run.isoformat() if self.next_run else None
+        }
+
+
+class Scheduler:
+    """Lanza barridos de toda la flota según programaciones tipo cron.
+
+    Cada barrido encola un trabajo por cliente en el JobManager, con la
+    prioridad de la programación y una demora aleatoria (jitter) para que los
+    clientes no arranquen todos a la vez. La concurrencia real la limitan el
+    JobManager (trabajos simultáneos) y el motor (cupo global y por jump host).
+    Si la cola de trabajos está llena se reintenta hasta `max_wait` segundos.
+    """
+
+    def __init__(self, jobs, config, schedules=None, incremental_for=None, retry_interval=30, max_wait=3600,
+                 history=50, log=None):
+        self.jobs = jobs
+        self.config = config
+        self.schedules = {s.name: s for s in (schedules or [])}
+        self.incremental_for = incremental_for  # incremental_for(client_id, datos) -> IncrementalAnalysis
+        self.retry_interval = retry_interval
+        self.max_wait = max_wait
+        self.history = deque(maxlen=history)  # Barridos recientes
+        self.log = log
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, jobs, config, **kwargs):
+        settings = config.get('scheduler', {})
+        return cls(
+            jobs, config,
+            schedules=[Schedule.from_dict(s) for s in settings.get('schedules', [])],
+            retry_interval=settings.get('retry_interval', 30),
+            max_wait=settings.get('max_wait', 3600),
+            **kwargs
+        )
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='scheduler')
+            self._thread.start()
+        return self
+
+    def status(self):
+        with self.lock:
+            return {
+                'schedules': [s.to_dict() for s in self.schedules.values()],
+                'history': list(self.history)
+            }
+
+    def run_now(self, name):
+        """Lanza un barrido fuera de horario. Devuelve False si no existe o ya está en curso"""
+        schedule = self.schedules.get(name)
+        if not schedule or not self._begin(schedule):
+            return False
+        threading.Thread(target=self._sweep, args=(schedule,), daemon=True, name=f'sweep-{name}').start()
+        return True
+
+    def _loop(self):
+        now = datetime.now()
+        for schedule in self.schedules.values():
+            schedule.next_run = schedule.cron.next_after(now)
+
+        while True:
+            now = datetime.now()
+            for schedule in self.schedules.values():
+                if not schedule.enabled or schedule.next_run > now:
+                    continue
+                schedule.next_run = schedule.cron.next_after(now)
+                if self._begin(schedule):
+                    threading.Thread(target=self._sweep, args=(schedule,), daemon=True,
+                                     name=f'sweep-{schedule.name}').start()
+                else:
+                    self._log(f"Barrido '{schedule.name}' omitido: el anterior sigue en curso", "WARNING")
+
+            upcoming = [s.next_run for s in self.schedules.values() if s.enabled]
+            delay = min(upcoming) - datetime.now() if upcoming else timedelta(seconds=60)
+            self.wakeup.wait(min(60, max(1, delay.total_seconds())))
+            self.wakeup.clear()
+
+    def _begin(self, schedule):
+        """Marca la programación en curso (un solo barrido a la vez por programación)"""
+        with self.lock:
+            if schedule.running:
+                return False
+            schedule.running = True
+            return True
+
+    def _sweep(self, schedule):
+        run = {'schedule': schedule.name, 'started': datetime.now().isoformat(), 'finished': None,
+               'jobs': {}, 'skipped': {}}
+        with self.lock:
+            self.history.append(run)
+
+        try:
+            clients = self.config.get('clientes', {})
+            selected = list(clients) if schedule.clients == '*' else [c for c in schedule.clients if c in clients]
+            checks = {name: self.config['checks'][name] for name in schedule.checks if name in self.config['checks']}
+            self._log(f"Barrido '{schedule.name}': {len(selected)} clientes")
+
+            # Orden de lanzamiento según la demora aleatoria de cada cliente
+            started = time.monotonic()
+            delays = sorted((random.uniform(0, schedule.jitter), client_id) for client_id in selected)
+            for delay, client_id in delays:
+                time.sleep(max(0, started + delay - time.monotonic()))
+                client_info = clients[client_id]
+                job = self._submit(schedule, client_id, client_info, checks)
+                if job:
+                    run['jobs'][client_id] = job.id
+                else:
+                    run['skipped'][client_id] = 'cola de trabajos llena'
+        except Exception as e:
+            run['error'] = str(e)
+            self._log(f"Error en el barrido '{schedule.name}': {str(e)}", "ERROR")
+        finally:
+            run['finished'] = datetime.now().isoformat()
+            schedule.running = False
+
+    def _submit(self, schedule, client_id, client_info, checks):
+        """Encola el trabajo de un cliente, reintentando mientras la cola esté llena"""
+        data = {} if schedule.incremental is None else {'incremental': schedule.incremental}
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            incremental = self.incremental_for(client_id, data) if self.incremental_for else None
+            try:
+                return self.jobs.submit(client_id, client_info, client_info.get('devices', []), checks,
+                                        incremental, priority=schedule.priority, schedule=schedule.name)
+            except queue.Full:
+                if time.monotonic() + self.retry_interval > deadline:
+                    self._log(f"Barrido '{schedule.name}': cola llena, se omite {client_id}", "WARNING")
+                    return None
+                time.sleep(self.retry_interval)
+
+    def _log(self, message, level="INFO"):
+        if self.log:
+            self.log(message, level)
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionCache:
+    """Cache de sesiones ya autenticadas con los dispositivos.
+
+    Las entradas se indexan por (cliente, dispositivo, credencial), caducan tras
+    `ttl` segundos sin uso y se expulsan por LRU al superar `max_sessions`.
+    Una sesión sólo puede estar prestada a un análisis a la vez. Cada sesión
+    por jump host retiene un canal del JumpHostPool: si el pool se queda sin
+    canales, cierra las sesiones ociosas de ese jump host (evict_for_jump).
+    """
+
+    def __init__(self, ttl=300, max_sessions=50):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self.entries = OrderedDict()  # clave -> (conexión, último uso)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Hilo que cierra las sesiones caducadas
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True, name='session-cache-reaper')
+        self._reaper.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """Crea la cache a partir de la sección session_cache (None si está deshabilitada)"""
+        settings = config.get('session_cache', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(
+            ttl=settings.get('ttl', 300),
+            max_sessions=settings.get('max_sessions', 50)
+        )
+
+    @staticmethod
+    def make_key(client_info, device_info):
+        return (
+            client_info.get('nombre'),
+            device_info['id'],
+            client_info.get('credential', 'default')
+        )
+
+    def checkout(self, key, probe=None):
+        """Retira una sesión de la cache. Devuelve None si no hay o no responde"""
+        with self.lock:
+            item = self.entries.pop(key, None)
+
+        if item is None:
+            self.misses += 1
+            return None
+
+        connection, last_used = item
+        if time.monotonic() - last_used > self.ttl or (probe and not probe(connection)):
+            connection.close()
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return connection
+
+    def checkin(self, key, connection):
+        """Devuelve una sesión a la cache para el siguiente análisis"""
+        evicted = []
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous:
+                evicted.append(previous[0])
+            self.entries[key] = (connection, time.monotonic())
+
+            while len(self.entries) > self.max_sessions:
+                _, (old, _) = self.entries.popitem(last=False)
+                evicted.append(old)
+
+        for old in evicted:
+            old.close()
+
+    def evict_for_jump(self, jump_key):
+        """Cierra la sesión ociosa más antigua que retiene un canal hacia ese jump host.
+
+        La usa el JumpHostPool cuando se queda sin canales. Devuelve cuántas cerró (0 o 1).
+        """
+        with self.lock:
+            victim = next((
+                k for k, (connection, _) in self.entries.items()
+                if getattr(connection.jump_lease, 'key', None) == jump_key
+            ), None)
+            if victim is None:
+                return 0
+            connection, _ = self.entries.pop(victim)
+
+        connection.close()
+        return 1
+
+    def purge_expired(self):
+        """Cierra las sesiones que superaron el TTL"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [k for k, (_, last_used) in self.entries.items() if now - last_used > self.ttl]
+            connections = [self.entries.pop(k)[0] for k in expired]
+
+        for connection in connections:
+            connection.close()
+        return len(connections)
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(min(self.ttl, 30))
+            self.purge_expired()
+
+    def close_all(self):
+        with self.lock:
+            connections = [c for c, _ in self.entries.values()]
+            self.entries.clear()
+        for connection in connections:
+            connection.close()
+
+    def stats(self):
+        with self.lock:
+            return {'sessions': len(self.entries), 'hits': self.hits, 'misses': self.misses}
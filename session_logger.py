@@ -0,0 +1,130 @@
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+
+class SessionLogger:
+    """Escritura de logs de sesión en segundo plano.
+
+    Las líneas se encolan sin bloquear al hilo SSH y un hilo escritor las
+    vuelca por lotes en data/logs/session_*.txt, rotando el archivo por
+    tamaño o antigüedad. Las últimas líneas quedan en memoria para el GUI.
+    """
+
+    def __init__(self, log_dir='data/logs', max_bytes=10 * 1024 * 1024, max_age=86400,
+                 flush_interval=0.5, batch_size=500, ring_size=2000, max_pending=100000, console=True):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.console = console
+
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.ring = deque(maxlen=ring_size)
+        self.dropped = 0
+
+        self.current_file = None
+        self._opened_at = 0
+        self._size = 0
+        self._handle = None
+        self._rotate()
+
+        self._flushed = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True, name='session-logger')
+        self._writer.start()
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('logging', {})
+        return cls(
+            max_bytes=settings.get('max_bytes', 10 * 1024 * 1024),
+            max_age=settings.get('max_age', 86400),
+            flush_interval=settings.get('flush_interval', 0.5),
+            batch_size=settings.get('batch_size', 500),
+            ring_size=settings.get('ring_size', 2000),
+            console=settings.get('console', True)
+        )
+
+    def write(self, entry):
+        """Encola una línea; si la cola está llena se descarta y se cuenta"""
+        self.ring.append(entry)
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def recent(self, limit=200):
+        """Últimas líneas registradas (para el GUI)"""
+        entries = list(self.ring)
+        return entries[-limit:] if limit else entries
+
+    def flush(self, timeout=5):
+        """Espera a que todo lo encolado esté escrito en disco"""
+        self._flushed.clear()
+        self.queue.put(None)
+        self._flushed.wait(timeout)
+
+    def _writer_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+
+            # Acumular hasta llenar el lote o agotar el intervalo
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or batch[-1] is None:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            entries = [e for e in batch if e is not None]
+            if entries:
+                self._write_batch(entries)
+            if None in batch:
+                self._flushed.set()
+
+    def _write_batch(self, entries):
+        text = '\n'.join(entries) + '\n'
+        if self.console:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        try:
+            if self._needs_rotation():
+                self._rotate()
+            data = text.encode('utf-8')
+            self._handle.write(data)
+            self._handle.flush()
+            self._size += len(data)
+        except OSError as e:
+            sys.stderr.write(f"ERROR escribiendo log de sesión: {e}\n")
+
+    def _needs_rotation(self):
+        too_big = self.max_bytes and self._size >= self.max_bytes
+        too_old = self.max_age and time.monotonic() - self._opened_at >= self.max_age
+        return too_big or too_old
+
+    def _rotate(self):
+        """Abre un archivo de sesión nuevo"""
+        if self._handle:
+            self._handle.close()
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = self.log_dir / f"session_{timestamp}.txt"
+        suffix = 1
+        while path.exists():
+            path = self.log_dir / f"session_{timestamp}_{suffix}.txt"
+            suffix += 1
+
+        self._handle = open(path, 'ab')
+        self._size = 0
+        self._opened_at = time.monotonic()
+        self.current_file = path
@@ -0,0 +1,91 @@
+"""Fixtures comunes: jump host y dispositivos simulados (benchmarks/fake_ssh_server.py) y un config.json mínimo."""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_ssh_server import FakeDevice, FakeJumpHost  # noqa: E402
+
+CHECKS = {
+    'health': ['show version', 'show processes cpu', 'show memory'],
+    'interfaces': ['show interface status', 'show interface counters errors'],
+    'vlans': ['show vlan brief', 'show interface trunk']
+}
+
+
+def make_devices(count=3, **kwargs):
+    """Dispositivos simulados, alternando IOS y ASA"""
+    return [
+        FakeDevice(f"TEST-{i + 1:02d}", f"10.98.0.{i + 1}",
+                   device_type='cisco_asa' if i % 2 else 'cisco_ios', **kwargs)
+        for i in range(count)
+    ]
+
+
+def make_config(jump, devices, **sections):
+    """config.json que apunta al jump host simulado; `sections` reemplaza secciones enteras"""
+    config = {
+        'app': {'name': 'Network Analyzer', 'version': 'test', 'debug': False},
+        'config_reload': {'enabled': False},
+        'analysis': {'max_workers_per_client': 4, 'max_workers_global': 8},
+        'logging': {'console': False},
+        'ssh': {'connect_timeout': 10, 'login_timeout': 10, 'command_timeout': 20},
+        'jump_pool': {'enabled': True, 'max_channels': 10, 'max_transports': 4},
+        'session_cache': {'enabled': False},
+        'socketio': {'log_interval': 0.05},
+        'reports': {'dir': 'data/reports', 'pdf_background': False},
+        'health': {'enabled': True, 'retries': 0},
+        'credentials': {
+            'test': {'username': 'admin', 'password': 'admin123', 'enable_password': 'admin123'},
+            'jump': {'username': jump.username, 'password': jump.password}
+        },
+        'jump_hosts': {'bridge': {'host': '127.0.0.1', 'port': jump.port, 'credential': 'jump'}},
+        'clientes': {
+            'acme': {
+                'nombre': 'ACME',
+                'credential': 'test',
+                'jump_host': 'bridge',
+                'devices': [
+                    {'id': d.hostname.lower(), 'hostname': d.hostname, 'ip': d.ip, 'type': d.type,
+                     'protocol': 'ssh'}
+                    for d in devices
+                ]
+            }
+        },
+        'checks': CHECKS
+    }
+    config.update(sections)
+    return config
+
+
+def write_config(path, config):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(config, indent=2))
+    return path
+
+
+@pytest.fixture(scope='session')
+def fleet():
+    """Jump host simulado con tres dispositivos, compartido por toda la sesión de pruebas"""
+    devices = make_devices()
+    jump = FakeJumpHost(devices=devices).start()
+    yield jump, devices
+    jump.stop()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Directorio de trabajo temporal: logs, spool, reportes y salud van a data/ dentro de él"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def config(fleet):
+    jump, devices = fleet
+    return make_config(jump, devices)
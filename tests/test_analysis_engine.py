@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+import metrics
+from analysis_engine import AnalysisEngine
+from benchmarks.fake_ssh_server import FakeJumpHost
+from tests.conftest import CHECKS, make_config, make_devices
+
+
+@pytest.mark.parametrize('mode', ['shell', 'tunnel'])
+def test_analyze_client_through_jump_host(workdir, fleet, mode):
+    jump, devices = fleet
+    config = make_config(jump, devices)
+    config['jump_hosts']['bridge']['mode'] = mode
+    engine = AnalysisEngine(config)
+    client_info = config['clientes']['acme']
+    progress, finished = [], []
+
+    results = engine.analyze_client(
+        client_info, client_info['devices'], {'health': CHECKS['health']},
+        on_progress=lambda device, status: progress.append((device['id'], status)),
+        on_result=lambda index, result: finished.append(index)
+    )
+
+    assert [r['device'] for r in results] == ['TEST-01', 'TEST-02', 'TEST-03']  # Orden del inventario
+    assert [r['status'] for r in results] == ['completed'] * 3
+    assert sorted(finished) == [0, 1, 2]
+    assert ('test-02', 'completed') in progress
+
+    ios, asa = results[0]['checks']['health'], results[1]['checks']['health']
+    assert ios['outputs']['show version'].startswith('Cisco IOS Software')
+    assert 'TEST-01 uptime is 12 weeks' in ios['outputs']['show version']
+    assert asa['outputs']['show processes cpu'].strip() == (
+        'CPU utilization for 5 seconds = 3%; 1 minute: 4%; 5 minutes: 4%'
+    )
+    assert ios['parsed']['show processes cpu'][0]['cpu_usage_5_sec'] == '7'
+    assert results[0]['timings']['total'] > 0
+    # Las tres sesiones comparten el transporte al jump host
+    assert engine.jump_pool.stats()['handshakes'] == 1
+    engine.close()
+    assert engine.jump_pool.stats()['transports'] == {}
+    # Tiempos por comando sólo en el resultado: en /metrics no hay una serie por comando
+    assert set(CHECKS['health']) <= set(results[0]['timings']['commands'])
+    assert 'phase="command"' in metrics.registry.render()
+    assert 'command=' not in metrics.registry.render()
+
+
+def test_banner_lines_ending_like_a_prompt_are_not_learned_as_prompt(workdir):
+    # '#####' al final de un fragmento del banner parece un prompt de shell
+    devices = make_devices(1)
+    jump = FakeJumpHost(devices=devices, banner="#####\nBridgenet\nAcceso> restringido>\n#####\n",
+                        banner_pause=0.05).start()
+    try:
+        config = make_config(jump, devices)
+        client_info = config['clientes']['acme']
+        results = AnalysisEngine(config).analyze_client(client_info, client_info['devices'],
+                                                        {'health': CHECKS['health']})
+        assert results[0]['status'] == 'completed'
+    finally:
+        jump.stop()
+
+
+def test_cached_sessions_do_not_starve_the_jump_pool(workdir, fleet):
+    jump, devices = fleet
+    # Un solo canal hacia el jump host y una cache que podría retenerlo
+    config = make_config(jump, devices, jump_pool={'enabled': True, 'max_channels': 1, 'max_transports': 1},
+                         session_cache={'enabled': True, 'max_sessions': 10})
+    config['ssh']['connect_timeout'] = 3
+    engine = AnalysisEngine(config)
+    client_info = config['clientes']['acme']
+
+    for device in client_info['devices']:
+        result = engine.analyze_client(client_info, [device], {'health': ['show version']})[0]
+        assert result['status'] == 'completed'
+    # Cada análisis liberó la sesión cacheada del anterior para obtener el canal
+    assert engine.session_cache.stats()['sessions'] == 1
+
+    # Tras recargar la configuración no se reutilizan sesiones abiertas con la anterior
+    engine.update_config(config)
+    assert engine.session_cache.stats()['sessions'] == 0
+    assert engine.jump_pool.stats()['transports'][f"127.0.0.1:{jump.port}"] == [0]
+
+
+def test_unreachable_device_opens_circuit(workdir, fleet):
+    jump, devices = fleet
+    config = make_config(jump, devices, health={'enabled': True, 'retries': 0, 'failure_threshold': 1})
+    config['clientes']['acme']['devices'] = [{'id': 'lejos', 'hostname': 'LEJOS', 'ip': '10.98.9.9',
+                                              'type': 'cisco_ios'}]
+    config['ssh']['login_timeout'] = 3
+    engine = AnalysisEngine(config)
+    client_info = config['clientes']['acme']
+
+    first = engine.analyze_client(client_info, client_info['devices'], {'health': ['show version']})
+    assert first[0]['status'] == 'unreachable'
+    assert not first[0].get('circuit_open')
+    # Segundo intento: el circuito ya está abierto y no se conecta
+    second = engine.analyze_client(client_info, client_info['devices'], {'health': ['show version']})
+    assert second[0]['status'] == 'unreachable'
+    assert second[0]['circuit_open']
+    assert engine.device_health.stats()['open'] == 1
+
+
+def test_cancelled_devices_are_not_analyzed(workdir):
+    devices = make_devices(4, latency=0.05)
+    jump = FakeJumpHost(devices=devices).start()
+    try:
+        config = make_config(jump, devices, analysis={'max_workers_per_client': 1, 'max_workers_global': 1})
+        engine = AnalysisEngine(config)
+        client_info = config['clientes']['acme']
+        cancel_event = threading.Event()
+
+        results = engine.analyze_client(
+            client_info, client_info['devices'], {'health': ['show version']},
+            on_result=lambda index, result: cancel_event.set(),
+            cancel_event=cancel_event
+        )
+    finally:
+        jump.stop()
+
+    assert results[0]['status'] == 'completed'
+    assert [r['status'] for r in results[1:]] == ['cancelled'] * 3
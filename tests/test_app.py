@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+import pytest
+import simple_websocket
+
+from tests.conftest import make_config, write_config
+
+
+class SocketClient:
+    """Cliente Socket.IO mínimo sobre websocket: lo justo para recibir eventos del servidor real"""
+
+    def __init__(self, port):
+        self.ws = simple_websocket.Client(f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket")
+        self.events = queue.Queue()
+        assert self.ws.receive(timeout=5).startswith('0')  # Apertura de Engine.IO
+        self.ws.send('40')
+        packet = self.ws.receive(timeout=5)
+        assert packet.startswith('40')
+        self.sid = json.loads(packet[2:])['sid']
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                packet = self.ws.receive()
+            except simple_websocket.ConnectionClosed:
+                return
+            if packet == '2':
+                self.ws.send('3')
+            elif packet and packet.startswith('42'):
+                name, data = json.loads(packet[2:])
+                self.events.put((name, data))
+
+    def wait_for(self, name, predicate=lambda data: True, timeout=15):
+        """Primer evento `name` que cumple `predicate` (los anteriores quedan en `seen`)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                event, data = self.events.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise AssertionError(f"No llegó el evento '{name}' en {timeout}s")
+            if event == name and predicate(data):
+                return data
+
+    def close(self):
+        self.ws.close()
+
+
+@pytest.fixture(scope='module')
+def server(fleet, tmp_path_factory):
+    """app.py servido por socketio.run en un puerto libre, con el config del jump host simulado"""
+    jump, devices = fleet
+    root = tmp_path_factory.mktemp('app')
+    write_config(root / 'config/config.json', make_config(jump, devices))
+    previous = os.getcwd()
+    os.chdir(root)
+
+    import app as app_module
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    threading.Thread(
+        target=app_module.socketio.run, args=(app_module.app,),
+        kwargs={'host': '127.0.0.1', 'port': port, 'allow_unsafe_werkzeug': True, 'log_output': False},
+        daemon=True
+    ).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    yield app_module, port
+    os.chdir(previous)
+
+
+def test_job_events_reach_the_browser(server):
+    app_module, port = server
+    client = SocketClient(port)
+    try:
+        response = app_module.app.test_client().post('/api/jobs/acme', json={
+            'devices': ['test-01', 'test-02'],
+            'checks': ['health'],
+            'sid': client.sid
+        })
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        # Los eventos se emiten desde los hilos del JobManager
+        client.wait_for('device_progress', lambda data: data.get('job_id') == job_id)
+        final = client.wait_for('job_progress', lambda data: data['job_id'] == job_id
+                                and data['status'] in ('completed', 'failed', 'cancelled'))
+    finally:
+        client.close()
+
+    assert final['status'] == 'completed'
+    assert final['done'] == final['total'] == 2
+    assert final['report_id']
+    # El mismo estado por HTTP (respaldo de la página si se pierde el socket)
+    assert app_module.app.test_client().get(f"/api/jobs/{job_id}").get_json()['status'] == 'completed'
+
+
+def test_log_batches_reach_the_requesting_socket(server):
+    app_module, port = server
+    client, other = SocketClient(port), SocketClient(port)
+    try:
+        response = app_module.app.test_client().post('/api/analyze/acme', json={
+            'devices': ['test-03'],
+            'checks': ['health'],
+            'sid': client.sid
+        })
+        assert response.status_code == 200
+
+        # Las líneas llegan agrupadas desde el hilo del LogBroadcaster, sólo al socket que pidió el análisis
+        batch = client.wait_for('console_log_batch', lambda data: any('TEST-03' in line for line in data['lines']))
+        assert batch['dropped'] == 0
+        app_module.log_broadcaster.publish('aviso general')
+        assert other.wait_for('console_log_batch')['lines'] == ['aviso general']
+    finally:
+        client.close()
+        other.close()
+
+
+def test_bulk_analysis_streams_ndjson(server):
+    app_module, _ = server
+    client = app_module.app.test_client()
+    response = client.post('/api/bulk/analyze', json={
+        'checks': ['health'],
+        'requests': [{'client': 'acme', 'devices': ['test-01', 'test-02'], 'save': False}]
+    })
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert sorted(line['device_id'] for line in lines if line['type'] == 'device') == ['test-01', 'test-02']
+    assert lines[-1]['type'] == 'summary' and lines[-1]['status'] == {'completed': 2}
+    assert client.post('/api/bulk/analyze', json={'requests': [{'client': 'nadie'}]}).status_code == 400
+    # /api/analyze/<client_id> queda libre para cualquier id de cliente, incluido 'bulk'
+    assert client.post('/api/analyze/bulk', json={'checks': ['health']}).get_json()['error'] == 'Cliente no encontrado'
+
+
+
+def test_malformed_analysis_requests_are_rejected(server):
+    client = server[0].app.test_client()
+    for url in ('/api/analyze/acme', '/api/jobs/acme'):
+        for body in (['test-01'], {'devices': 'test-01'}, {'checks': 'health'}, {'sid': 5}):
+            response = client.post(url, json=body)
+            assert response.status_code == 400 and response.get_json()['error']
+    # Sin cuerpo JSON se usan los valores por defecto en lugar de fallar con un 500
+    assert client.post('/api/analyze/nadie', data='x', content_type='text/plain').status_code == 404
+    assert client.post('/api/jobs/nadie').status_code == 404
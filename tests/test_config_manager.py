@@ -0,0 +1,90 @@
+import copy
+import json
+
+from config_manager import ConfigManager, ConfigSnapshot, validate_config
+from tests.conftest import write_config
+
+
+def test_validate_config_reports_every_problem(config):
+    data = copy.deepcopy(config)
+    data['clientes']['acme']['jump_host'] = 'otro'
+    data['clientes']['acme']['devices'].append({'id': 'test-01', 'hostname': 'X', 'ip': '10.0.0.1'})
+    data['clientes']['acme']['devices'].append({'id': 'sin-ip', 'hostname': 'Y'})
+    data['clientes']['nuevo'] = {'credential': 'nadie'}
+    data['checks']['roto'] = 'show version'
+
+    errors = validate_config(data)
+    assert "Cliente 'acme': jump host 'otro' inexistente" in errors
+    assert "Cliente 'acme': id de dispositivo repetido 'test-01'" in errors
+    assert "Cliente 'acme', dispositivo 4: faltan ip" in errors
+    assert "Cliente 'nuevo' sin nombre" in errors
+    assert "Cliente 'nuevo': credencial 'nadie' inexistente" in errors
+    assert "Check 'roto': debe ser una lista de comandos" in errors
+    assert validate_config(config) == []
+    assert validate_config({}) == ["Falta la sección 'credentials'", "Falta la sección 'clientes'",
+                                   "Falta la sección 'checks'"]
+
+
+def test_snapshot_indexes(config):
+    snapshot = ConfigSnapshot(config)
+    devices = snapshot.select_devices('acme', ['test-03', 'no-existe', 'test-01'])
+    assert [d['id'] for d in devices] == ['test-01', 'test-03']  # Orden del inventario
+    assert snapshot.device('acme', 'test-02')['hostname'] == 'TEST-02'
+    assert snapshot.device('otro', 'test-02') is None
+    assert len(snapshot.devices_by_jump_host['bridge']) == 3
+    assert list(snapshot.select_checks(['vlans', 'nada'])) == ['vlans']
+
+
+def test_reload_keeps_previous_snapshot_when_invalid(workdir, config):
+    path = write_config(workdir / 'config.json', config)
+    manager = ConfigManager(path)
+    published = []
+    manager.subscribe(published.append)
+
+    assert not manager.reload()  # Sin cambios
+    path.write_text('{"clientes": ')
+    assert not manager.reload(force=True)
+    assert manager.last_error.startswith('JSON inválido')
+
+    broken = copy.deepcopy(config)
+    del broken['checks']
+    path.write_text(json.dumps(broken))
+    assert not manager.reload(force=True)
+    assert manager.snapshot.version == 1
+    assert manager.config['checks']
+
+    changed = copy.deepcopy(config)
+    changed['clientes']['acme']['nombre'] = 'ACME 2'
+    path.write_text(json.dumps(changed))
+    assert manager.reload(force=True)
+    assert manager.last_error is None
+    assert [s.version for s in published] == [2]
+    assert manager.snapshot.clients['acme']['nombre'] == 'ACME 2'
+
+
+def test_malformed_entries_are_errors_not_exceptions(workdir, config):
+    data = copy.deepcopy(config)
+    data['clientes']['texto'] = 'no es un cliente'
+    data['clientes']['acme']['devices'].append('tampoco')
+    data['clientes']['acme']['devices'].append({'hostname': 'SIN-ID', 'ip': '10.0.0.9'})
+    data['jump_hosts']['roto'] = ['x']
+
+    errors = validate_config(data)
+    assert "Cliente 'texto': debe ser un objeto" in errors
+    assert "Cliente 'acme', dispositivo 3: debe ser un objeto" in errors
+    assert "Jump host 'roto': debe ser un objeto" in errors
+    assert validate_config({'credentials': {}, 'clientes': {'x': 'str'}, 'checks': {}}) == [
+        "Cliente 'x': debe ser un objeto"
+    ]
+
+    # Al arrancar con errores se indexa lo que está bien formado
+    path = write_config(workdir / 'config.json', data)
+    logged = []
+    manager = ConfigManager(path, log=lambda message, level: logged.append(level))
+    assert manager.last_error
+    assert [d['id'] for d in manager.snapshot.select_devices('acme', ['test-01', 'test-03'])] == ['test-01', 'test-03']
+
+    # Una recarga con entradas mal formadas se rechaza y se informa
+    path.write_text(json.dumps(data) + ' ')
+    assert not manager.reload(force=True)
+    assert logged == ['ERROR']
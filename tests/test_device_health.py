@@ -0,0 +1,85 @@
+import time
+
+from device_health import DeviceHealth
+
+KEY = 'bridge/10.0.0.1'
+
+
+def test_circuit_opens_after_threshold_and_recovers(workdir):
+    health = DeviceHealth(path='data/device_health.json', failure_threshold=2, open_seconds=60)
+
+    health.record_failure(KEY, 'timeout')
+    assert health.allow(KEY) == (True, 0)
+    health.record_failure(KEY, 'timeout')
+    allowed, remaining = health.allow(KEY)
+    assert not allowed and 59 < remaining <= 60
+
+    # Vencido el plazo: un solo intento de prueba; si falla se duplica la espera
+    health.entries[KEY]['open_until'] = time.time() - 1
+    assert health.allow(KEY) == (True, 0)
+    assert health.stats()['half_open'] == 1
+    allowed, remaining = health.allow(KEY)
+    assert not allowed and remaining > 0
+    health.record_failure(KEY, 'timeout')
+    assert health.entries[KEY]['state'] == 'open'
+    assert health.entries[KEY]['open_seconds'] == 120
+
+    health.entries[KEY]['open_until'] = time.time() - 1
+    assert health.allow(KEY)[0]
+    health.record_success(KEY, {'auth': 0.5, 'commands': {'show version': 0.2}})
+    assert health.entries[KEY]['state'] == 'closed'
+    assert health.entries[KEY]['failures'] == 0
+
+
+def test_adaptive_timeouts(workdir):
+    health = DeviceHealth(path=None, timeout_factor=4, min_login_timeout=5, min_command_timeout=10, alpha=0.5)
+    assert health.timeouts(KEY, ['show version'], 20, 60) == (20, 60)
+
+    health.record_success(KEY, {'auth': 2.0, 'commands': {'show version': 4.0}})
+    health.record_success(KEY, {'auth': 1.0, 'commands': {'show version': 2.0}})
+    assert health.entries[KEY]['auth'] == 1.5
+    assert health.timeouts(KEY, ['show version'], 20, 60) == (6.0, 12.0)
+    # Un comando sin historial mantiene el plazo configurado
+    assert health.timeouts(KEY, ['show version', 'show tech'], 20, 60) == (6.0, 60)
+    # Nunca por debajo de los mínimos ni por encima de lo configurado
+    assert health.timeouts(KEY, ['show version'], 3, 8) == (3, 8)
+
+
+def test_state_survives_restart(workdir):
+    health = DeviceHealth(path='data/device_health.json', failure_threshold=1)
+    health.record_failure(KEY, 'timeout')
+    health.record_success('bridge/10.0.0.2', {'auth': 1.0})
+    health.flush()
+
+    restored = DeviceHealth(path='data/device_health.json', failure_threshold=1)
+    assert restored.entries[KEY]['state'] == 'open'
+    assert restored.entries['bridge/10.0.0.2']['auth'] == 1.0
+    assert not restored.allow(KEY)[0]
+
+
+def test_probe_slot_is_released_without_verdict(workdir):
+    health = DeviceHealth(path=None, failure_threshold=1, half_open_timeout=30)
+    health.record_failure(KEY, 'timeout')
+    health.entries[KEY]['open_until'] = time.time() - 1
+
+    assert health.allow(KEY)[0]
+    assert not health.allow(KEY)[0]
+    health.release_probe(KEY)  # Credenciales rechazadas: ni éxito ni falla del dispositivo
+    assert health.allow(KEY)[0]
+    # Un intento que nunca informa deja de bloquear al vencer half_open_timeout
+    health.probes[KEY] -= 31
+    assert health.allow(KEY)[0]
+
+
+def test_saves_are_batched(workdir):
+    path = workdir / 'data/device_health.json'
+    health = DeviceHealth(path=str(path), save_interval=0.2)
+    for index in range(20):
+        health.record_success(f"bridge/10.0.0.{index}", {'auth': 0.5})
+    assert not path.exists()  # Nada escrito todavía: los cambios esperan al intervalo
+
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.02)
+    assert len(DeviceHealth(path=str(path)).entries) == 20
@@ -0,0 +1,69 @@
+import re
+
+from output_spool import CommandDemuxer, OutputCleaner, OutputSpool, is_spooled, output_text
+
+PROMPT_LINE = re.compile(r'^\S+[>#]\s?')
+
+
+def capture(spool, command, text, chunk=7):
+    cleaner = OutputCleaner(command, spool.open('sw1', command))
+    # La salida llega partida en trozos arbitrarios
+    for start in range(0, len(text), chunk):
+        cleaner.feed(text[start:start + chunk])
+    return cleaner.finish()
+
+
+def demux(spool, commands, text, chunk=7):
+    demuxer = CommandDemuxer(commands, lambda command: OutputCleaner(command, spool.open('sw1', command)),
+                             PROMPT_LINE)
+    # La salida llega partida en trozos arbitrarios
+    for start in range(0, len(text), chunk):
+        demuxer.feed(text[start:start + chunk])
+    return demuxer
+
+
+def test_short_output_stays_inline(workdir):
+    output = capture(OutputSpool(), 'show clock', "show clock\n10:00:00.000 UTC Mon Mar 4 2024\nsw1#")
+    assert output == "10:00:00.000 UTC Mon Mar 4 2024"
+
+
+def test_long_output_goes_to_spool(workdir):
+    spool = OutputSpool(threshold=1000, preview_chars=50)
+    lines = [f"linea {i}" for i in range(500)]
+    output = capture(spool, 'show tech', "show tech\n" + '\n'.join(lines) + "\nsw1#", chunk=300)
+
+    assert is_spooled(output)
+    assert output['spool'].endswith('.gz')
+    assert len(output['preview']) == 50
+    assert output_text(output) == '\n'.join(lines)
+    assert output_text(output, full=False) == output['preview']
+
+
+def test_demuxer_splits_pipelined_output(workdir):
+    spool = OutputSpool()
+    text = (
+        "show version\n"
+        "Cisco IOS Software, Version 15.2\n"
+        "sw1 uptime is 3 weeks\n"
+        "sw1#show clock\n"
+        "10:00:00.000 UTC Mon Mar 4 2024\n"
+        "sw1#show users\n"
+        " --More-- \x08\x08\x08\x08\x08\x08\x08\x08\x08\x08          \x08\x08\x08\x08\x08\x08\x08\x08\x08\x08"
+        "  Line  User\n"
+        "sw1#"
+    )
+    demuxer = demux(spool, ['show version', 'show clock', 'show users'], text)
+
+    assert demuxer.done
+    outputs = demuxer.finish()
+    assert outputs['show version'] == "Cisco IOS Software, Version 15.2\nsw1 uptime is 3 weeks"
+    assert outputs['show clock'] == "10:00:00.000 UTC Mon Mar 4 2024"
+    assert outputs['show users'] == "  Line  User"
+
+
+def test_demuxer_missing_commands_are_empty(workdir):
+    spool = OutputSpool()
+    demuxer = demux(spool, ['show version', 'show clock'], "show version\nVersion 15.2\nsw1#")
+
+    assert not demuxer.done
+    assert demuxer.finish() == {'show version': 'Version 15.2', 'show clock': ''}
@@ -0,0 +1,159 @@
+import copy
+import time
+from datetime import datetime
+
+from incremental import IncrementalAnalysis
+from output_spool import OutputSpool, is_spooled, output_text
+from report_generator import ReportGenerator
+
+LONG_OUTPUT = '\n'.join(f"Gi1/0/{i}  connected  10  a-full a-1000" for i in range(1, 49))
+
+
+def make_report(client_id, timestamp, status='completed', version='Version 15.2', interfaces=LONG_OUTPUT):
+    return {
+        'client_id': client_id,
+        'client_name': client_id.upper(),
+        'timestamp': timestamp,
+        'devices': [{
+            'device': 'SW1',
+            'ip': '10.0.0.1',
+            'status': status,
+            'checks': {
+                'health': {'outputs': {'show version': version}},
+                'interfaces': {'outputs': {'show interface status': interfaces}}
+            },
+            'full_log': ['linea 1', 'linea 2']
+        }]
+    }
+
+
+def test_index_filters_sorts_and_pages(workdir):
+    store = ReportGenerator(pdf_background=False)
+    for day in range(1, 6):
+        store.save_report(make_report('acme', f"2024-03-0{day}T10:00:00"))
+    store.save_report(make_report('globex', '2024-03-03T12:00:00', status='failed'))
+
+    reports, total = store.get_reports_list(per_page=2)
+    assert total == 6
+    assert [r['timestamp'][:10] for r in reports] == ['2024-03-05', '2024-03-04']
+
+    reports, total = store.get_reports_list(client='acme', date_from='2024-03-02', date_to='2024-03-03',
+                                            order='asc')
+    assert total == 2
+    assert [r['timestamp'][:10] for r in reports] == ['2024-03-02', '2024-03-03']
+    assert store.get_reports_list(page=3, per_page=5)[0] == []
+    assert [c['id'] for c in store.list_clients()] == ['acme', 'globex']
+
+    # Un índice nuevo (p. ej. tras borrar index.db) se reconstruye desde los archivos
+    (workdir / 'data/reports/index.db').unlink()
+    assert ReportGenerator(pdf_background=False).get_reports_list()[1] == 6
+
+
+def test_pdf_is_cached_and_background_errors_are_logged(workdir):
+    store = ReportGenerator(pdf_background=False)
+    report_id = store.save_report(make_report('acme', '2024-03-01T10:00:00'))
+    path = store.generate_pdf(report_id)
+    assert path.endswith('.pdf') and store.generate_pdf(report_id) == path
+    assert store.generate_pdf(report_id, full=True) != path
+    assert store.generate_pdf('no-existe') is None
+
+    logged = []
+    failing = ReportGenerator(log=lambda message, level: logged.append((level, message)))
+
+    def broken(report_id, output, full):
+        raise RuntimeError('sin espacio')
+
+    failing.pdf_builder = broken
+    failing.save_report(make_report('globex', '2024-03-01T10:00:00'))
+    for _ in range(100):
+        if logged:
+            break
+        time.sleep(0.02)
+    assert logged[0][0] == 'ERROR' and 'sin espacio' in logged[0][1]
+
+
+def test_pdf_escapes_markup_in_names_and_commands(workdir):
+    store = ReportGenerator(pdf_background=False)
+    report = make_report('r&d', '2024-03-01T10:00:00')
+    report['client_name'] = 'R&D <lab>'
+    report['devices'][0]['checks']['health']['outputs'] = {'show run | include <hostname': 'hostname SW1'}
+    assert store.generate_pdf(store.save_report(report)).endswith('.pdf')
+
+
+def test_incremental_references_unchanged_outputs(workdir):
+    store = ReportGenerator(pdf_background=False)
+    base_id = store.save_report(make_report('acme', '2024-03-01T10:00:00'))
+    incremental = IncrementalAnalysis.from_config(store, 'acme', {})
+    device = {'id': 'sw1', 'hostname': 'SW1'}
+
+    checks, skipped = incremental.plan(device, {'health': ['show version']})
+    assert checks == {'health': ['show version']} and skipped == {}
+
+    result = copy.deepcopy(make_report('acme', '', version='Version 15.9')['devices'][0])
+    incremental.apply(device, result, skipped)
+    outputs = result['checks']['interfaces']['outputs']
+    assert outputs['show interface status']['unchanged']
+    assert outputs['show interface status']['base_report'] == base_id
+    assert result['changes'][0]['command'] == 'show version'
+    assert '-Version 15.2' in result['changes'][0]['diff'] and '+Version 15.9' in result['changes'][0]['diff']
+
+    # El reporte incremental se resuelve contra el anterior
+    report = make_report('acme', '2024-03-02T10:00:00')
+    report['devices'] = [result]
+    second = store.save_report(report)
+    assert store.get_output(second, 'SW1', 'interfaces', 'show interface status') == LONG_OUTPUT
+
+
+def test_slow_checks_are_taken_from_previous_report(workdir):
+    store = ReportGenerator(pdf_background=False)
+    store.save_report(make_report('acme', datetime.now().isoformat()))
+    incremental = IncrementalAnalysis.from_config(store, 'acme', {'incremental': {'slow_checks': {'interfaces': 3600}}})
+
+    checks, skipped = incremental.plan({'id': 'sw1', 'hostname': 'SW1'}, {
+        'health': ['show version'],
+        'interfaces': ['show interface status']
+    })
+    assert checks == {'health': ['show version']}
+    assert skipped['interfaces']['show interface status']['skipped']
+
+
+def test_outputs_are_stored_once_by_content(workdir):
+    store = ReportGenerator(pdf_background=False, chunk_min_size=256)
+    first = store.save_report(make_report('acme', '2024-03-01T10:00:00'))
+    second = store.save_report(make_report('acme', '2024-03-02T10:00:00'))
+
+    header = store.load_header(first)
+    output = header['devices'][0]['checks']['interfaces']['outputs']['show interface status']
+    assert set(output) == {'chunk', 'size'}
+    assert header['devices'][0]['checks']['health']['outputs']['show version'] == 'Version 15.2'  # Corta: en línea
+    # Mismo texto en los dos reportes: un solo chunk (más el log de cada uno, también igual)
+    assert len(list((workdir / 'data/reports/chunks').glob('*/*.gz'))) == 2
+
+    full = store.get_report(second)
+    assert full['devices'][0]['checks']['interfaces']['outputs']['show interface status'] == LONG_OUTPUT
+    assert full['devices'][0]['full_log'] == ['linea 1', 'linea 2']
+    assert store.get_output(second, 'SW1', 'interfaces', 'show interface status') == LONG_OUTPUT
+    assert store.prune_chunks(min_age=0) == 0
+
+
+def test_spooled_outputs_move_into_chunks(workdir):
+    store = ReportGenerator(pdf_background=False)
+    spool = OutputSpool(threshold=100)
+    ids = []
+    for timestamp in ('2024-03-01T10:00:00', '2024-03-02T10:00:00'):
+        capture = spool.open('sw1', 'show interface status')
+        capture.write(LONG_OUTPUT)
+        output = capture.finish()
+        assert is_spooled(output)
+        spool_file = workdir / output['spool']
+        ids.append(store.save_report(make_report('acme', timestamp, interfaces=output)))
+
+        # El spool pasó al almacén y la referencia en memoria sigue siendo legible
+        assert not spool_file.exists()
+        assert output_text(output) == LONG_OUTPUT
+
+    header = store.load_header(ids[0])
+    assert set(header['devices'][0]['checks']['interfaces']['outputs']['show interface status']) == {'chunk', 'size'}
+    assert len(list((workdir / 'data/reports/chunks').glob('*/*.gz'))) == 2  # Salida y log, una vez cada uno
+    assert store.get_output(ids[1], 'SW1', 'interfaces', 'show interface status') == LONG_OUTPUT
+    assert not list(workdir.glob('data/reports/*.tmp'))
@@ -0,0 +1,68 @@
+import queue
+import time
+from datetime import datetime
+
+import pytest
+
+from scheduler import CronExpression, Schedule, Scheduler
+
+
+@pytest.mark.parametrize('expression, moment, expected', [
+    ('*/15 * * * *', datetime(2024, 3, 1, 10, 7), datetime(2024, 3, 1, 10, 15)),
+    ('0 2 * * *', datetime(2024, 3, 1, 2, 0), datetime(2024, 3, 2, 2, 0)),
+    ('30 8-17/4 * * *', datetime(2024, 3, 1, 12, 31), datetime(2024, 3, 1, 16, 30)),
+    ('0 0 1 * *', datetime(2024, 1, 31, 23, 59), datetime(2024, 2, 1, 0, 0)),
+    ('0 0 29 2 *', datetime(2023, 3, 1, 0, 0), datetime(2024, 2, 29, 0, 0)),
+    ('@weekly', datetime(2024, 3, 1, 12, 0), datetime(2024, 3, 3, 0, 0)),  # 2024-03-03 es domingo
+    ('0 0 * * 7', datetime(2024, 3, 1, 12, 0), datetime(2024, 3, 3, 0, 0)),  # 7 también es domingo
+])
+def test_next_after(expression, moment, expected):
+    assert CronExpression(expression).next_after(moment) == expected
+
+
+def test_day_of_month_or_weekday():
+    # Como en cron: con ambos campos restringidos basta con que se cumpla uno
+    cron = CronExpression('0 0 13 * 5')
+    assert cron.matches(datetime(2024, 3, 13, 0, 0))  # miércoles 13
+    assert cron.matches(datetime(2024, 3, 15, 0, 0))  # viernes 15
+    assert not cron.matches(datetime(2024, 3, 14, 0, 0))
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '* 24 * * *', '0 0 0 * *', '*/0 * * * *', '5-1 * * * *'])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_never_matches():
+    with pytest.raises(ValueError):
+        CronExpression('0 0 31 2 *').next_after(datetime(2024, 1, 1))
+
+
+class _FullQueue:
+    """JobManager cuya cola está siempre llena"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        raise queue.Full()
+
+
+def test_sweep_skips_clients_when_queue_stays_full():
+    jobs = _FullQueue()
+    config = {'clientes': {'a': {'nombre': 'A', 'devices': []}}, 'checks': {'health': ['show version']}}
+    scheduler = Scheduler(jobs, config, schedules=[Schedule('nightly', '@daily')], retry_interval=0.01,
+                          max_wait=0.05)
+
+    assert scheduler.run_now('nightly')
+    for _ in range(100):
+        history = scheduler.status()['history']
+        if history and history[-1]['finished']:
+            break
+        time.sleep(0.02)
+
+    run = scheduler.status()['history'][-1]
+    assert run['skipped'] == {'a': 'cola de trabajos llena'}
+    assert jobs.calls > 1
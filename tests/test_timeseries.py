@@ -0,0 +1,50 @@
+from timeseries import TimeSeriesStore
+
+HOUR = 3600
+BASE = 1_700_000_000 - 1_700_000_000 % HOUR  # Inicio de una hora
+
+
+def cpu(value):
+    return {'checks': {'health': {'parsed': {'show processes cpu': [{'cpu_usage_5_sec': str(value)}]}}}}
+
+
+def test_repeated_points_are_counted_once(workdir):
+    store = TimeSeriesStore(path='data/metrics.db')
+    store.record('acme', 'SW1', cpu(10), timestamp=BASE + 60)
+    store.record('acme', 'SW1', cpu(10), timestamp=BASE + 60)  # El mismo resultado guardado dos veces
+    store.record('acme', 'SW1', cpu(30), timestamp=BASE + 120)
+    store.flush()
+
+    result = store.query('SW1', 'cpu_5s', start=BASE, end=BASE + HOUR - 1, step=HOUR, agg='count')
+    assert result['series'][0]['points'] == [[BASE, 2]]
+    assert store.query('SW1', 'cpu_5s', start=BASE, end=BASE + HOUR - 1, step=HOUR)['series'][0]['points'] == [
+        [BASE, 20.0]
+    ]
+
+
+def test_hourly_step_excludes_points_outside_the_range(workdir):
+    store = TimeSeriesStore(path='data/metrics.db')
+    for minute, value in ((10, 100), (40, 1), (70, 3)):
+        store.record('acme', 'SW1', cpu(value), timestamp=BASE + minute * 60)
+    store.flush()
+
+    # Desde el minuto 30: el punto del minuto 10 comparte hora pero queda fuera
+    result = store.query('SW1', 'cpu_5s', start=BASE + 30 * 60, end=BASE + 2 * HOUR - 1, step=HOUR, agg='sum')
+    assert result['series'][0]['points'] == [[BASE, 1.0], [BASE + HOUR, 3.0]]
+
+
+def test_automatic_step_is_shared_by_every_series(workdir):
+    store = TimeSeriesStore(path='data/metrics.db', max_points=5)
+    for index in range(3):
+        store.record('acme', 'SW1', cpu(index), timestamp=BASE + index)
+    for index in range(10):
+        store.record('acme', 'SW1', {'checks': {'health': {'parsed': {'show memory': [
+            {'pool': 'Processor', 'used_percent': str(index)}
+        ]}}}}, timestamp=BASE + index)
+    store.flush()
+
+    result = store.query('SW1', None, start=BASE, end=BASE + 9)
+    assert result['step'] == 2 and result['agg'] == 'avg'
+    points = {series['metric']: series['points'] for series in result['series']}
+    assert points['cpu_5s'] == [[BASE, 0.5], [BASE + 2, 2.0]]  # Agregada aunque tenga pocos puntos
+    assert len(points['memory_used_percent']) == 5
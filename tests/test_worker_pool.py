@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_ssh_server import FakeJumpHost
+from tests.conftest import make_config, make_devices, write_config
+import metrics
+from worker_pool import WorkerPool, _Leases, _SharedSlots
+
+
+def test_leases_cap_every_worker_together():
+    leases = _Leases(global_limit=3, jump_limits={'bridge': 2})
+    assert leases.acquire('local-0', 'bridge', 0)
+    assert leases.acquire('local-1', 'bridge', 0)
+    assert not leases.acquire('local-2', 'bridge', 0)  # Cupo del jump host, aunque sean workers distintos
+    assert leases.acquire('local-2', None, 0)
+    assert not leases.acquire('local-2', None, 0.05)  # Cupo global
+
+    assert leases.reclaim('local-1') == 1  # Worker caído
+    leases.release('local-1', 'bridge')  # Un aviso tardío no devuelve dos veces el mismo cupo
+    assert leases.stats() == {'in_use': 2, 'limit': 3, 'jump_hosts': {'bridge': [1, 2]}}
+
+    leases.update(3, {'bridge': 5, 'otro': 1})  # Como en AnalysisEngine: sólo jump hosts nuevos
+    assert leases.stats()['jump_hosts'] == {'bridge': [1, 2], 'otro': [0, 1]}
+
+
+def test_shared_slots_wait_for_a_lease_and_give_up_on_cancel():
+    leases = _Leases(global_limit=1)
+    slots = _SharedSlots(leases, 'local-0', wait=0.1)
+    assert leases.acquire('local-1', None, 0)
+
+    cancel_event = threading.Event()
+    threading.Timer(0.3, cancel_event.set).start()
+    start = time.monotonic()
+    with slots.hold(None, cancel_event):
+        assert leases.stats()['in_use'] == 1  # Cancelada sin cupo: no se devuelve uno ajeno
+    assert 0.3 <= time.monotonic() - start < 2
+    assert leases.stats()['in_use'] == 1
+
+    threading.Timer(0.2, leases.release, args=('local-1', None)).start()
+    with slots.hold(None):
+        assert leases.stats()['in_use'] == 1
+    assert leases.stats()['in_use'] == 0
+
+
+@pytest.fixture
+def pool(workdir):
+    devices = make_devices(2, latency=0.2)
+    jump = FakeJumpHost(devices=devices).start()
+    config = make_config(jump, devices, workers={'enabled': True, 'processes': 1, 'heartbeat': 0.5, 'pdf': False})
+    write_config(workdir / 'config/config.json', config)
+    pool = WorkerPool.from_config(config, 'config/config.json')
+    yield pool, config['clientes']['acme']
+    pool.stop()
+    jump.stop()
+
+
+def test_task_of_crashed_worker_fails_and_worker_is_replaced(pool):
+    pool, client_info = pool
+
+    def kill_worker(device, status):
+        if status == 'connecting':
+            pool.local['local-0'].kill()
+
+    # El worker relanzado no hereda el nombre del caído: la tarea falla en vez de quedar esperando
+    with pytest.raises(RuntimeError, match='Se perdió el worker'):
+        pool.analyze_client(client_info, client_info['devices'], {'health': ['show version']},
+                            on_progress=kill_worker)
+    assert 'local-1' in pool.local
+
+    results = pool.analyze_client(client_info, client_info['devices'], {'health': ['show version']})
+    assert [r['status'] for r in results] == ['completed', 'completed']
+    # Los cupos del caído se recuperaron y el historial de salud es el del proceso web
+    assert pool.leases.stats()['in_use'] == 0
+    assert pool.device_health.stats()['closed'] == 2
+    assert pool.status()['slots']['jump_hosts']['bridge'] == [0, 8]
+
+
+def test_phase_metrics_of_workers_reach_the_web_process(pool):
+    pool, client_info = pool
+    metrics.registry.take_histograms()
+
+    pool.analyze_client(client_info, client_info['devices'], {'health': ['show version']})
+    # Se envían antes del aviso de fin de la tarea
+    rendered = metrics.registry.render()
+    assert 'phase="connect"' in rendered
+    assert 'phase="command"' in rendered
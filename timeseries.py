@@ -0,0 +1,306 @@
+import math
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Métricas que se guardan de cada comando parseado:
+# comando -> (campo que identifica la serie o None, {campo parseado: métrica})
+METRIC_FIELDS = {
+    'show processes cpu': (None, {
+        'cpu_usage_5_sec': 'cpu_5s',
+        'cpu_usage_1_min': 'cpu_1m',
+        'cpu_usage_5_min': 'cpu_5m'
+    }),
+    'show memory': ('pool', {
+        'total': 'memory_total',
+        'used': 'memory_used',
+        'free': 'memory_free',
+        'used_percent': 'memory_used_percent'
+    }),
+    'show interface counters errors': ('port', {
+        'align_err': 'if_align_err',
+        'fcs_err': 'if_fcs_err',
+        'xmit_err': 'if_xmit_err',
+        'rcv_err': 'if_rcv_err',
+        'undersize': 'if_undersize',
+        'out_discards': 'if_out_discards'
+    })
+}
+
+AGGREGATES = {'avg': 'AVG', 'min': 'MIN', 'max': 'MAX', 'sum': 'SUM', 'count': 'COUNT'}
+
+# Los mismos agregados calculados sobre los resúmenes por hora
+ROLLUP_AGGREGATES = {
+    'avg': 'SUM(total) / SUM(count)',
+    'min': 'MIN(low)',
+    'max': 'MAX(high)',
+    'sum': 'SUM(total)',
+    'count': 'SUM(count)'
+}
+
+ROLLUP_SECONDS = 3600
+
+
+def extract_samples(result):
+    """[(métrica, etiqueta, valor)] de los registros parseados de un dispositivo"""
+    samples = []
+    for check_result in result.get('checks', {}).values():
+        for command, records in check_result.get('parsed', {}).items():
+            spec = METRIC_FIELDS.get(command.strip())
+            if not spec or not records:
+                continue
+            label_field, fields = spec
+            # Sin campo de etiqueta sólo cuenta el primer registro (el resto son procesos)
+            for record in (records if label_field else records[:1]):
+                label = record.get(label_field, '') if label_field else ''
+                for field, metric in fields.items():
+                    value = record.get(field)
+                    if value in (None, ''):
+                        continue
+                    try:
+                        samples.append((metric, label, float(value)))
+                    except ValueError:
+                        continue
+    return samples
+
+
+class TimeSeriesStore:
+    """Series temporales de CPU, memoria y errores de interfaz por dispositivo.
+
+    SQLite con una tabla de series y otra de puntos agrupados por serie y
+    tiempo (sin rowid), así una consulta de rango lee un tramo contiguo del
+    índice. Además se mantiene un resumen por hora (mín, máx, suma, cantidad)
+    con el que se responden los agregados de paso igual o mayor a una hora.
+    Las escrituras pasan por un hilo que las agrupa en una transacción.
+    """
+
+    def __init__(self, path='data/metrics.db', retention_days=400, max_points=500, log=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention_days = retention_days
+        self.max_points = max_points
+        self.log = log
+        self.series_ids = {}  # (cliente, dispositivo, métrica, etiqueta) -> id
+        self.queue = queue.Queue()
+        self._init_db()
+        self.prune()
+        self.last_prune = time.monotonic()
+
+        threading.Thread(target=self._writer, daemon=True, name='timeseries-writer').start()
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Crea el store a partir de la sección timeseries (None si está deshabilitado)"""
+        settings = config.get('timeseries', {})
+        if not settings.get('enabled', True):
+            return None
+        return cls(
+            path=settings.get('path', 'data/metrics.db'),
+            retention_days=settings.get('retention_days', 400),
+            max_points=settings.get('max_points', 500),
+            **kwargs
+        )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS series (
+                    id INTEGER PRIMARY KEY,
+                    client TEXT,
+                    device TEXT,
+                    metric TEXT,
+                    label TEXT,
+                    UNIQUE (client, device, metric, label)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_series_device ON series (device, metric)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS points (
+                    series_id INTEGER,
+                    ts INTEGER,
+                    value REAL,
+                    PRIMARY KEY (series_id, ts)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_hour (
+                    series_id INTEGER,
+                    bucket INTEGER,
+                    low REAL,
+                    high REAL,
+                    total REAL,
+                    count INTEGER,
+                    PRIMARY KEY (series_id, bucket)
+                ) WITHOUT ROWID
+            ''')
+
+    def record(self, client, device, result, timestamp=None):
+        """Encola las métricas del resultado de un dispositivo (no bloquea)"""
+        samples = extract_samples(result)
+        if samples:
+            self.queue.put((client or '', device, int(timestamp or time.time()), samples))
+        return len(samples)
+
+    def flush(self):
+        """Espera a que se escriba lo encolado"""
+        self.queue.join()
+
+    def _writer(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                if self.log:
+                    self.log(f"ERROR guardando métricas: {e}", "ERROR")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+            if time.monotonic() - self.last_prune > 86400:
+                self.last_prune = time.monotonic()
+                try:
+                    self.prune()
+                except sqlite3.Error as e:
+                    if self.log:
+                        self.log(f"ERROR depurando métricas: {e}", "ERROR")
+
+    def _series_id(self, conn, key):
+        series_id = self.series_ids.get(key)
+        if series_id is None:
+            conn.execute('INSERT OR IGNORE INTO series (client, device, metric, label) VALUES (?, ?, ?, ?)', key)
+            series_id = conn.execute(
+                'SELECT id FROM series WHERE client = ? AND device = ? AND metric = ? AND label = ?', key
+            ).fetchone()[0]
+            self.series_ids[key] = series_id
+        return series_id
+
+    def _write(self, batch):
+        with self._connect() as conn:
+            rows = []
+            for client, device, ts, samples in batch:
+                for metric, label, value in samples:
+                    rows.append((self._series_id(conn, (client, device, metric, label)), ts, value))
+            # Un punto repetido (misma serie e instante) se ignora: el resumen por hora sólo suma los nuevos
+            inserted = [
+                row for row in rows
+                if conn.execute('INSERT OR IGNORE INTO points (series_id, ts, value) VALUES (?, ?, ?)', row).rowcount
+            ]
+            conn.executemany(
+                '''INSERT INTO rollup_hour (series_id, bucket, low, high, total, count) VALUES (?, ?, ?, ?, ?, 1)
+                   ON CONFLICT (series_id, bucket) DO UPDATE SET
+                       low = MIN(low, excluded.low), high = MAX(high, excluded.high),
+                       total = total + excluded.total, count = count + 1''',
+                [(series_id, ts - ts % ROLLUP_SECONDS, value, value, value) for series_id, ts, value in inserted]
+            )
+
+    def prune(self):
+        """Borra los puntos más viejos que la retención"""
+        if not self.retention_days:
+            return
+        cutoff = int(time.time() - self.retention_days * 86400)
+        with self._connect() as conn:
+            conn.execute('DELETE FROM points WHERE ts < ?', (cutoff,))
+            conn.execute('DELETE FROM rollup_hour WHERE bucket < ?', (cutoff - cutoff % ROLLUP_SECONDS,))
+
+    def list_series(self, client=None, device=None, metric=None):
+        conditions, params = self._filters(client, device, metric, None)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT client, device, metric, label FROM series {conditions} ORDER BY device, metric, label',
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _filters(client, device, metric, label):
+        conditions, params = [], []
+        for column, value in (('client', client), ('device', device), ('metric', metric), ('label', label)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        return ('WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+    def query(self, device, metric, start=None, end=None, label=None, client=None, step=None, agg='avg'):
+        """Puntos de cada serie en [start, end] (epoch). Con `step` o demasiados puntos, agregados por intervalo"""
+        if agg not in AGGREGATES:
+            raise ValueError(f"Agregado no soportado: {agg}")
+        end = int(end if end is not None else time.time())
+        start = int(start if start is not None else end - 30 * 86400)
+        conditions, params = self._filters(client, device, metric, label)
+
+        # Horas enteras dentro de [start, end]: salen del resumen; los extremos, de los puntos
+        first_hour = -(-start // ROLLUP_SECONDS) * ROLLUP_SECONDS
+        hours_end = (end + 1) // ROLLUP_SECONDS * ROLLUP_SECONDS
+
+        with self._connect() as conn:
+            series = conn.execute(f'SELECT id, client, device, metric, label FROM series {conditions}', params).fetchall()
+
+            # Paso automático, el mismo para todas las series, si la más larga supera max_points
+            if not step and self.max_points and series:
+                ids = [row['id'] for row in series]
+                count = conn.execute(
+                    f'''SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM points
+                        WHERE series_id IN ({','.join('?' * len(ids))}) AND ts BETWEEN ? AND ? GROUP BY series_id)''',
+                    (*ids, start, end)
+                ).fetchone()[0] or 0
+                if count > self.max_points:
+                    step = max(1, math.ceil((end - start + 1) / self.max_points))
+                    # Pasos de horas completas: desde el resumen por hora
+                    if step > ROLLUP_SECONDS:
+                        step = math.ceil(step / ROLLUP_SECONDS) * ROLLUP_SECONDS
+
+            results = []
+            for row in series:
+                if step and step % ROLLUP_SECONDS == 0:
+                    points = conn.execute(
+                        f'''SELECT (bucket / ?) * ? AS slot, {ROLLUP_AGGREGATES[agg]} FROM (
+                                SELECT bucket, low, high, total, count FROM rollup_hour
+                                WHERE series_id = ? AND bucket >= ? AND bucket < ?
+                                UNION ALL
+                                SELECT ts, value, value, value, 1 FROM points
+                                WHERE series_id = ? AND ts BETWEEN ? AND ? AND (ts < ? OR ts >= ?)
+                            ) GROUP BY slot ORDER BY slot''',
+                        (step, step, row['id'], first_hour, hours_end,
+                         row['id'], start, end, first_hour, hours_end)
+                    ).fetchall()
+                elif step:
+                    points = conn.execute(
+                        f'''SELECT (ts / ?) * ? AS bucket, {AGGREGATES[agg]}(value) FROM points
+                            WHERE series_id = ? AND ts BETWEEN ? AND ? GROUP BY bucket ORDER BY bucket''',
+                        (step, step, row['id'], start, end)
+                    ).fetchall()
+                else:
+                    points = conn.execute(
+                        'SELECT ts, value FROM points WHERE series_id = ? AND ts BETWEEN ? AND ? ORDER BY ts',
+                        (row['id'], start, end)
+                    ).fetchall()
+
+                results.append({
+                    'client': row['client'],
+                    'device': row['device'],
+                    'metric': row['metric'],
+                    'label': row['label'],
+                    'points': [[ts, value] for ts, value in points]
+                })
+
+        return {'start': start, 'end': end, 'step': step, 'agg': agg if step else None, 'series': results}
@@ -0,0 +1,759 @@
+import argparse
+import asyncio
+import os
+import queue
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from multiprocessing.managers import BaseManager, DictProxy
+from pathlib import Path
+import metrics
+from device_health import DeviceHealth
+from output_spool import is_spooled, output_text
+
+# Clave del broker para los procesos locales (no va en la línea de comandos)
+AUTHKEY_ENV = 'NETWORK_ANALYZER_WORKER_KEY'
+
+
+class _BrokerServer(BaseManager):
+    pass
+
+
+class _BrokerClient(BaseManager):
+    pass
+
+
+for _typeid in ('tasks', 'pdf_tasks', 'events', 'leases', 'health'):
+    _BrokerClient.register(_typeid)
+_BrokerClient.register('cancelled', proxytype=DictProxy)
+
+
+def _slot_limits(config):
+    """(límite global, {jump host: límite}) de sesiones simultáneas, como los semáforos de AnalysisEngine"""
+    settings = config.get('analysis', {})
+    transport = config.get('async_transport', {})
+    if transport.get('enabled', False):
+        global_limit = transport.get('max_sessions', 500)
+    else:
+        global_limit = settings.get('max_workers_global', 16)
+    per_jump_host = settings.get('max_workers_per_jump_host', 8)
+    return global_limit, {
+        name: jump.get('max_sessions', per_jump_host) for name, jump in config.get('jump_hosts', {}).items()
+    }
+
+
+class _Leases:
+    """Cupos de sesiones SSH comunes a todos los workers: el global y el de cada jump host.
+
+    Vive en el broker. Cada sesión toma los dos cupos juntos (o ninguno) a
+    nombre de su worker, así que los límites valen para el conjunto de procesos
+    y no para cada uno. Los cupos de un worker caído se recuperan con `reclaim`.
+    """
+
+    def __init__(self, global_limit=16, jump_limits=None):
+        self.global_limit = max(1, global_limit)
+        self.jump_limits = {name: max(1, limit) for name, limit in (jump_limits or {}).items()}
+        self.in_use = 0
+        self.jump_in_use = dict.fromkeys(self.jump_limits, 0)
+        self.held = {}  # worker -> [jump host de cada cupo tomado]
+        self.condition = threading.Condition()
+
+    def _free(self, jump_host):
+        if self.in_use >= self.global_limit:
+            return False
+        return jump_host not in self.jump_limits or self.jump_in_use[jump_host] < self.jump_limits[jump_host]
+
+    def acquire(self, owner, jump_host, timeout):
+        """Toma el cupo global y el del jump host; False si no hubo lugar en `timeout` segundos"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self._free(jump_host), timeout):
+                return False
+            self.in_use += 1
+            if jump_host in self.jump_limits:
+                self.jump_in_use[jump_host] += 1
+            self.held.setdefault(owner, []).append(jump_host)
+            return True
+
+    def release(self, owner, jump_host):
+        with self.condition:
+            held = self.held.get(owner, [])
+            if jump_host in held:  # Si no está, ya se recuperó al dar el worker por perdido
+                held.remove(jump_host)
+                self._return(jump_host)
+                self.condition.notify_all()
+
+    def reclaim(self, owner):
+        """Devuelve todos los cupos de un worker (caído o que reinicia su sesión); cuántos tenía"""
+        with self.condition:
+            held = self.held.pop(owner, [])
+            for jump_host in held:
+                self._return(jump_host)
+            self.condition.notify_all()
+            return len(held)
+
+    def _return(self, jump_host):
+        self.in_use -= 1
+        if jump_host in self.jump_limits:
+            self.jump_in_use[jump_host] -= 1
+
+    def update(self, global_limit, jump_limits):
+        """Configuración recargada: como en AnalysisEngine, sólo se agregan los jump hosts nuevos"""
+        with self.condition:
+            for name, limit in jump_limits.items():
+                if name not in self.jump_limits:
+                    self.jump_limits[name] = max(1, limit)
+                    self.jump_in_use[name] = 0
+
+    def stats(self):
+        with self.condition:
+            return {
+                'in_use': self.in_use,
+                'limit': self.global_limit,
+                'jump_hosts': {name: [self.jump_in_use[name], limit] for name, limit in self.jump_limits.items()}
+            }
+
+
+class _SharedSlots:
+    """Los cupos del broker desde un worker (AnalysisEngine.shared_slots).
+
+    La espera bloquea en el broker hasta que se libera un cupo, en tramos de
+    `wait` segundos para atender una cancelación. Si se cancela mientras
+    espera se entra sin cupo: el motor ve la cancelación y no conecta.
+    """
+
+    def __init__(self, leases, owner, wait=5, async_waiters=16):
+        self.leases = leases
+        self.owner = owner
+        self.wait = wait
+        # Las sesiones asyncio esperan en hilos propios, sin ocupar los del bucle ni los de to_thread
+        self.waiters = ThreadPoolExecutor(max_workers=async_waiters, thread_name_prefix='lease-wait')
+
+    @staticmethod
+    def _cancelled(cancel_event):
+        return cancel_event is not None and cancel_event.is_set()
+
+    @contextmanager
+    def hold(self, jump_host, cancel_event=None):
+        acquired = False
+        while not acquired and not self._cancelled(cancel_event):
+            acquired = self.leases.acquire(self.owner, jump_host, self.wait)
+        try:
+            yield
+        finally:
+            if acquired:
+                self._release(jump_host)
+
+    @asynccontextmanager
+    async def hold_async(self, jump_host, cancel_event=None):
+        loop = asyncio.get_running_loop()
+        acquired = False
+        while not acquired and not self._cancelled(cancel_event):
+            # Tramos de un segundo: un jump host lleno no retiene los hilos de espera de los demás
+            acquired = await loop.run_in_executor(self.waiters, self.leases.acquire, self.owner, jump_host, 1)
+        try:
+            yield
+        finally:
+            if acquired:
+                await loop.run_in_executor(self.waiters, self._release, jump_host)
+
+    def _release(self, jump_host):
+        try:
+            self.leases.release(self.owner, jump_host)
+        except (OSError, EOFError):
+            pass  # Broker caído: los cupos se fueron con él
+
+
+class _SharedHealth:
+    """DeviceHealth del proceso web visto desde un worker: circuito y latencias comunes a todos.
+
+    Reintentos y esperas entre ellos siguen la configuración del worker.
+    """
+
+    def __init__(self, remote, local):
+        self.remote = remote
+        self.retries = local.retries
+        self.backoff = local.backoff
+        self.make_key = local.make_key
+
+    def allow(self, key):
+        return self.remote.allow(key)
+
+    def timeouts(self, key, commands, login_timeout, command_timeout):
+        return self.remote.timeouts(key, commands, login_timeout, command_timeout)
+
+    def record_success(self, key, timings):
+        self.remote.record_success(key, timings)
+
+    def record_failure(self, key, error):
+        self.remote.record_failure(key, error)
+
+    def release_probe(self, key):
+        self.remote.release_probe(key)
+
+    def status(self):
+        return self.remote.status()
+
+    def stats(self):
+        return self.remote.stats()
+
+
+class _Task:
+    """Análisis enviado a un proceso de trabajo, con los callbacks del que lo pidió"""
+
+    def __init__(self, client, devices, on_progress, on_result, incremental, skipped, log_callback):
+        self.id = uuid.uuid4().hex[:12]
+        self.client = client
+        self.devices = devices
+        self.by_id = {device['id']: device for device in devices}
+        self.on_progress = on_progress
+        self.on_result = on_result
+        self.incremental = incremental
+        self.skipped = skipped  # Comandos tomados del reporte anterior, por índice
+        self.log_callback = log_callback
+        self.results = [None] * len(devices)
+        self.worker = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _PlannedChecks:
+    """Checks por dispositivo ya planificados en el proceso web (reemplaza al incremental en el worker)"""
+
+    def __init__(self, plans):
+        self.plans = plans
+
+    def plan(self, device, checks):
+        return self.plans.get(device['id'], checks), {}
+
+    def apply(self, device, result, skipped):
+        pass
+
+
+class WorkerPool:
+    """Reparte los análisis entre procesos de trabajo a través de un broker local.
+
+    El proceso web publica cada análisis en una cola servida por un
+    BaseManager (el broker) y recibe por otra cola el progreso, los logs y el
+    resultado de cada dispositivo. Los procesos de trabajo conectan, sesión SSH,
+    parseo y series temporales; aquí sólo quedan la planificación incremental,
+    los reportes y la interfaz. Se lanzan `processes` workers locales y se
+    pueden sumar workers en otros hosts con `python worker_pool.py --connect`
+    (con `host`, `port` y `authkey` fijos en la sección workers).
+
+    El historial de salud de los dispositivos y los cupos de sesiones (global
+    y por jump host) también los sirve el broker: valen para todos los workers.
+
+    Tiene la misma interfaz que AnalysisEngine.analyze_client, así que el
+    JobManager, el análisis síncrono y el masivo lo usan sin cambios.
+    """
+
+    def __init__(self, config_path='config/config.json', processes=2, host='127.0.0.1', port=0, authkey=None,
+                 heartbeat=5, pdf=True, pdf_timeout=600, max_jobs=None, global_slots=16, jump_slots=None,
+                 device_health=None, log_callback=None, log=None):
+        self.config_path = config_path
+        self.processes = max(0, processes)
+        self.host = host
+        self.port = port
+        self.authkey = authkey or secrets.token_hex(16)
+        self.heartbeat = heartbeat
+        self.pdf = pdf and self.processes > 0  # PDFs sólo en workers locales (mismo directorio de reportes)
+        self.pdf_timeout = pdf_timeout
+        self.max_jobs = max_jobs or max(1, self.processes)
+        self.log_callback = log_callback  # Logs de análisis sin callback propio
+        self.log = log
+        self.leases = _Leases(global_slots, jump_slots)
+        self.device_health = device_health  # Único historial de salud: los workers lo usan por el broker
+
+        self.tasks = queue.Queue()
+        self.pdf_tasks = queue.Queue()
+        self.events = queue.Queue()
+        self.cancelled = {}  # id de tarea -> True (lo consultan los workers)
+        self.pending = {}  # id de tarea -> _Task o [Event, error, worker] de un PDF
+        self.workers = {}  # nombre -> último latido
+        self.local = {}  # nombre -> subprocess.Popen
+        self.spawned = 0  # Cada worker local tiene un nombre nuevo: uno relanzado no hereda las tareas del caído
+        self.exited = set()  # Workers locales que terminaron
+        self.lock = threading.Lock()
+        self.address = None
+        self._started = False
+        self._stopped = False
+
+    @classmethod
+    def from_config(cls, config, config_path='config/config.json', **kwargs):
+        """Crea el pool a partir de la sección workers (None si está deshabilitado)"""
+        settings = config.get('workers', {})
+        if not settings.get('enabled', False):
+            return None
+        processes = settings.get('processes', os.cpu_count() or 2)
+        global_slots, jump_slots = _slot_limits(config)
+        return cls(
+            config_path=config_path,
+            processes=processes,
+            host=settings.get('host', '127.0.0.1'),
+            port=settings.get('port', 0),
+            authkey=settings.get('authkey') or None,
+            heartbeat=settings.get('heartbeat', 5),
+            pdf=settings.get('pdf', True),
+            pdf_timeout=settings.get('pdf_timeout', 600),
+            max_jobs=settings.get('max_jobs'),
+            global_slots=global_slots,
+            jump_slots=jump_slots,
+            device_health=DeviceHealth.from_config(config),
+            **kwargs
+        )
+
+    def update_config(self, config):
+        """Configuración recargada: cupos de los jump hosts nuevos (los workers recargan el resto)"""
+        self.leases.update(*_slot_limits(config))
+
+    def start(self):
+        """Levanta el broker y los workers locales (se llama solo con el primer análisis)"""
+        with self.lock:
+            if self._started:
+                return self
+            self._started = True
+
+        _BrokerServer.register('tasks', callable=lambda: self.tasks)
+        _BrokerServer.register('pdf_tasks', callable=lambda: self.pdf_tasks)
+        _BrokerServer.register('events', callable=lambda: self.events)
+        _BrokerServer.register('cancelled', callable=lambda: self.cancelled, proxytype=DictProxy)
+        _BrokerServer.register('leases', callable=lambda: self.leases)
+        if self.device_health:
+            _BrokerServer.register('health', callable=lambda: self.device_health)
+        server = _BrokerServer(address=(self.host, self.port), authkey=self.authkey.encode()).get_server()
+        self.address = server.address
+        threading.Thread(target=server.serve_forever, daemon=True, name='worker-broker').start()
+        threading.Thread(target=self._dispatch, daemon=True, name='worker-events').start()
+        threading.Thread(target=self._monitor, daemon=True, name='worker-monitor').start()
+
+        with self.lock:
+            for _ in range(self.processes):
+                self._spawn()
+        self._log(f"Broker de workers en {self.address[0]}:{self.address[1]} ({self.processes} locales)")
+        return self
+
+    def _spawn(self):
+        """Lanza un worker local (con el lock tomado)"""
+        name = f"local-{self.spawned}"
+        self.spawned += 1
+        command = [
+            sys.executable, str(Path(__file__).resolve()),
+            '--connect', f"{self.address[0]}:{self.address[1]}",
+            '--config', self.config_path,
+            '--name', name,
+            '--local'
+        ]
+        if self.pdf:
+            command.append('--pdf')
+        self.local[name] = subprocess.Popen(command, env=dict(os.environ, **{AUTHKEY_ENV: self.authkey}))
+
+    def analyze_client(self, client_info, devices, checks, on_progress=None, on_result=None, cancel_event=None,
+                       incremental=None, log_callback=None):
+        """Como AnalysisEngine.analyze_client, ejecutado en un proceso de trabajo"""
+        if not devices:
+            return []
+        self.start()
+
+        # El incremental lee reportes de este host: se planifica aquí y se aplica al recibir cada resultado
+        plans, skipped = None, []
+        if incremental:
+            plans = {}
+            for device in devices:
+                plans[device['id']], device_skipped = incremental.plan(device, checks)
+                skipped.append(device_skipped)
+
+        task = _Task(client_info.get('nombre'), devices, on_progress, on_result, incremental, skipped,
+                     log_callback or self.log_callback)
+        with self.lock:
+            self.pending[task.id] = task
+        self.tasks.put({
+            'id': task.id,
+            'client_info': {key: value for key, value in client_info.items() if key != 'devices'},
+            'devices': devices,
+            'checks': checks,
+            'plans': plans
+        })
+
+        try:
+            while not task.done.wait(0.5):
+                if cancel_event and cancel_event.is_set() and task.id not in self.cancelled:
+                    self.cancelled[task.id] = True
+        finally:
+            with self.lock:
+                self.pending.pop(task.id, None)
+            self.cancelled.pop(task.id, None)
+
+        if task.error:
+            raise RuntimeError(task.error)
+        return [
+            result if result is not None else {'device': device['hostname'], 'ip': device['ip'],
+                                               'status': 'error', 'checks': {}}
+            for result, device in zip(task.results, devices)
+        ]
+
+    def build_pdf(self, report_id, output, full=False):
+        """Construye el PDF de un reporte en un worker local (ReportGenerator.pdf_builder)"""
+        self.start()
+        pending = [threading.Event(), None, None]
+        pdf_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.pending[pdf_id] = pending
+        try:
+            self.pdf_tasks.put({'id': pdf_id, 'report_id': report_id, 'output': str(output), 'full': full})
+            if not pending[0].wait(self.pdf_timeout):
+                raise TimeoutError(f"El PDF de {report_id} no se generó en {self.pdf_timeout}s")
+        finally:
+            with self.lock:
+                self.pending.pop(pdf_id, None)
+        if pending[1]:
+            raise RuntimeError(pending[1])
+
+    def _dispatch(self):
+        """Aplica los eventos de los workers a las tareas pendientes"""
+        while True:
+            kind, key, payload = self.events.get()
+            try:
+                self._handle(kind, key, payload)
+            except Exception as e:
+                self._log(f"ERROR procesando evento '{kind}' de worker: {str(e)}", "ERROR")
+
+    def _handle(self, kind, key, payload):
+        if kind == 'metrics':
+            # Tiempos por fase medidos en el worker: /metrics los muestra junto a los de este proceso
+            metrics.registry.merge_histograms(payload)
+            return
+        if kind == 'heartbeat':
+            with self.lock:
+                if key not in self.exited:
+                    self.workers[key] = dict(payload, last_seen=time.monotonic())
+            return
+
+        with self.lock:
+            task = self.pending.get(key)
+        if task is None:
+            return
+
+        if isinstance(task, list):
+            # PDF: ('pdf_started', id, worker) y ('pdf_done', id, error)
+            if kind == 'pdf_started':
+                task[2] = payload
+                if payload in self.exited:
+                    self._fail(task)
+            elif kind == 'pdf_done':
+                task[1] = payload
+                task[0].set()
+        elif kind == 'started':
+            task.worker = payload
+            if payload in self.exited:
+                # El worker terminó antes de que se procesara este evento
+                self._fail(task)
+        elif kind == 'progress':
+            device_id, status = payload
+            if task.on_progress and device_id in task.by_id:
+                task.on_progress(task.by_id[device_id], status)
+        elif kind == 'result':
+            index, result = payload
+            device = task.devices[index]
+            if task.incremental:
+                task.incremental.apply(device, result, task.skipped[index])
+            metrics.registry.inc('devices', client=task.client, status=result['status'])
+            task.results[index] = result
+            if task.on_result:
+                task.on_result(index, result)
+        elif kind == 'log':
+            if task.log_callback:
+                task.log_callback(payload)
+        elif kind == 'done':
+            task.error = payload
+            task.done.set()
+
+    def _monitor(self):
+        """Relanza los workers locales caídos y falla las tareas de los caídos o de los que dejaron de latir"""
+        while not self._stopped:
+            time.sleep(self.heartbeat)
+            if self._stopped:
+                return
+            now = time.monotonic()
+            with self.lock:
+                exited = {name: process.returncode for name, process in self.local.items()
+                          if process.poll() is not None}
+                for name in exited:
+                    del self.local[name]
+                    self._spawn()
+                self.exited |= set(exited)
+                for name in exited:
+                    self.workers.pop(name, None)
+                lost = set(exited) | {
+                    name for name, beat in self.workers.items() if now - beat['last_seen'] > 3 * self.heartbeat
+                }
+                orphans = [
+                    task for task in self.pending.values()
+                    if (task[2] if isinstance(task, list) else task.worker) in lost
+                ]
+            for name, code in exited.items():
+                self._log(f"Worker {name} terminó (código {code}); relanzado", "WARNING")
+            for name in lost:
+                self.leases.reclaim(name)
+            for task in orphans:
+                self._fail(task)
+
+    def stop(self):
+        """Termina los workers locales sin relanzarlos (el broker sigue hasta que termine el proceso)"""
+        with self.lock:
+            self._stopped = True
+            processes = list(self.local.values())
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    @staticmethod
+    def _fail(task):
+        error = "Se perdió el worker que ejecutaba la tarea"
+        if isinstance(task, list):
+            task[1] = error
+            task[0].set()
+        else:
+            task.error = f"{error} ({task.worker})"
+            task.done.set()
+
+    def status(self):
+        now = time.monotonic()
+        with self.lock:
+            workers = [
+                dict(beat, name=name, local=name in self.local, last_seen=round(now - beat['last_seen'], 1),
+                     alive=now - beat['last_seen'] <= 3 * self.heartbeat)
+                for name, beat in sorted(self.workers.items())
+            ]
+            running = sum(1 for task in self.pending.values() if not isinstance(task, list))
+        return {
+            'address': f"{self.address[0]}:{self.address[1]}" if self.address else None,
+            'workers': workers,
+            'running': running,
+            'queued': self.tasks.qsize(),
+            'pdf_queued': self.pdf_tasks.qsize(),
+            'slots': self.leases.stats()
+        }
+
+    def _log(self, message, level="INFO"):
+        if self.log:
+            self.log(message, level)
+
+
+class Worker:
+    """Proceso de trabajo: toma análisis (y PDFs) del broker y le devuelve los eventos"""
+
+    def __init__(self, address, authkey, config_path='config/config.json', name=None, inline_outputs=True,
+                 pdf=False):
+        from analysis_engine import AnalysisEngine
+        from config_manager import ConfigManager
+        from session_logger import SessionLogger
+
+        self.address = address
+        self.authkey = authkey
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.inline_outputs = inline_outputs  # Sin disco compartido las salidas en spool viajan completas
+
+        self.config_manager = ConfigManager(config_path).start()
+        config = self.config_manager.config
+        self.heartbeat = config.get('workers', {}).get('heartbeat', 5)
+        self.engine = AnalysisEngine(config, logger=SessionLogger.from_config(config))
+        self.local_health = self.engine.device_health  # Sólo para reintentos; el historial es el del broker
+        self.config_manager.subscribe(lambda snapshot: self.engine.update_config(snapshot.data))
+
+        self.reports = None
+        if pdf:
+            from report_generator import ReportGenerator
+            settings = config.get('reports', {})
+            self.reports = ReportGenerator(
+                reports_dir=settings.get('dir', 'data/reports'), pdf_background=False, prune_interval=0,
+                compact=settings.get('compact', True), chunk_min_size=settings.get('chunk_min_size', 256)
+            )
+
+        self.current = None  # (id de tarea, cancel_event) en curso
+        self.completed = 0
+
+    def log(self, message, level="INFO"):
+        """Al log de sesión del worker (archivo y consola)"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.engine.logger.write(f"[{timestamp}] [{level}] {message}")
+
+    def _send_metrics(self, outbox):
+        # Sólo histogramas: los contadores de dispositivos ya los lleva el proceso web al recibir resultados
+        histograms = metrics.registry.take_histograms()
+        if histograms:
+            outbox.put(('metrics', self.name, histograms))
+
+    def serve(self, once=False):
+        """Atiende al broker; si se corta, reconecta (o termina con `once`)"""
+        while True:
+            try:
+                broker = _BrokerClient(address=self.address, authkey=self.authkey)
+                broker.connect()
+                self.log(f"Worker {self.name} conectado a {self.address[0]}:{self.address[1]}")
+                self._session(broker)
+            except (OSError, EOFError) as e:
+                if once:
+                    return
+                self.log(f"Worker {self.name}: broker no disponible ({e}); reintentando", "WARNING")
+                time.sleep(5)
+
+    def _session(self, broker):
+        tasks, events, cancelled = broker.tasks(), broker.events(), broker.cancelled()
+
+        # Cupos comunes a todos los workers; los de una sesión anterior de este worker ya no se usan
+        leases = broker.leases()
+        leases.reclaim(self.name)
+        self.engine.shared_slots = _SharedSlots(leases, self.name)
+        if self.local_health:
+            try:
+                self.engine.device_health = _SharedHealth(broker.health(), self.local_health)
+            except Exception:
+                self.log(f"Worker {self.name}: el broker no comparte el historial de salud; se usa el local",
+                         "WARNING")
+                self.engine.device_health = self.local_health
+
+        outbox = queue.Queue()  # Un solo hilo habla con el broker por los eventos
+        stop = threading.Event()
+        threading.Thread(target=self._sender, args=(broker, outbox, stop), daemon=True, name='worker-sender').start()
+        threading.Thread(target=self._watch, args=(broker, outbox, stop), daemon=True, name='worker-heartbeat').start()
+        if self.reports:
+            threading.Thread(target=self._pdf_loop, args=(broker, outbox, stop), daemon=True,
+                             name='worker-pdf').start()
+
+        try:
+            while True:
+                task = tasks.get()
+                # Directo al broker antes de empezar: si este proceso cae, la tarea ya tiene dueño
+                events.put(('started', task['id'], self.name))
+                self._run(task, outbox, cancelled.get(task['id'], False))
+        finally:
+            stop.set()
+
+    def _run(self, task, outbox, cancelled):
+        task_id = task['id']
+        cancel_event = threading.Event()
+        if cancelled:
+            cancel_event.set()
+        self.current = (task_id, cancel_event)
+
+        def on_result(index, result):
+            if self.inline_outputs:
+                self._inline(result)
+            outbox.put(('result', task_id, (index, result)))
+
+        error = None
+        try:
+            self.engine.analyze_client(
+                task['client_info'], task['devices'], task['checks'],
+                on_progress=lambda device, status: outbox.put(('progress', task_id, (device['id'], status))),
+                on_result=on_result,
+                cancel_event=cancel_event,
+                incremental=_PlannedChecks(task['plans']) if task.get('plans') is not None else None,
+                log_callback=lambda message: outbox.put(('log', task_id, message))
+            )
+        except Exception as e:
+            error = str(e)
+        finally:
+            self.current = None
+            self.completed += 1
+        # En la misma cola que los resultados: llega después del último
+        self._send_metrics(outbox)
+        outbox.put(('done', task_id, error))
+
+    @staticmethod
+    def _inline(result):
+        for check_result in result.get('checks', {}).values():
+            outputs = check_result.get('outputs', {})
+            for command, output in outputs.items():
+                if is_spooled(output):
+                    outputs[command] = output_text(output)
+
+    def _sender(self, broker, outbox, stop):
+        events = broker.events()
+        while not stop.is_set():
+            try:
+                event = outbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                events.put(event)
+            except (OSError, EOFError):
+                return
+
+    def _watch(self, broker, outbox, stop):
+        """Latido periódico y cancelación de la tarea en curso"""
+        cancelled = broker.cancelled()
+        last_beat = 0
+        while not stop.wait(1):
+            current = self.current
+            try:
+                if current and cancelled.get(current[0]):
+                    current[1].set()
+            except (OSError, EOFError):
+                return
+            if time.monotonic() - last_beat >= self.heartbeat:
+                last_beat = time.monotonic()
+                outbox.put(('heartbeat', self.name, {
+                    'host': socket.gethostname(),
+                    'pid': os.getpid(),
+                    'task': current[0] if current else None,
+                    'completed': self.completed,
+                    'pdf': self.reports is not None
+                }))
+                self._send_metrics(outbox)
+
+    def _pdf_loop(self, broker, outbox, stop):
+        pdf_tasks, events = broker.pdf_tasks(), broker.events()
+        while not stop.is_set():
+            try:
+                task = pdf_tasks.get()
+                events.put(('pdf_started', task['id'], self.name))
+            except (OSError, EOFError):
+                return
+            error = None
+            try:
+                report = self.reports.load_header(task['report_id'])
+                if report is None:
+                    raise FileNotFoundError(f"Reporte {task['report_id']} no encontrado")
+                self.reports.build_pdf(report, task['output'], full=task['full'])
+            except Exception as e:
+                error = str(e)
+            outbox.put(('pdf_done', task['id'], error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Proceso de trabajo de análisis conectado al broker del servidor web')
+    parser.add_argument('--connect', required=True, help='host:puerto del broker (sección workers)')
+    parser.add_argument('--config', default='config/config.json', help='config.json (credenciales y jump hosts)')
+    parser.add_argument('--name', default=None, help='Nombre del worker (por defecto host-pid)')
+    parser.add_argument('--authkey', default=None, help=f'Clave del broker (o variable {AUTHKEY_ENV})')
+    parser.add_argument('--local', action='store_true', help='Lanzado por el servidor: disco compartido, termina con él')
+    parser.add_argument('--pdf', action='store_true', help='Generar también PDFs (requiere el directorio de reportes)')
+    args = parser.parse_args()
+
+    authkey = args.authkey or os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        parser.error(f"Falta la clave del broker (--authkey o {AUTHKEY_ENV})")
+    host, _, port = args.connect.rpartition(':')
+
+    worker = Worker((host, int(port)), authkey.encode(), config_path=args.config, name=args.name,
+                    inline_outputs=not args.local, pdf=args.pdf)
+    # WorkerPool.stop termina los locales con SIGTERM: se cierran las sesiones a los jump hosts igualmente
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        worker.serve(once=args.local)
+    finally:
+        worker.engine.close()
+
+
+if __name__ == '__main__':
+    main()